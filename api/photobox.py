@@ -4,34 +4,52 @@ import os
 import asyncio
 import logging
 import base64
+import hashlib
+import json
+import re
+import tempfile
+import zipfile
 from uuid import uuid4
-from io import BytesIO
-from typing import List
-from urllib.parse import urlparse
-from fastapi import APIRouter, Depends, File, Form, HTTPException, Request, Response, UploadFile
-from pydantic import BaseModel
-from PIL import Image, ImageOps
+from typing import List, Literal
+from fastapi import APIRouter, Depends, File, Form, HTTPException, Query, Request, Response, UploadFile
+from pydantic import BaseModel, Field
 from decimal import Decimal
+from datetime import datetime
 from http import HTTPStatus
 
 
-# --- Analisis Gambar ---
-import cv2
-import numpy as np
-
 # --- SQLAlchemy & Database Imports ---
+from sqlalchemy import func, or_, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy.orm import joinedload, selectinload
-from sqlalchemy.exc import SQLAlchemyError
-from config.database import get_db
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from config.database import get_db, SessionLocal
+from config.settings import settings
 # PERBARUI IMPORT MODEL
 from models.models import (
-    PhotoSession, Frame, Package, FramePosition, Transaction, OrderItem, Voucher, Capture
+    PhotoSession, Frame, Package, FramePosition, Transaction, OrderItem, Voucher, Capture, ComposeJob
 )
 
-# --- TAMBAHKAN: Import R2 client helper kita ---
-from config.r2 import get_r2_client, R2_BUCKET_NAME, R2_PUBLIC_URL
+# --- Storage objek gambar (R2 / lokal / memori, sesuai STORAGE_BACKEND) ---
+from services.storage import StorageFeatureUnavailableError, get_storage
+from services.storage_gc import storage_gc
+
+# --- Pengolahan gambar di process pool ---
+from services.compose import (
+    compose_digest, compose_engine, compose_photos, compose_results, compose_singleflight, ComposeTimeoutError,
+    PhotoSource, frame_cache, invalidate_frame_cache,
+)
+from services.filters import available_filters
+from services.imaging import (
+    CAPTURE_FORMATS, OUTPUT_EXTENSIONS, build_capture_derivatives, detect_photo_slots, image_phash, print_size,
+    read_image_size, render_frame_print_variant, slot_geometry, sniff_capture_format,
+)
+from services.derivatives import capture_derivatives
+from services.job_queue import compose_job_queue
+from services.http_cache import SerializedResponseCache
+from services.metadata import PositionInfo, metadata_cache
+from services.timing import stage, start_timer
 
 # Inisialisasi Router
 photobox = APIRouter()
@@ -49,15 +67,48 @@ class PhotoPlacement(BaseModel):
     width: float
     height: float
 
+class OutputProfile(BaseModel):
+    # Master kualitas cetak: PNG (default, sama seperti sebelumnya), JPEG dengan DPI 300, atau WebP
+    format: Literal["png", "jpeg", "webp"] = "png"
+    png_compress_level: int = Field(6, ge=0, le=9)   # 1-3 jauh lebih cepat, file sedikit lebih besar
+    quality: int = Field(95, ge=1, le=100)           # untuk master JPEG/WebP
+    # Salinan share opsional (untuk dikirim ke HP pelanggan), dibuat dari kanvas yang sama
+    share_format: Literal["webp", "jpeg"] | None = None
+    share_quality: int = Field(80, ge=1, le=100)
+    share_max_width: int | None = Field(1080, ge=1)
+
 class ComposeRequest(BaseModel):
     frame_url: str
     filter_name: str
     photos: List[PhotoPlacement]
     email_recipient: str | None = None
+    output: OutputProfile = OutputProfile()
+
+class SessionComposeRequest(BaseModel):
+    filter_name: str | None = None   # default: PhotoSession.image_filter
+    output: OutputProfile = OutputProfile()
+    allow_missing: bool = False      # izinkan slot frame yang belum punya capture (dibiarkan kosong)
 
 class SetFrameRequest(BaseModel):
     frame_id: str
 
+class CapturePresignRequest(BaseModel):
+    session_id: str
+    frame_position_id: str
+    content_type: Literal["image/jpeg", "image/png", "image/webp"] = "image/jpeg"
+
+class CaptureFinalizeRequest(BaseModel):
+    session_id: str
+    frame_position_id: str
+    key: str
+
+class FramePresignRequest(BaseModel):
+    content_type: Literal["image/png"] = "image/png"   # frame harus PNG agar area transparan terbaca
+
+class FrameFinalizeRequest(BaseModel):
+    name: str
+    key: str
+
 class PackageCreateRequest(BaseModel):
     type: str
     price: Decimal
@@ -67,122 +118,455 @@ class PackageCreateRequest(BaseModel):
 # FUNGSI HELPER
 # ==============================================================================
 
-def predict_photo_locations(image_bytes: BytesIO, min_area_threshold: int = 1000):
-    """Menganalisis byte gambar PNG untuk menemukan area transparan."""
+async def predict_photo_locations(image_bytes: bytes, min_area_threshold: int = 1000) -> dict:
+    """
+    Menganalisis byte gambar PNG untuk menemukan area transparan. Dijalankan di process pool
+    (services.imaging.detect_photo_slots) agar frame beresolusi besar tidak menahan event loop.
+    """
     try:
-        img = Image.open(image_bytes)
-        if img.format != 'PNG':
-            raise ValueError("Format gambar harus PNG untuk mendukung transparansi.")
-        if img.mode != 'RGBA':
-            img = img.convert('RGBA')
-
-        frame_width, frame_height = img.size
-        frame_np = np.array(img)
-        alpha_channel = frame_np[:, :, 3]
-        _, binary_mask = cv2.threshold(alpha_channel, 0, 255, cv2.THRESH_BINARY_INV)
-        contours, _ = cv2.findContours(binary_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-
-        positions = []
-        for contour in contours:
-            if cv2.contourArea(contour) > min_area_threshold:
-                x, y, w, h = cv2.boundingRect(contour)
-                positions.append({"x": int(x), "y": int(y), "width": int(w), "height": int(h)})
-
-        if not positions:
-            raise ValueError("Tidak ada area foto transparan yang valid terdeteksi.")
-        
-        positions.sort(key=lambda p: p['y'])
-        return {"width": frame_width, "height": frame_height, "positions": positions}
+        return await compose_engine.run(detect_photo_slots, image_bytes, min_area_threshold)
     except Exception as e:
         raise ValueError(f"Gagal memproses gambar: {str(e)}")
 
-def apply_filter(image: Image.Image, filter_name: str) -> Image.Image:
-    """Mengaplikasikan filter ke gambar Pillow."""
-    if filter_name == "grayscale":
-        return ImageOps.grayscale(image).convert("RGBA")
-    if filter_name == "sepia":
-        sepia_image = image.copy().convert("L")
-        sepia_image = ImageOps.colorize(sepia_image, black="#704214", white="#E6D8B4")
-        return sepia_image.convert(image.mode)
-    return image
-
 def send_email_with_attachment(recipient_email: str, file_path: str):
     """Placeholder untuk fungsi pengiriman email."""
     logging.info(f"Fungsi kirim email dipanggil untuk {recipient_email} dengan file {file_path}")
     pass
 
+async def _gather_or_raise(*aws):
+    """
+    Seperti asyncio.gather, tetapi selalu menunggu SEMUA awaitable selesai sebelum
+    melempar error pertama, sehingga daftar objek yang sudah terunggah lengkap saat rollback.
+    """
+    results = await asyncio.gather(*aws, return_exceptions=True)
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+    return results
+
+async def _delete_objects_quietly(store, keys: List[str]):
+    """Menghapus objek-objek storage sekaligus (rollback); kegagalan hanya dicatat di log."""
+    if not keys:
+        return
+    try:
+        failed = await store.delete_many(keys)
+    except Exception as e:
+        failed = keys
+        logger.error(f"Failed to delete storage objects during rollback: {e}")
+    for key in failed:
+        logger.error(f"Failed to delete storage object {key} during rollback")
+
+class UploadTooLargeError(Exception):
+    pass
+
+def _spool_upload_to_disk(source, max_bytes: int, chunk_size: int = 1024 * 1024) -> tuple:
+    """
+    Menyalin stream upload ke file sementara per potongan (memori terbatas pada `chunk_size`).
+    File ini dibaca terpisah oleh unggahan original dan oleh worker pembuat level turunan.
+    sha256 isi file dihitung sambil menyalin. Mengembalikan (path, ukuran byte, sha256 hex).
+    """
+    source.seek(0)
+    total = 0
+    digest = hashlib.sha256()
+    with tempfile.NamedTemporaryFile(prefix="capture-", delete=False) as spool:
+        try:
+            while chunk := source.read(chunk_size):
+                total += len(chunk)
+                if total > max_bytes:
+                    raise UploadTooLargeError(f"File melebihi batas {max_bytes // (1024 * 1024)} MB.")
+                digest.update(chunk)
+                spool.write(chunk)
+        except BaseException:
+            spool.close()
+            os.unlink(spool.name)
+            raise
+    return spool.name, total, digest.hexdigest()
+
+async def _presigned_put_url(store, key: str, content_type: str) -> dict:
+    """URL presigned untuk PUT langsung ke storage; klien wajib mengirim header Content-Type yang sama."""
+    expires_in = settings.PRESIGNED_UPLOAD_EXPIRES_SECONDS
+    try:
+        url = await store.presigned_put(key, content_type, expires_in)
+    except StorageFeatureUnavailableError as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    return {"uploadUrl": url, "method": "PUT", "key": key, "headers": {"Content-Type": content_type}, "expiresIn": expires_in}
+
+async def _inspect_uploaded_object(store, key: str) -> tuple:
+    """
+    Memastikan objek hasil upload presigned ada dan mengembalikan (ukuran byte, format hasil sniff).
+    Hanya 16 byte pertama yang diunduh untuk mengenali format.
+    """
+    head = await store.head(key)
+    if head is None:
+        raise HTTPException(status_code=404, detail="Objek belum diunggah ke storage.")
+    header = await store.get_range(key, 0, 15)
+    return head.size, sniff_capture_format(header)
+
+def _key_from_url(url: str) -> str:
+    return get_storage().key_from_url(url)
+
 # ==============================================================================
 # ENDPOINT /frames
 # ==============================================================================
 
+# Body JSON /frames & /packages yang sudah diserialisasi, dengan ETag untuk polling kiosk
+frames_response = SerializedResponseCache(ttl_seconds=settings.METADATA_CACHE_TTL_SECONDS)
+packages_response = SerializedResponseCache(ttl_seconds=settings.METADATA_CACHE_TTL_SECONDS)
+
 @photobox.get("/frames")
-async def get_frames(response: Response, db: AsyncSession = Depends(get_db)):
+async def get_frames(request: Request, response: Response, db: AsyncSession = Depends(get_db)):
+    async def build():
+        data = await metadata_cache.get_frame_catalog(db)
+        return {"status": "SUCCESS", "data": data} if data else None
+
     try:
-        query = select(Frame).options(selectinload(Frame.positions)).distinct()
-        result = await db.execute(query)
-        frames = result.scalars().unique().all()
-        if not frames:
+        cached = await frames_response.respond(request, build)
+        if cached is None:
             response.status_code = 404
             return {"status": "NOT_FOUND", "message": "No frames found"}
-
-        data = [
-            {"id": frame.id, "name": frame.name, "imageLink": frame.image_link, "width": frame.width, "height": frame.height,
-             "positions": [{"id": pos.id, "x": pos.x, "y": pos.y, "width": pos.width, "height": pos.height} for pos in (frame.positions or [])],
-             "createdAt": frame.created_at, "updatedAt": frame.updated_at}
-            for frame in frames
-        ]
-        return {"status": "SUCCESS", "data": data}
+        return cached
     except SQLAlchemyError as e:
         response.status_code = 500
         return {"status": "ERROR", "message": str(e)}
 
+async def _analyze_frame(contents: bytes) -> tuple:
+    """
+    Deteksi area foto, pembuatan varian cetak, dan pHash frame, berjalan bersamaan di process pool.
+    Mengembalikan (prediction_data, varian cetak, pHash).
+    """
+    return await asyncio.gather(
+        predict_photo_locations(contents),
+        compose_engine.run(render_frame_print_variant, contents),
+        compose_engine.run(image_phash, contents),
+    )
 
+async def _find_frame_by_hash(db: AsyncSession, content_sha256: str) -> Frame | None:
+    """Frame yang file original-nya persis sama (sha256), beserta posisinya."""
+    result = await db.execute(
+        select(Frame).options(selectinload(Frame.positions)).filter_by(content_sha256=content_sha256)
+    )
+    return result.scalars().first()
+
+async def _upload_frame_print_variant(store, variant, public_url: str, frame_size: tuple, uploaded_keys: List[str]) -> dict:
+    """
+    Mengunggah varian cetak frame dan mengembalikan kolom print_* untuk Frame. Bila `variant`
+    None (frame asli sudah berukuran cetak), original sendiri yang dicatat sebagai varian cetak.
+    """
+    if variant is None:
+        return {"print_image_link": public_url, "print_width": frame_size[0], "print_height": frame_size[1]}
+    data, (width, height), content_type, extension = variant
+    print_key = f"frames/{uuid4()}_print.{extension}"
+    await store.put_bytes(print_key, data, content_type)
+    uploaded_keys.append(print_key)
+    return {"print_image_link": store.public_url(print_key), "print_width": width, "print_height": height}
+
+def _frame_print_key(frame) -> str | None:
+    """Key varian cetak frame, hanya bila ukurannya cocok dengan kanvas cetak saat ini."""
+    if not frame.print_image_link or (frame.print_width, frame.print_height) != print_size((frame.width, frame.height)):
+        return None
+    return _key_from_url(frame.print_image_link)
+
+def _new_frame(name: str, public_url: str, prediction_data: dict, columns: dict) -> Frame:
+    """
+    Objek Frame dan FramePosition hasil predict_photo_locations. `columns` berisi kolom
+    tambahan Frame: varian cetak (print_*) dan hash isi (content_sha256, phash).
+    """
+    new_frame = Frame(
+        id=str(uuid4()), name=name, image_link=public_url, width=prediction_data['width'], height=prediction_data['height'],
+        **columns,
+    )
+    new_frame.positions = [
+        FramePosition(id=str(uuid4()), x=pos['x'], y=pos['y'], width=pos['width'], height=pos['height'])
+        for pos in prediction_data['positions']
+    ]
+    return new_frame
+
+async def _save_frame(db: AsyncSession, name: str, public_url: str, prediction_data: dict, columns: dict) -> Frame:
+    """Menyimpan Frame baru lalu membuang cache katalog frame."""
+    new_frame = _new_frame(name, public_url, prediction_data, columns)
+    db.add(new_frame)
+    await db.commit()
+    metadata_cache.invalidate_frames()
+    frames_response.bump()
+    await db.refresh(new_frame)
+    return new_frame
+
+def _new_frame_to_dict(frame: Frame, prediction_data: dict) -> dict:
+    return {
+        "id": frame.id, "name": frame.name, "imageLink": frame.image_link, "width": frame.width,
+        "height": frame.height, "printImageLink": frame.print_image_link, "positions": prediction_data['positions'],
+        "detectionTimings": prediction_data.get('timings'),
+        "createdAt": frame.created_at, "updatedAt": frame.updated_at,
+    }
+
+def _existing_frame_to_dict(frame: Frame) -> dict:
+    positions = [{"x": p.x, "y": p.y, "width": p.width, "height": p.height} for p in frame.positions]
+    return _new_frame_to_dict(frame, {"positions": positions})
 
 @photobox.post("/frames")
 async def add_frame(db: AsyncSession = Depends(get_db), name: str = Form(...), frame_image: UploadFile = File(...)):
-    contents = await frame_image.read()
+    contents = await frame_image.read(settings.FRAME_MAX_UPLOAD_BYTES + 1)
     if not contents:
         raise HTTPException(status_code=400, detail="File yang diunggah kosong.")
+    if len(contents) > settings.FRAME_MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail="File melebihi batas ukuran frame.")
+    # File yang persis sama sudah pernah diunggah: pakai objek dan hasil analisis yang ada
+    content_sha256 = await asyncio.to_thread(lambda: hashlib.sha256(contents).hexdigest())
+    duplicate = await _find_frame_by_hash(db, content_sha256)
+    if duplicate:
+        return {"status": "SUCCESS", "duplicate": True, "data": _existing_frame_to_dict(duplicate)}
     try:
-        prediction_data = predict_photo_locations(BytesIO(contents))
+        prediction_data, variant, phash = await _analyze_frame(contents)
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Gagal memproses gambar frame: {e}")
 
-    r2_client = get_r2_client()
-    if not r2_client:
-        raise HTTPException(status_code=500, detail="Layanan penyimpanan R2 tidak tersedia.")
+    store = get_storage()
 
     file_extension = os.path.splitext(frame_image.filename)[1]
     object_key = f"frames/{uuid4()}{file_extension}"
-    public_url = f"{R2_PUBLIC_URL}/{object_key}"
+    public_url = store.public_url(object_key)
+    uploaded_keys = []
 
     try:
-        
-        r2_client.put_object(Bucket=R2_BUCKET_NAME, Key=object_key, Body=contents, ContentType=frame_image.content_type)
-        new_frame = Frame(
-            id=str(uuid4()), name=name, image_link=public_url, width=prediction_data['width'], height=prediction_data['height']
+        await store.put_bytes(object_key, contents, frame_image.content_type)
+        uploaded_keys.append(object_key)
+        frame_size = (prediction_data['width'], prediction_data['height'])
+        print_variant = await _upload_frame_print_variant(store, variant, public_url, frame_size, uploaded_keys)
+        new_frame = await _save_frame(
+            db, name, public_url, prediction_data, {**print_variant, "content_sha256": content_sha256, "phash": phash}
         )
-        new_frame.positions = [
-            FramePosition(id=str(uuid4()), x=pos['x'], y=pos['y'], width=pos['width'], height=pos['height'])
-            for pos in prediction_data['positions']
-        ]
-        db.add(new_frame)
-        await db.commit()
-        await db.refresh(new_frame)
-        
-        return {"status": "SUCCESS", "data": {
-                "id": new_frame.id, "name": new_frame.name, "imageLink": new_frame.image_link, "width": new_frame.width,
-                "height": new_frame.height, "positions": prediction_data['positions'],
-                "createdAt": new_frame.created_at, "updatedAt": new_frame.updated_at,
-            }}
+        return {"status": "SUCCESS", "duplicate": False, "data": _new_frame_to_dict(new_frame, prediction_data)}
     except Exception as e:
-        try:
-            r2_client.delete_object(Bucket=R2_BUCKET_NAME, Key=object_key)
-        except Exception as delete_e:
-            logging.error(f"Gagal melakukan rollback upload R2 untuk key {object_key}: {delete_e}")
+        await _delete_objects_quietly(store, uploaded_keys)
         await db.rollback()
         raise HTTPException(status_code=500, detail=f"Terjadi kesalahan: {e}")
 
+@photobox.post("/frames/presign")
+async def presign_frame_upload(request: FramePresignRequest):
+    """Langkah 1 upload frame langsung ke R2: URL PUT presigned untuk `frames/{uuid}.png`."""
+    store = get_storage()
+    return {"status": "SUCCESS", "data": await _presigned_put_url(store, f"frames/{uuid4()}.png", request.content_type)}
+
+_FRAME_UPLOAD_KEY = re.compile(r"^frames/[0-9a-f-]{36}\.png$")
+
+@photobox.post("/frames/finalize")
+async def finalize_frame_upload(request: FrameFinalizeRequest, db: AsyncSession = Depends(get_db)):
+    """
+    Langkah 2 upload frame langsung ke R2: memastikan objek ada, menganalisis area foto
+    (unduhan R2 -> API, bukan dari klien), lalu mendaftarkan Frame dan posisinya.
+    """
+    if not _FRAME_UPLOAD_KEY.match(request.key):
+        raise HTTPException(status_code=400, detail="Key frame tidak valid.")
+    store = get_storage()
+    public_url = store.public_url(request.key)
+    existing = await db.execute(select(Frame).options(selectinload(Frame.positions)).filter_by(image_link=public_url))
+    frame = existing.scalars().first()
+    if frame:
+        return {"status": "SUCCESS", "duplicate": False, "data": _existing_frame_to_dict(frame)}
+
+    size, image_format = await _inspect_uploaded_object(store, request.key)
+    if image_format != "png":
+        await _delete_objects_quietly(store, [request.key])
+        raise HTTPException(status_code=400, detail="Frame harus berupa file PNG.")
+    if size > settings.FRAME_MAX_UPLOAD_BYTES:
+        await _delete_objects_quietly(store, [request.key])
+        raise HTTPException(status_code=413, detail="File melebihi batas ukuran frame.")
+
+    contents = await store.get_bytes(request.key)
+    content_sha256 = await asyncio.to_thread(lambda: hashlib.sha256(contents).hexdigest())
+    duplicate = await _find_frame_by_hash(db, content_sha256)
+    if duplicate:
+        # Objek yang baru diunggah tidak diperlukan; frame lama dipakai ulang
+        await _delete_objects_quietly(store, [request.key])
+        return {"status": "SUCCESS", "duplicate": True, "data": _existing_frame_to_dict(duplicate)}
+    try:
+        prediction_data, variant, phash = await _analyze_frame(contents)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Gagal memproses gambar frame: {e}")
+
+    uploaded_keys = []
+    try:
+        frame_size = (prediction_data['width'], prediction_data['height'])
+        print_variant = await _upload_frame_print_variant(store, variant, public_url, frame_size, uploaded_keys)
+        new_frame = await _save_frame(
+            db, request.name, public_url, prediction_data, {**print_variant, "content_sha256": content_sha256, "phash": phash}
+        )
+    except Exception as e:
+        # Hanya varian cetak yang dihapus; original tetap ada agar finalize bisa diulang
+        await _delete_objects_quietly(store, uploaded_keys)
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=f"Terjadi kesalahan: {e}")
+    return {"status": "SUCCESS", "duplicate": False, "data": _new_frame_to_dict(new_frame, prediction_data)}
+
+# Nama file opsional di dalam zip import: {"nama_file.png": "Nama Frame", ...}
+FRAME_IMPORT_MANIFEST = "frames.json"
+
+def _frame_import_entries(archive: zipfile.ZipFile) -> tuple:
+    """
+    Memilih file PNG dari zip import beserta nama frame-nya (dari manifest, default: nama file
+    tanpa ekstensi). Mengembalikan (entries, rejected) dengan entries = [(ZipInfo, nama)] dan
+    rejected = {ZipInfo: baris laporan} untuk file yang dilewati (bukan PNG) atau terlalu besar. Membaca manifest dari file, jadi dipanggil lewat asyncio.to_thread.
+    """
+    names = {}
+    if FRAME_IMPORT_MANIFEST in archive.namelist():
+        try:
+            names = json.loads(archive.read(FRAME_IMPORT_MANIFEST))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"{FRAME_IMPORT_MANIFEST} tidak valid: {e}")
+        if not isinstance(names, dict):
+            raise HTTPException(status_code=400, detail=f"{FRAME_IMPORT_MANIFEST} harus berupa objek JSON.")
+
+    entries, rejected = [], {}
+    for info in archive.infolist():
+        basename = os.path.basename(info.filename)
+        if info.is_dir() or info.filename == FRAME_IMPORT_MANIFEST or info.filename.startswith("__MACOSX/") or basename.startswith("."):
+            continue
+        if not basename.lower().endswith(".png"):
+            rejected[info] = {"file": info.filename, "status": "SKIPPED", "message": "Bukan file PNG."}
+            continue
+        if info.file_size > settings.FRAME_MAX_UPLOAD_BYTES:
+            rejected[info] = {"file": info.filename, "status": "FAILED", "message": "File melebihi batas ukuran frame."}
+            continue
+        name = names.get(info.filename) or names.get(basename) or os.path.splitext(basename)[0]
+        entries.append((info, str(name)))
+
+    if len(entries) > settings.FRAME_IMPORT_MAX_FILES:
+        raise HTTPException(status_code=400, detail=f"Maksimal {settings.FRAME_IMPORT_MAX_FILES} frame per import.")
+    if sum(info.file_size for info, _ in entries) > settings.FRAME_IMPORT_MAX_BYTES:
+        raise HTTPException(status_code=413, detail="Total ukuran frame di dalam zip melebihi batas.")
+    return entries, rejected
+
+class DuplicateFrameError(Exception):
+    def __init__(self, duplicate_of: str):
+        super().__init__(f"Sama persis dengan {duplicate_of}.")
+        self.duplicate_of = duplicate_of
+
+async def _import_frame(
+    store, filename: str, name: str, contents: bytes, upload_limiter: asyncio.Semaphore,
+    known_hashes: dict, importing: dict,
+) -> tuple:
+    """
+    Analisis (process pool) lalu unggah satu frame dari zip import. Mengembalikan (Frame belum
+    disimpan, prediction_data, key yang terunggah); bila gagal, objek yang sempat terunggah dihapus.
+    `known_hashes` (sha256 -> id frame / nama file) berisi frame yang sudah ada atau sudah berhasil
+    diunggah, dan dipakai untuk melewati file duplikat. `importing` (sha256 -> Future) menandai file
+    yang sedang diproses: salinan identiknya menunggu hasil itu, lalu dicoba sendiri bila gagal.
+    """
+    if sniff_capture_format(contents[:16]) != "png":
+        raise ValueError("Bukan file PNG.")
+    content_sha256 = await asyncio.to_thread(lambda: hashlib.sha256(contents).hexdigest())
+    while content_sha256 in importing:
+        await importing[content_sha256]
+    if content_sha256 in known_hashes:
+        raise DuplicateFrameError(known_hashes[content_sha256])
+    done = importing[content_sha256] = asyncio.get_running_loop().create_future()
+
+    try:
+        prediction_data, variant, phash = await _analyze_frame(contents)
+        object_key = f"frames/{uuid4()}.png"
+        public_url = store.public_url(object_key)
+        frame_size = (prediction_data['width'], prediction_data['height'])
+        uploaded_keys = []
+        try:
+            async with upload_limiter:
+                await store.put_bytes(object_key, contents, "image/png")
+                uploaded_keys.append(object_key)
+                print_variant = await _upload_frame_print_variant(store, variant, public_url, frame_size, uploaded_keys)
+        except Exception:
+            await _delete_objects_quietly(store, uploaded_keys)
+            raise
+        known_hashes[content_sha256] = filename
+    finally:
+        del importing[content_sha256]
+        done.set_result(None)
+    columns = {**print_variant, "content_sha256": content_sha256, "phash": phash}
+    return _new_frame(name, public_url, prediction_data, columns), prediction_data, uploaded_keys
+
+@photobox.post("/frames/import")
+async def import_frames(db: AsyncSession = Depends(get_db), archive: UploadFile = File(...)):
+    """
+    Import banyak frame sekaligus dari zip berisi PNG (opsional dengan manifest frames.json).
+    Analisis berjalan paralel di process pool, unggahan ke storage dibatasi FRAME_IMPORT_UPLOAD_CONCURRENCY,
+    dan semua Frame/FramePosition disimpan dalam satu commit. Laporan dikembalikan per file;
+    file yang gagal dianalisis tidak membatalkan file lainnya, dan file yang sama persis dengan
+    frame yang sudah ada (atau file lain di zip yang sama) dilewati sebagai DUPLICATE.
+    """
+    store = get_storage()
+    try:
+        zip_file = await asyncio.to_thread(zipfile.ZipFile, archive.file)
+    except zipfile.BadZipFile:
+        raise HTTPException(status_code=400, detail="File import harus berupa arsip zip.")
+
+    with zip_file:
+        archive_order = zip_file.infolist()
+        entries, rows = await asyncio.to_thread(_frame_import_entries, zip_file)
+        if not entries and all(row["status"] == "SKIPPED" for row in rows.values()):
+            raise HTTPException(status_code=400, detail="Tidak ada file PNG di dalam zip.")
+
+        hash_rows = await db.execute(select(Frame.content_sha256, Frame.id).filter(Frame.content_sha256.isnot(None)))
+        known_hashes = {content_sha256: frame_id for content_sha256, frame_id in hash_rows.all()}
+        importing = {}
+
+        # Membatasi jumlah frame yang sudah dibaca ke memori tetapi belum selesai diproses
+        in_flight = asyncio.Semaphore(compose_engine.pool_size * 2)
+        upload_limiter = asyncio.Semaphore(settings.FRAME_IMPORT_UPLOAD_CONCURRENCY)
+
+        # ZipFile berbagi satu file handle, jadi entri dibaca bergantian
+        read_lock = asyncio.Lock()
+
+        async def run_entry(info: zipfile.ZipInfo, name: str):
+            try:
+                async with read_lock:
+                    contents = await asyncio.to_thread(zip_file.read, info)
+                return await _import_frame(
+                    store, info.filename, name, contents, upload_limiter, known_hashes, importing
+                )
+            finally:
+                in_flight.release()
+
+        tasks = []
+        for info, name in entries:
+            await in_flight.acquire()
+            tasks.append(asyncio.ensure_future(run_entry(info, name)))
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+
+    imported, uploaded_keys = [], []
+    for (info, name), result in zip(entries, results):
+        if isinstance(result, DuplicateFrameError):
+            rows[info] = {"file": info.filename, "name": name, "status": "DUPLICATE", "duplicateOf": result.duplicate_of}
+            continue
+        if isinstance(result, Exception):
+            rows[info] = {"file": info.filename, "name": name, "status": "FAILED", "message": str(result)}
+            continue
+        new_frame, prediction_data, keys = result
+        imported.append((info, new_frame, prediction_data))
+        uploaded_keys += keys
+
+    if imported:
+        try:
+            db.add_all([new_frame for _, new_frame, _ in imported])
+            await db.commit()
+        except Exception as e:
+            await db.rollback()
+            await _delete_objects_quietly(store, uploaded_keys)
+            raise HTTPException(status_code=500, detail=f"Gagal menyimpan frame hasil import: {e}")
+        metadata_cache.invalidate_frames()
+        frames_response.bump()
+
+    for info, new_frame, prediction_data in imported:
+        rows[info] = {"file": info.filename, "status": "IMPORTED", **_new_frame_to_dict(new_frame, prediction_data)}
+    # Laporan mengikuti urutan file di dalam zip agar mudah dicocokkan operator
+    report = [rows[info] for info in archive_order if info in rows]
+    counts = {status: sum(1 for item in report if item["status"] == status) for status in ("FAILED", "DUPLICATE", "SKIPPED")}
+    return {
+        "status": "SUCCESS" if imported or counts["DUPLICATE"] else "FAILED",
+        "summary": {
+            "imported": len(imported), "failed": counts["FAILED"], "duplicates": counts["DUPLICATE"],
+            "skipped": counts["SKIPPED"],
+        },
+        "data": report,
+    }
+
 @photobox.delete("/frames/{frame_id}")
 async def delete_frame(frame_id: str, db: AsyncSession = Depends(get_db)):
     result = await db.execute(select(Frame).filter_by(id=frame_id))
@@ -191,17 +575,19 @@ async def delete_frame(frame_id: str, db: AsyncSession = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Frame tidak ditemukan.")
 
     image_url = frame.image_link
+    print_url = frame.print_image_link
     await db.delete(frame)
     await db.commit()
+    metadata_cache.invalidate_frames()
+    frames_response.bump()
     
     if image_url:
-        r2_client = get_r2_client()
-        if r2_client:
-            object_key = urlparse(image_url).path.lstrip('/')
-            try:
-                r2_client.delete_object(Bucket=R2_BUCKET_NAME, Key=object_key)
-            except Exception as e:
-                logging.error(f"Gagal menghapus objek {object_key} dari R2: {e}")
+        object_key = _key_from_url(image_url)
+        invalidate_frame_cache(object_key)
+        object_keys = [object_key]
+        if print_url and print_url != image_url:
+            object_keys.append(_key_from_url(print_url))
+        await _delete_objects_quietly(get_storage(), object_keys)
     return {"status": "SUCCESS", "message": f"Frame dengan ID {frame_id} berhasil dihapus."}
 
 # ==============================================================================
@@ -212,130 +598,581 @@ async def delete_frame(frame_id: str, db: AsyncSession = Depends(get_db)):
 
 # api/photobox.py
 
+async def _stored_captures_by_hash(db: AsyncSession, session_id: str, hashes: set) -> dict:
+    """
+    Capture tersimpan sesi ini dengan sha256 di `hashes`, per (frame_position_id, sha256). Hanya dipanggil
+    setelah insert ditolak index unik uq_captures_position_sha256 (upload ulang dari kiosk), jadi
+    upload biasa tidak membayar query tambahan.
+    """
+    result = await db.execute(
+        select(Capture).filter(
+            Capture.session_id == session_id,
+            Capture.content_sha256.in_(hashes),
+        )
+    )
+    return {(capture.frame_position_id, capture.content_sha256): capture for capture in result.scalars()}
+
+async def _ingest_capture(
+    store, session_id: str, position: PositionInfo, file: UploadFile, uploaded_keys: List[str]
+) -> Capture:
+    """
+    Memvalidasi satu file capture, mengunggah original-nya, dan mengembalikan objek Capture
+    (belum di-add ke sesi DB) berstatus PENDING untuk pipeline level turunan. Key yang berhasil
+    diunggah dicatat di `uploaded_keys` agar pemanggil bisa me-rollback bila langkah lain gagal.
+    """
+    # 1. Validasi format dari header, lalu salin stream upload ke disk per potongan
+    with stage("read"):
+        header = await file.read(16)
+        if not header:
+            raise HTTPException(status_code=400, detail=f"File {file.filename} cannot be empty.")
+        image_format = sniff_capture_format(header)
+        if image_format is None:
+            raise HTTPException(status_code=415, detail=f"Format capture {file.filename} harus JPEG, PNG, atau WebP.")
+        try:
+            spool_path, _, content_sha256 = await asyncio.to_thread(
+                _spool_upload_to_disk, file.file, settings.CAPTURE_MAX_UPLOAD_BYTES
+            )
+        except UploadTooLargeError as e:
+            raise HTTPException(status_code=413, detail=f"{file.filename}: {e}")
+
+    # 2. Original disimpan byte-identik dengan file kamera (tanpa decode/re-encode), diunggah
+    #    streaming dari disk. Level turunan dibuat belakangan oleh capture_derivatives.
+    #    Header dibaca dulu (tanpa decode piksel) agar file yang lolos sniff tetapi rusak
+    #    ditolak sebelum ada objek yang terunggah.
+    original_content_type, original_extension = CAPTURE_FORMATS[image_format]
+    original_key = f"captures/{session_id}/{uuid4()}_original.{original_extension}"
+    try:
+        try:
+            width, height = await asyncio.to_thread(read_image_size, spool_path)
+        except Exception as e:
+            raise HTTPException(status_code=415, detail=f"Capture {file.filename} tidak bisa dibaca sebagai gambar: {e}")
+        try:
+            with stage("upload"):
+                await store.put_file(original_key, spool_path, original_content_type)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Failed to upload capture {file.filename}: {e}")
+        uploaded_keys.append(original_key)
+    finally:
+        os.unlink(spool_path)
+
+    original_url = store.public_url(original_key)
+    return Capture(
+        id=str(uuid4()),
+        session_id=session_id,
+        raw_capture_url=original_url,
+        # Sementara menunjuk ke original sampai level "normal" selesai dibuat
+        normal_capture_url=original_url,
+        frame_position_id=position.id,
+        capture_levels=json.dumps({"original": {"key": original_key, "width": width, "height": height}}),
+        derivative_status='PENDING',
+        derivative_attempts=0,
+        content_sha256=content_sha256,
+    )
+
+async def _build_capture_derivatives(capture: Capture) -> dict:
+    """Handler untuk capture_derivatives: membuat level turunan satu capture lalu mengunggahnya."""
+    async with SessionLocal() as db:
+        position = (await metadata_cache.get_positions(db, [capture.frame_position_id])).get(capture.frame_position_id)
+    if position is None:
+        raise ValueError("FramePosition milik capture ini sudah tidak ada.")
+
+    store = get_storage()
+
+    frame_size = (position.frame_width, position.frame_height)
+    placement = (position.x, position.y, position.width, position.height)
+    _, print_slot_size = slot_geometry(frame_size, print_size(frame_size), placement)
+
+    capture_levels = json.loads(capture.capture_levels or "{}")
+    original_key = capture_levels.get("original", {}).get("key") or _key_from_url(capture.raw_capture_url)
+    original = await store.get_bytes(original_key)
+    ((original_width, original_height), renditions), phash = await asyncio.gather(
+        compose_engine.run(
+            build_capture_derivatives, original, (position.width, position.height), print_slot_size,
+            settings.CAPTURE_RENDITIONS,
+        ),
+        compose_engine.run(image_phash, original),
+    )
+    capture_levels["original"] = {"key": original_key, "width": original_width, "height": original_height}
+
+    uploaded_keys = []
+
+    async def upload_level(level_name: str, encoded) -> None:
+        data, (width, height), content_type, extension = encoded
+        level_key = f"captures/{capture.session_id}/{uuid4()}_{level_name}.{extension}"
+        await store.put_bytes(level_key, data, content_type)
+        uploaded_keys.append(level_key)
+        capture_levels[level_name] = {"key": level_key, "width": width, "height": height}
+
+    try:
+        await _gather_or_raise(*(upload_level(name, encoded) for name, encoded in renditions.items()))
+    except Exception:
+        await _delete_objects_quietly(store, uploaded_keys)
+        raise
+
+    values = {"capture_levels": json.dumps(capture_levels), "phash": phash}
+    if capture.content_sha256 is None:
+        # Upload presigned tidak melewati API, jadi sha256 baru bisa dihitung di sini. File yang sama
+        # di posisi yang sama sudah tercatat (index unik): capture ini disimpan tanpa sha256.
+        content_sha256 = await asyncio.to_thread(lambda: hashlib.sha256(original).hexdigest())
+        async with SessionLocal() as db:
+            stored = await _stored_captures_by_hash(db, capture.session_id, {content_sha256})
+        if (capture.frame_position_id, content_sha256) not in stored:
+            values["content_sha256"] = content_sha256
+    if "normal" in renditions:
+        values["normal_capture_url"] = store.public_url(capture_levels['normal']['key'])
+    return values
+
+capture_derivatives.set_handler(_build_capture_derivatives)
+
+def _capture_to_dict(capture: Capture, position: PositionInfo) -> dict:
+    return {
+        "original": capture.raw_capture_url,
+        "normal": capture.normal_capture_url,
+        "x": position.x,
+        "y": position.y,
+        "width": position.width,
+        "height": position.height,
+        "derivativeStatus": capture.derivative_status,
+    }
+
+async def _load_session_position(db: AsyncSession, session_id: str, frame_position_id: str) -> PositionInfo:
+    """Validasi PhotoSession dan FramePosition (cache metadata, atau satu query bila belum ada)."""
+    session_exists, positions = await metadata_cache.get_session_positions(db, session_id, [frame_position_id])
+    if not session_exists:
+        raise HTTPException(status_code=404, detail="PhotoSession not found")
+    if frame_position_id not in positions:
+        raise HTTPException(status_code=404, detail="FramePosition not found")
+    return positions[frame_position_id]
+
 @photobox.post("/captures", status_code=HTTPStatus.CREATED)
 async def upload_capture(
+    response: Response,
     file: UploadFile = File(...),
     session_id: str = Form(...),
     frame_position_id: str = Form(...),
     db: AsyncSession = Depends(get_db)
 ):
-    # 1. Validasi Session dan FramePosition
-    session_result = await db.execute(select(PhotoSession).filter_by(id=session_id))
-    if not session_result.scalars().first():
-        raise HTTPException(status_code=404, detail="PhotoSession not found")
+    timer = start_timer()
+    # 1. Validasi Session dan FramePosition (dari cache metadata bila ada)
+    with stage("db"):
+        position_data = await _load_session_position(db, session_id, frame_position_id)
 
-    position_result = await db.execute(select(FramePosition).filter_by(id=frame_position_id))
-    position_data = position_result.scalars().first()
-    if not position_data:
-        raise HTTPException(status_code=404, detail="FramePosition not found")
-
-    # 2. Baca file dan siapkan untuk diunggah
-    contents = await file.read()
-    if not contents:
-        raise HTTPException(status_code=400, detail="File cannot be empty.")
+    store = get_storage()
 
-    r2_client = get_r2_client()
-    if not r2_client:
-        raise HTTPException(status_code=500, detail="R2 storage service is unavailable.")
+    # 2. Unggah original, 3. simpan data capture ke database; level turunan dibuat di background
+    uploaded_keys = []
+    try:
+        new_capture = await _ingest_capture(store, session_id, position_data, file, uploaded_keys)
+    except Exception:
+        await _delete_objects_quietly(store, uploaded_keys)
+        raise
 
-    img = Image.open(BytesIO(contents)).convert("RGBA")
-    
-    original_key = f"captures/{session_id}/{uuid4()}_original.png"
-    normal_key = f"captures/{session_id}/{uuid4()}_normal.png"
-    
-    # 3. Proses dan Unggah ke R2
     try:
-        original_buffer = BytesIO()
-        img.save(original_buffer, format="PNG")
-        original_buffer.seek(0)
-        r2_client.put_object(Bucket=R2_BUCKET_NAME, Key=original_key, Body=original_buffer, ContentType='image/png')
+        with stage("commit"):
+            db.add(new_capture)
+            await db.commit()
+    except IntegrityError as e:
+        # Upload ulang file yang sama ke posisi ini: objek baru dibuang, Capture lama dikembalikan
+        await db.rollback()
+        await _delete_objects_quietly(store, uploaded_keys)
+        duplicate = (await _stored_captures_by_hash(db, session_id, {new_capture.content_sha256})).get(
+            (frame_position_id, new_capture.content_sha256)
+        )
+        if duplicate is None:
+            raise HTTPException(status_code=500, detail=f"Gagal menyimpan data capture: {e}")
+        response.status_code = HTTPStatus.OK
+        response.headers["Server-Timing"] = timer.server_timing()
+        return {**_capture_to_dict(duplicate, position_data), "duplicate": True, "timings": timer.as_dict()}
+    except Exception as e:
+        await db.rollback()
+        await _delete_objects_quietly(store, uploaded_keys)
+        raise HTTPException(status_code=500, detail=f"Gagal menyimpan data capture: {e}")
+    capture_derivatives.notify()
+
+    response.headers["Server-Timing"] = timer.server_timing()
+    return {**_capture_to_dict(new_capture, position_data), "duplicate": False, "timings": timer.as_dict()}
+
+@photobox.post("/sessions/{session_id}/captures", status_code=HTTPStatus.CREATED)
+async def upload_session_captures(
+    session_id: str,
+    response: Response,
+    files: List[UploadFile] = File(...),
+    frame_position_ids: List[str] = Form(...),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Mengunggah beberapa capture sekaligus untuk satu sesi. `files[i]` dipasangkan dengan
+    `frame_position_ids[i]`. Semua capture tersimpan atau tidak sama sekali: jika satu file
+    gagal, seluruh objek yang sudah terunggah dihapus dan tidak ada baris Capture yang dibuat.
+    """
+    timer = start_timer()
+    if len(files) != len(frame_position_ids):
+        raise HTTPException(status_code=400, detail="Jumlah files dan frame_position_ids harus sama.")
+
+    # 1. Sesi dan semua FramePosition divalidasi dari cache metadata, atau dengan satu query bila belum ada
+    with stage("db"):
+        session_exists, positions = await metadata_cache.get_session_positions(db, session_id, frame_position_ids)
+    if not session_exists:
+        raise HTTPException(status_code=404, detail="PhotoSession not found")
+    missing = sorted(set(frame_position_ids) - positions.keys())
+    if missing:
+        raise HTTPException(status_code=404, detail=f"FramePosition not found: {', '.join(missing)}")
 
-        normal_buffer = BytesIO()
-        thumbnail_size = (position_data.width, position_data.height)
-        
-        normal_img = img.copy()
-        normal_img.thumbnail(thumbnail_size, Image.Resampling.LANCZOS)
-        normal_img.save(normal_buffer, format="PNG", optimize=True)
-        normal_buffer.seek(0)
-        r2_client.put_object(Bucket=R2_BUCKET_NAME, Key=normal_key, Body=normal_buffer, ContentType='image/png')
+    store = get_storage()
+
+    # 2. Semua original diunggah paralel, 3. semua Capture disimpan dalam satu transaksi
+    uploaded_keys = []
+    try:
+        captures = await _gather_or_raise(*(
+            _ingest_capture(store, session_id, positions[position_id], file, uploaded_keys)
+            for file, position_id in zip(files, frame_position_ids)
+        ))
+    except Exception:
+        await _delete_objects_quietly(store, uploaded_keys)
+        raise
+
+    # Satu Capture per (posisi, sha256): file yang sama di dalam batch ini, atau yang sudah tersimpan
+    # sebelumnya (upload ulang batch, ditolak index unik), memakai Capture yang sama tanpa objek baru
+    duplicates = [False] * len(captures)
+
+    async def reuse_duplicates(stored: dict):
+        kept_by_hash = dict(stored)
+        dropped_keys = set()
+        for index, capture in enumerate(captures):
+            kept = kept_by_hash.setdefault((capture.frame_position_id, capture.content_sha256), capture)
+            if kept is not capture:
+                captures[index], duplicates[index] = kept, True
+                dropped_keys.add(_key_from_url(capture.raw_capture_url))
+        await _delete_objects_quietly(store, list(dropped_keys))
+
+    def new_captures() -> List[Capture]:
+        return [capture for capture, duplicate in zip(captures, duplicates) if not duplicate]
+
+    await reuse_duplicates({})
+    try:
+        with stage("commit"):
+            try:
+                db.add_all(new_captures())
+                await db.commit()
+            except IntegrityError:
+                await db.rollback()
+                await reuse_duplicates(await _stored_captures_by_hash(
+                    db, session_id, {capture.content_sha256 for capture in captures}
+                ))
+                db.add_all(new_captures())
+                await db.commit()
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to upload to R2: {e}")
+        await db.rollback()
+        await _delete_objects_quietly(store, uploaded_keys)
+        raise HTTPException(status_code=500, detail=f"Gagal menyimpan data capture: {e}")
+    capture_derivatives.notify()
 
-    # 4. Simpan data capture ke database
-    new_capture = Capture(
+    response.headers["Server-Timing"] = timer.server_timing()
+    return {
+        "status": "SUCCESS",
+        "data": [
+            {"id": capture.id, "frame_position_id": capture.frame_position_id,
+             **_capture_to_dict(capture, positions[capture.frame_position_id]),
+             "duplicate": duplicate}
+            for capture, duplicate in zip(captures, duplicates)
+        ],
+        "timings": timer.as_dict(),
+    }
+
+@photobox.post("/captures/presign")
+async def presign_capture_upload(request: CapturePresignRequest, db: AsyncSession = Depends(get_db)):
+    """
+    Langkah 1 upload capture langsung ke R2 (tanpa melewati API): URL PUT presigned untuk
+    `captures/{session_id}/{uuid}_original.{ext}`. Setelah PUT berhasil, panggil /captures/finalize.
+    """
+    await _load_session_position(db, request.session_id, request.frame_position_id)
+    store = get_storage()
+    extension = next(ext for content_type, ext in CAPTURE_FORMATS.values() if content_type == request.content_type)
+    key = f"captures/{request.session_id}/{uuid4()}_original.{extension}"
+    return {"status": "SUCCESS", "data": await _presigned_put_url(store, key, request.content_type)}
+
+@photobox.post("/captures/finalize", status_code=HTTPStatus.CREATED)
+async def finalize_capture_upload(request: CaptureFinalizeRequest, db: AsyncSession = Depends(get_db)):
+    """
+    Langkah 2 upload capture langsung ke R2: memastikan objek ada dan formatnya valid, lalu
+    mendaftarkan Capture (PENDING) dan mengantrikan pembuatan level turunan.
+    Aman dipanggil ulang: key yang sudah terdaftar mengembalikan Capture yang sama.
+    """
+    key_pattern = rf"^captures/{re.escape(request.session_id)}/[0-9a-f-]{{36}}_original\.(jpg|png|webp)$"
+    if not re.match(key_pattern, request.key):
+        raise HTTPException(status_code=400, detail="Key capture tidak valid untuk sesi ini.")
+    position = await _load_session_position(db, request.session_id, request.frame_position_id)
+
+    store = get_storage()
+    original_url = store.public_url(request.key)
+    existing = await db.execute(select(Capture).filter_by(raw_capture_url=original_url))
+    capture = existing.scalars().first()
+    if capture:
+        return {"id": capture.id, **_capture_to_dict(capture, position)}
+
+    size, image_format = await _inspect_uploaded_object(store, request.key)
+    if image_format is None or CAPTURE_FORMATS[image_format][1] != request.key.rsplit(".", 1)[1]:
+        await _delete_objects_quietly(store, [request.key])
+        raise HTTPException(status_code=415, detail="Format capture harus JPEG, PNG, atau WebP sesuai ekstensi key.")
+    if size > settings.CAPTURE_MAX_UPLOAD_BYTES:
+        await _delete_objects_quietly(store, [request.key])
+        raise HTTPException(status_code=413, detail="File melebihi batas ukuran capture.")
+
+    # Ukuran original diisi oleh pipeline level turunan saat file pertama kali di-decode
+    capture = Capture(
         id=str(uuid4()),
-        session_id=session_id,
-        raw_capture_url=f"{R2_PUBLIC_URL}/{original_key}",
-        normal_capture_url=f"{R2_PUBLIC_URL}/{normal_key}",
-        frame_position_id=frame_position_id
+        session_id=request.session_id,
+        raw_capture_url=original_url,
+        normal_capture_url=original_url,
+        frame_position_id=position.id,
+        capture_levels=json.dumps({"original": {"key": request.key, "width": None, "height": None}}),
+        derivative_status='PENDING',
+        derivative_attempts=0,
     )
-    
     try:
-        db.add(new_capture)
+        db.add(capture)
         await db.commit()
     except Exception as e:
         await db.rollback()
-        try:
-            r2_client.delete_object(Bucket=R2_BUCKET_NAME, Key=original_key)
-            r2_client.delete_object(Bucket=R2_BUCKET_NAME, Key=normal_key)
-        except Exception as delete_e:
-            logger.error(f"Failed to delete R2 objects during rollback: {delete_e}")
         raise HTTPException(status_code=500, detail=f"Gagal menyimpan data capture: {e}")
+    capture_derivatives.notify()
+    return {"id": capture.id, **_capture_to_dict(capture, position)}
+
+@photobox.get("/captures/{capture_id}")
+async def get_capture(capture_id: str, db: AsyncSession = Depends(get_db)):
+    """Status & URL level resolusi sebuah capture (untuk galeri yang menunggu level turunan)."""
+    result = await db.execute(select(Capture).filter_by(id=capture_id))
+    capture = result.scalars().first()
+    if not capture:
+        raise HTTPException(status_code=404, detail="Capture not found")
+    levels = json.loads(capture.capture_levels or "{}")
+    store = get_storage()
+    return {"status": "SUCCESS", "data": {
+        "id": capture.id,
+        "sessionId": capture.session_id,
+        "framePositionId": capture.frame_position_id,
+        "original": capture.raw_capture_url,
+        "normal": capture.normal_capture_url,
+        "derivativeStatus": capture.derivative_status,
+        "derivativeError": capture.derivative_error,
+        "levels": {
+            name: {"url": store.public_url(level['key']), "width": level["width"], "height": level["height"]}
+            for name, level in levels.items()
+        },
+    }}
+
+def _capture_level_tuples(capture: Capture) -> tuple:
+    """Level resolusi capture sebagai tuple (key, width, height) untuk PhotoSource."""
+    if not capture.capture_levels:
+        return ()
+    return tuple(
+        (level["key"], level["width"], level["height"])
+        for level in json.loads(capture.capture_levels).values()
+        if level.get("width") and level.get("height")
+    )
 
+async def _load_photo_sources(db: AsyncSession, photos: List[PhotoPlacement]) -> List[PhotoSource]:
+    """Mencocokkan URL foto dengan Capture di DB untuk mengetahui level resolusi yang tersedia."""
+    urls = [photo.url for photo in photos]
+    result = await db.execute(
+        select(Capture).where(or_(Capture.raw_capture_url.in_(urls), Capture.normal_capture_url.in_(urls)))
+    )
+    levels_by_url = {}
+    for capture in result.scalars().all():
+        levels = _capture_level_tuples(capture)
+        levels_by_url[capture.raw_capture_url] = levels
+        levels_by_url[capture.normal_capture_url] = levels
+
+    return [
+        PhotoSource(
+            key=_key_from_url(photo.url),
+            placement=(photo.x, photo.y, photo.width, photo.height),
+            levels=levels_by_url.get(photo.url, ()),
+        )
+        for photo in photos
+    ]
+
+async def _render_and_store(
+    store, request: ComposeRequest, photos: List[PhotoSource], frame_size, frame_print_key, output: dict, digest: str
+) -> dict:
+    """Render lalu unggah ke key berbasis digest; dilewati jika hasil dengan digest ini sudah ada di storage."""
+    master_key = f"final/{digest}_final.{OUTPUT_EXTENSIONS[output['format']]}"
+    share_key = f"final/{digest}_share.{OUTPUT_EXTENSIONS[output['share_format']]}" if output["share_format"] else None
+    result = {
+        "final_image_url": store.public_url(master_key),
+        "share_image_url": store.public_url(share_key) if share_key else None,
+    }
+    target_keys = {"master": master_key, "share": share_key}
+
+    with stage("lookup"):
+        existing = await asyncio.gather(*(
+            store.exists(key) for key in target_keys.values() if key
+        ))
+    if all(existing):
+        return result
+
+    # Unduh paralel + render di worker process
+    rendered = await compose_photos(
+        store, _key_from_url(request.frame_url), photos, request.filter_name,
+        output=output, frame_size=frame_size, frame_print_key=frame_print_key,
+    )
+
+    # Master dan salinan share diunggah bersamaan
+    uploads = []
+    for name, key in target_keys.items():
+        if key is None:
+            continue
+        data, _, content_type, _ = rendered[name]
+        uploads.append(store.put_bytes(key, data, content_type))
+    with stage("upload"):
+        await asyncio.gather(*uploads)
+    return result
+
+async def _compose_and_store(request: ComposeRequest, db: AsyncSession, preloaded: tuple | None = None) -> dict:
+    """
+    Render satu ComposeRequest, unggah hasilnya ke storage, dan kembalikan URL publik master & share.
+    Request identik (frame, filter, foto, placement, profil output) memakai hasil yang sudah ada,
+    dan request identik yang datang bersamaan hanya dirender sekali.
+    `preloaded` = (frame_size, frame_print_key, photo_sources) bila pemanggil sudah memuat data dari DB.
+    """
+    store = get_storage()
+
+    output = request.output.dict()
+    photos = [
+        PhotoSource(key=_key_from_url(photo.url), placement=(photo.x, photo.y, photo.width, photo.height))
+        for photo in request.photos
+    ]
+    digest = compose_digest(_key_from_url(request.frame_url), request.filter_name, photos, output)
+    cached = compose_results.get(digest)
+    if cached is not None:
+        return dict(cached)
+
+    # Lookup DB dilakukan di sini (bukan di dalam render bersama) karena sesi `db` milik request ini
+    if preloaded is not None:
+        frame_size, frame_print_key, photos = preloaded
+    else:
+        with stage("db"):
+            frame_result = await db.execute(
+                select(Frame.width, Frame.height, Frame.print_image_link, Frame.print_width, Frame.print_height)
+                .filter_by(image_link=request.frame_url)
+            )
+            frame_row = frame_result.first()
+            frame_size = (frame_row.width, frame_row.height) if frame_row else None
+            frame_print_key = _frame_print_key(frame_row) if frame_row else None
+            photos = await _load_photo_sources(db, request.photos)
+
+    result = await compose_singleflight.run(
+        digest, lambda: _render_and_store(store, request, photos, frame_size, frame_print_key, output, digest)
+    )
+    await _mark_captures_composed(db, [photo.url for photo in request.photos])
+    compose_results.put(digest, result)
+    return dict(result)
+
+async def _mark_captures_composed(db: AsyncSession, urls: List[str]):
+    """
+    Mencatat bahwa capture ini sudah menghasilkan foto final. Hasil /compose dan job async tidak
+    tercatat di PhotoSession, jadi tanpa ini GC storage bisa menganggap sesinya terbengkalai.
+    """
+    with stage("db"):
+        await db.execute(
+            update(Capture)
+            .where(or_(Capture.raw_capture_url.in_(urls), Capture.normal_capture_url.in_(urls)))
+            .values(composed_at=func.now())
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+
+async def _run_compose_job(payload: dict) -> dict:
+    """Handler untuk compose_job_queue: menjalankan satu job dengan sesi DB sendiri."""
+    async with SessionLocal() as db:
+        return await _compose_and_store(ComposeRequest(**payload), db)
+
+compose_job_queue.set_handler(_run_compose_job)
+
+def _compose_job_to_dict(job: ComposeJob) -> dict:
     return {
-        "original": new_capture.raw_capture_url,
-        "normal": new_capture.normal_capture_url,
-        "x": position_data.x,
-        "y": position_data.y,
-        "width": position_data.width,
-        "height": position_data.height,
+        "jobId": job.id, "status": job.status, "finalImageUrl": job.result_image_url,
+        "shareImageUrl": job.share_image_url, "error": job.error,
+        "attempts": job.attempts, "enqueuedAt": job.enqueued_at, "startedAt": job.started_at,
+        "finishedAt": job.finished_at,
     }
 
 @photobox.post("/compose")
-async def compose_high_res_photo(request: ComposeRequest):
-    PRINT_DPI, FINAL_WIDTH_PX = 300, 4 * 300
-    r2_client = get_r2_client()
-    if not r2_client:
-        raise HTTPException(status_code=500, detail="Layanan penyimpanan R2 tidak tersedia.")
+async def compose_high_res_photo(
+    request: ComposeRequest,
+    response: Response,
+    mode: str = Query("sync", pattern="^(sync|async)$"),
+    db: AsyncSession = Depends(get_db),
+):
+    if mode == "async":
+        # Validasi dulu agar job yang pasti gagal tidak masuk antrian
+        frame_result = await db.execute(select(Frame.id).filter_by(image_link=request.frame_url))
+        if frame_result.first() is None:
+            raise HTTPException(status_code=404, detail="Frame tidak ditemukan.")
+        job = await compose_job_queue.enqueue(db, request.dict())
+        response.status_code = HTTPStatus.ACCEPTED
+        return {"status": "QUEUED", "data": _compose_job_to_dict(job)}
+
+    timer = start_timer()
     try:
-        frame_key = urlparse(request.frame_url).path.lstrip('/')
-        frame_obj = r2_client.get_object(Bucket=R2_BUCKET_NAME, Key=frame_key)
-        frame_image = Image.open(frame_obj['Body']).convert("RGBA")
-        
-        aspect_ratio = frame_image.width / frame_image.height
-        final_height = int(FINAL_WIDTH_PX / aspect_ratio)
-        canvas = Image.new("RGBA", (FINAL_WIDTH_PX, final_height), (255, 255, 255, 255))
-        
-        for photo_data in request.photos:
-            photo_key = urlparse(photo_data.url).path.lstrip('/')
-            photo_obj = r2_client.get_object(Bucket=R2_BUCKET_NAME, Key=photo_key)
-            photo_img = Image.open(photo_obj['Body']).convert("RGBA")
-            filtered_photo = apply_filter(photo_img, request.filter_name)
-            
-            scale_w, scale_h = FINAL_WIDTH_PX / frame_image.width, final_height / frame_image.height
-            paste_x, paste_y = int(photo_data.x * scale_w), int(photo_data.y * scale_h)
-            paste_w, paste_h = int(photo_data.width * scale_w), int(photo_data.height * scale_h)
-            
-            resized_photo = filtered_photo.resize((paste_w, paste_h), Image.Resampling.LANCZOS)
-            canvas.paste(resized_photo, (paste_x, paste_y), resized_photo)
-
-        resized_frame = frame_image.resize((FINAL_WIDTH_PX, final_height), Image.Resampling.LANCZOS)
-        canvas.paste(resized_frame, (0, 0), resized_frame)
-        
-        final_key, final_buffer = f"final/{uuid4()}_final.png", BytesIO()
-        final_image_rgb = canvas.convert("RGB")
-        final_image_rgb.save(final_buffer, format="PNG", dpi=(PRINT_DPI, PRINT_DPI))
-        final_buffer.seek(0)
-        r2_client.put_object(Bucket=R2_BUCKET_NAME, Key=final_key, Body=final_buffer, ContentType='image/png')
+        result = await _compose_and_store(request, db)
+        response.headers["Server-Timing"] = timer.server_timing()
         
         if request.email_recipient:
             # send_email_with_attachment(request.email_recipient, final_path)
             pass
-        return {"status": "SUCCESS", "final_image_url": f"{R2_PUBLIC_URL}/{final_key}", "email_sent_to": request.email_recipient}
+        return {"status": "SUCCESS", **result, "email_sent_to": request.email_recipient}
+    except ComposeTimeoutError as e:
+        logging.error(f"Gagal membuat gambar final: {e}")
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         logging.error(f"Gagal membuat gambar final: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
+@photobox.get("/compose/{job_id}")
+async def get_compose_job(job_id: str, db: AsyncSession = Depends(get_db)):
+    result = await db.execute(select(ComposeJob).filter_by(id=job_id))
+    job = result.scalars().first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Compose job tidak ditemukan.")
+    return {"status": "SUCCESS", "data": _compose_job_to_dict(job)}
+
+# ==============================================================================
+# ENDPOINT /filters & /stats
+# ==============================================================================
+
+@photobox.get("/filters")
+async def get_filters():
+    """Daftar nama filter yang bisa dipakai pada ComposeRequest.filter_name."""
+    return {"status": "SUCCESS", "data": available_filters()}
+
+@photobox.get("/stats/cache")
+async def get_cache_stats():
+    """Statistik cache in-process milik worker API ini."""
+    return {"status": "SUCCESS", "data": {
+        "frames": frame_cache.stats(),
+        "composeResults": {**compose_results.stats(), "inFlight": len(compose_singleflight)},
+        "metadata": metadata_cache.stats(),
+        "catalogResponses": {"frames": frames_response.stats(), "packages": packages_response.stats()},
+    }}
+
+@photobox.get("/stats/storage")
+async def get_storage_stats():
+    """Statistik backend storage milik worker API ini (untuk R2: latensi per operasi dan pemakaian koneksi)."""
+    return {"status": "SUCCESS", "data": get_storage().stats()}
+
+# ==============================================================================
+# ENDPOINT /maintenance
+# ==============================================================================
+
+@photobox.get("/maintenance/storage-gc")
+async def get_storage_gc_status():
+    """
+    Status garbage collector storage dan laporan putaran terakhir di proses ini. Sengaja hanya
+    baca: putaran manual (termasuk penghapusan) dijalankan lewat scripts/storage_gc.py.
+    """
+    return {"status": "SUCCESS", "data": storage_gc.status()}
+
 # ==============================================================================
 # ENDPOINT /sessions
 # ==============================================================================
@@ -393,6 +1230,82 @@ async def get_photo_sessions(response: Response, db: AsyncSession = Depends(get_
         logger.error(f"Error getting sessions: {str(e)}", exc_info=True)
         response.status_code = HTTPStatus.INTERNAL_SERVER_ERROR
         return {"status": "ERROR", "message": "Internal Server Error"}
+@photobox.post("/sessions/{session_id}/compose")
+async def compose_session(session_id: str, request: SessionComposeRequest, db: AsyncSession = Depends(get_db)):
+    """Compose hasil akhir sebuah sesi dari frame, posisi, dan capture yang tersimpan di DB."""
+    # Satu query: sesi + frame + posisi + semua capture
+    result = await db.execute(
+        select(PhotoSession)
+        .options(
+            joinedload(PhotoSession.frame).joinedload(Frame.positions),
+            joinedload(PhotoSession.captures),
+        )
+        .filter_by(id=session_id)
+    )
+    session = result.unique().scalars().first()
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
+    frame = session.frame
+    if not frame:
+        raise HTTPException(status_code=400, detail="Session belum memiliki frame.")
+
+    # Capture terbaru per posisi (foto ulang menggantikan yang lama)
+    latest_capture = {}
+    for capture in sorted(session.captures, key=lambda c: c.created_at or datetime.min):
+        latest_capture[capture.frame_position_id] = capture
+
+    positions = sorted(frame.positions, key=lambda pos: (pos.y, pos.x))
+    missing = [pos.id for pos in positions if pos.id not in latest_capture]
+    if missing and not request.allow_missing:
+        raise HTTPException(status_code=400, detail={"message": "Ada posisi frame yang belum memiliki capture.", "missing_positions": missing})
+    filled = [(pos, latest_capture[pos.id]) for pos in positions if pos.id in latest_capture]
+    if not filled:
+        raise HTTPException(status_code=400, detail="Session belum memiliki capture.")
+
+    filter_name = request.filter_name or session.image_filter or "none"
+    compose_request = ComposeRequest(
+        frame_url=frame.image_link,
+        filter_name=filter_name,
+        photos=[
+            PhotoPlacement(url=capture.raw_capture_url, x=pos.x, y=pos.y, width=pos.width, height=pos.height)
+            for pos, capture in filled
+        ],
+        email_recipient=session.recipient_email,
+        output=request.output,
+    )
+    photo_sources = [
+        PhotoSource(
+            key=_key_from_url(capture.raw_capture_url),
+            placement=(pos.x, pos.y, pos.width, pos.height),
+            levels=_capture_level_tuples(capture),
+        )
+        for pos, capture in filled
+    ]
+
+    try:
+        composed = await _compose_and_store(
+            compose_request, db, preloaded=((frame.width, frame.height), _frame_print_key(frame), photo_sources)
+        )
+    except ComposeTimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except Exception as e:
+        logger.error(f"Gagal compose session {session_id}: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+    try:
+        session.result_image_url = composed["final_image_url"]
+        session.image_filter = filter_name
+        await db.commit()
+    except SQLAlchemyError as e:
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=f"Gagal menyimpan hasil compose: {e}")
+
+    return {"status": "SUCCESS", "data": {
+        "sessionId": session.id, "filter": filter_name,
+        "finalImageUrl": composed["final_image_url"], "shareImageUrl": composed["share_image_url"],
+        "missingPositions": missing,
+    }}
+
 # ==============================================================================
 # ENDPOINT /packages
 # ==============================================================================
@@ -403,6 +1316,7 @@ async def create_package(request: PackageCreateRequest, db: AsyncSession = Depen
         new_package = Package(id=str(uuid4()), type=request.type, price=request.price, services=request.services)
         db.add(new_package)
         await db.commit()
+        packages_response.bump()
         await db.refresh(new_package)
         return {"status": "SUCCESS", "data": {
             "id": new_package.id, "type": new_package.type, "price": new_package.price, 
@@ -413,16 +1327,22 @@ async def create_package(request: PackageCreateRequest, db: AsyncSession = Depen
         raise HTTPException(status_code=500, detail={"status": "ERROR", "message": str(e)})
 
 @photobox.get("/packages")
-async def get_all_packages(response: Response, db: AsyncSession = Depends(get_db)):
-    try:
+async def get_all_packages(request: Request, response: Response, db: AsyncSession = Depends(get_db)):
+    async def build():
         result = await db.execute(select(Package))
         packages = result.scalars().all()
         if not packages:
-            response.status_code = 404
-            return {"status": "NOT_FOUND", "message": "No packages found"}
+            return None
         data = [{"id": pkg.id, "type": pkg.type, "price": pkg.price, 
                  "services": pkg.services.split(',') if pkg.services else []} for pkg in packages]
         return {"status": "SUCCESS", "data": data}
+
+    try:
+        cached = await packages_response.respond(request, build)
+        if cached is None:
+            response.status_code = 404
+            return {"status": "NOT_FOUND", "message": "No packages found"}
+        return cached
     except SQLAlchemyError as e:
         response.status_code = 500
         return {"status": "ERROR", "message": str(e)}
@@ -0,0 +1,380 @@
+# benchmarks/bench_api.py
+#
+# Benchmark end-to-end endpoint gambar (/captures dan /compose) lewat aplikasi
+# ASGI, tanpa R2 maupun MySQL sungguhan:
+#   - R2 diganti InMemoryR2Client (benchmarks/memory_r2.py) dengan latensi tiruan
+#   - database diganti SQLite sementara (butuh: pip install -r requirements-dev.txt)
+#
+# Laporan: latensi p50/p95/p99, throughput pada konkurensi tertentu, peak RSS
+# (proses API dan worker compose), dan rincian waktu per tahap dari header
+# Server-Timing.
+#
+# Cara pakai (dari root repo):
+#   python -m benchmarks.bench_api run --requests 40 --concurrency 4 --output bench_new.json
+#   python -m benchmarks.bench_api compare bench_base.json bench_new.json
+#
+# Untuk membandingkan dua revisi, jalankan `run` di masing-masing revisi
+# (mis. lewat `git worktree add ../base <rev>`) lalu `compare` kedua file JSON.
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from io import BytesIO
+
+# Variabel lingkungan tiruan agar config/ bisa di-import tanpa file .env
+BENCH_ENV = {
+    "R2_ACCOUNT_ID": "bench", "R2_ACCESS_KEY_ID": "bench", "R2_SECRET_ACCESS_KEY": "bench",
+    "R2_BUCKET_NAME": "bench", "R2_PUBLIC_URL": "https://bench.invalid",
+    "MIDTRANS_SERVER_KEY": "bench", "MIDTRANS_CLIENT_KEY": "bench",
+}
+
+FRAME_SIZE = (1200, 3600)
+SLOT_COUNT = 4
+CAPTURE_SIZE = (3000, 2000)
+
+
+# ------------------------------------------------------------------------------
+# Data sintetis
+# ------------------------------------------------------------------------------
+
+def _frame_slots():
+    width, height = FRAME_SIZE
+    margin, gap = 80, 60
+    slot_w = width - 2 * margin
+    slot_h = (height - 2 * margin - (SLOT_COUNT - 1) * gap - 400) // SLOT_COUNT
+    return [(margin, margin + i * (slot_h + gap), slot_w, slot_h) for i in range(SLOT_COUNT)]
+
+
+def make_frame_png() -> bytes:
+    import numpy as np
+    from PIL import Image
+
+    width, height = FRAME_SIZE
+    rgba = np.zeros((height, width, 4), dtype=np.uint8)
+    rgba[..., 0] = np.linspace(40, 220, width, dtype=np.uint8)[None, :]
+    rgba[..., 1] = np.linspace(20, 120, height, dtype=np.uint8)[:, None]
+    rgba[..., 2] = 90
+    rgba[..., 3] = 255
+    for x, y, w, h in _frame_slots():
+        rgba[y:y + h, x:x + w, 3] = 0
+    buffer = BytesIO()
+    Image.fromarray(rgba).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def make_capture_jpeg(seed: int) -> bytes:
+    """Foto 'mirip kamera': gradasi halus + noise sensor ringan, JPEG q90 (~ukuran kamera booth)."""
+    import numpy as np
+    from PIL import Image
+
+    width, height = CAPTURE_SIZE
+    rng = np.random.default_rng(seed)
+    yy, xx = np.mgrid[0:height, 0:width].astype(np.float32)
+    base = np.stack([
+        128 + 100 * np.sin(xx / (300 + 40 * c) + seed + c) * np.cos(yy / (500 + 30 * c))
+        for c in range(3)
+    ], axis=-1)
+    noise = rng.normal(0, 6, size=base.shape)
+    rgb = np.clip(base + noise, 0, 255).astype(np.uint8)
+    buffer = BytesIO()
+    Image.fromarray(rgb).save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+# ------------------------------------------------------------------------------
+# Setup aplikasi dengan R2 di memori dan SQLite
+# ------------------------------------------------------------------------------
+
+def _prepare_app(db_path: str, latency_ms: float, bandwidth_mbps: float):
+    for key, value in BENCH_ENV.items():
+        os.environ.setdefault(key, value)
+
+    # Ganti engine DB SEBELUM modul lain meng-import SessionLocal
+    from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+    from sqlalchemy.orm import sessionmaker
+    import config.database as database
+    database.engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+    database.SessionLocal = sessionmaker(bind=database.engine, class_=AsyncSession, expire_on_commit=False)
+
+    from benchmarks.memory_r2 import InMemoryR2Client
+    store = InMemoryR2Client(latency_ms=latency_ms, bandwidth_mbps=bandwidth_mbps)
+    import config.r2 as r2
+    r2.get_r2_client = lambda: store
+    # Backend R2 asli di atas client tiruan, agar jalur kode (dan latensi simulasi) sama dengan produksi
+    from config.settings import settings
+    from services.storage import R2Storage, set_storage, with_object_cache
+    set_storage(with_object_cache(
+        R2Storage(lambda: store, "bench", os.environ["R2_PUBLIC_URL"], settings.CAPTURE_MULTIPART_CHUNK_BYTES)
+    ))
+
+    from main import app
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    logging.getLogger("api.photobox").setLevel(logging.WARNING)
+    return app, store, database
+
+
+async def _seed(database, store, public_url: str) -> dict:
+    from models.models import Frame, FramePosition, PhotoSession, Transaction
+
+    async with database.engine.begin() as connection:
+        await connection.run_sync(database.Base.metadata.create_all)
+
+    store.put_object(Bucket="bench", Key="frames/bench.png", Body=make_frame_png(), ContentType="image/png")
+    frame = Frame(id="bench-frame", name="Bench", image_link=f"{public_url}/frames/bench.png",
+                  width=FRAME_SIZE[0], height=FRAME_SIZE[1])
+    frame.positions = [
+        FramePosition(id=f"bench-pos-{i}", x=x, y=y, width=w, height=h)
+        for i, (x, y, w, h) in enumerate(_frame_slots())
+    ]
+    async with database.SessionLocal() as db:
+        db.add(Transaction(id="bench-tx", reference="bench", merchant_ref="bench", transaction_type="PHOTOSESSION",
+                           customer_name="Bench", customer_email="bench@example.com", amount=0))
+        db.add(frame)
+        db.add(PhotoSession(id="bench-session", transaction_id="bench-tx", name="Bench", frame_id=frame.id))
+        await db.commit()
+    return {"frame_url": frame.image_link, "positions": [(p.id, p.x, p.y, p.width, p.height) for p in frame.positions]}
+
+
+# ------------------------------------------------------------------------------
+# Runner
+# ------------------------------------------------------------------------------
+
+async def _wait_for_derivatives(database, timeout: float = 600):
+    """Menunggu pipeline level turunan selesai agar skenario compose memakai level cetak."""
+    from sqlalchemy import func, select
+    from models.models import Capture
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        async with database.SessionLocal() as db:
+            pending = (await db.execute(
+                select(func.count(Capture.id)).where(Capture.derivative_status.in_(("PENDING", "RUNNING")))
+            )).scalar()
+        if not pending:
+            return
+        await asyncio.sleep(0.5)
+
+
+def _parse_server_timing(header: str | None) -> dict:
+    timings = {}
+    for part in (header or "").split(","):
+        name, _, duration = part.strip().partition(";dur=")
+        if name and duration:
+            timings[name] = float(duration)
+    return timings
+
+
+def _percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def _run_load(name: str, make_request, total: int, concurrency: int) -> dict:
+    limiter = asyncio.Semaphore(concurrency)
+    latencies, stages, errors = [], {}, 0
+
+    async def one(index: int):
+        nonlocal errors
+        async with limiter:
+            start = time.perf_counter()
+            response = await make_request(index)
+            latencies.append((time.perf_counter() - start) * 1000)
+            if response.status_code >= 400:
+                errors += 1
+                return
+            for stage, duration in _parse_server_timing(response.headers.get("server-timing")).items():
+                stages.setdefault(stage, []).append(duration)
+
+    wall_start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    wall = time.perf_counter() - wall_start
+
+    result = {
+        "requests": total, "concurrency": concurrency, "errors": errors,
+        "p50_ms": round(_percentile(latencies, 50), 1),
+        "p95_ms": round(_percentile(latencies, 95), 1),
+        "p99_ms": round(_percentile(latencies, 99), 1),
+        "mean_ms": round(statistics.fmean(latencies), 1),
+        "throughput_rps": round(total / wall, 2),
+        "stages_mean_ms": {stage: round(statistics.fmean(values), 1) for stage, values in stages.items()},
+    }
+    print(f"\n[{name}] {total} request, konkurensi {concurrency}, error {errors}")
+    print(f"  p50 {result['p50_ms']} ms | p95 {result['p95_ms']} ms | p99 {result['p99_ms']} ms | "
+          f"{result['throughput_rps']} req/s")
+    print("  tahap (rata-rata ms): " + ", ".join(f"{k}={v}" for k, v in result["stages_mean_ms"].items()))
+    return result
+
+
+async def _benchmark(args) -> dict:
+    import httpx
+
+    db_path = os.path.join(tempfile.mkdtemp(prefix="selasaat-bench-"), "bench.sqlite")
+    app, store, database = _prepare_app(db_path, args.r2_latency_ms, args.r2_bandwidth_mbps)
+    public_url = os.environ["R2_PUBLIC_URL"]
+    seeded = await _seed(database, store, public_url)
+    positions = seeded["positions"]
+    captures = [make_capture_jpeg(seed) for seed in range(8)]
+
+    from services.compose import compose_engine
+    from services.derivatives import capture_derivatives
+    from services.filters import available_filters
+    filters = available_filters()
+    # ASGITransport tidak menjalankan event startup, jadi pipeline level turunan dinyalakan manual
+    await capture_derivatives.start()
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=300) as client:
+        def upload(index: int, payload: bytes | None = None):
+            position_id = positions[index % len(positions)][0]
+            return client.post(
+                "/api/captures",
+                data={"session_id": "bench-session", "frame_position_id": position_id},
+                files={"file": (f"shot{index}.jpg", payload or captures[index % len(captures)], "image/jpeg")},
+            )
+
+        # Pemanasan (tidak diukur): menyalakan process pool dan menyiapkan kumpulan capture untuk compose
+        pool = []
+        for index in range(2 * len(positions)):
+            response = await upload(index)
+            response.raise_for_status()
+            pool.append((positions[index % len(positions)], response.json()["original"]))
+        await _wait_for_derivatives(database)
+
+        def compose_body(index: int, unique: bool = True) -> dict:
+            photos = []
+            for slot in range(len(positions)):
+                (_, x, y, w, h), url = pool[(index + slot) % len(pool)] if unique else pool[slot]
+                photos.append({"url": url, "x": x, "y": y, "width": w, "height": h})
+            filter_name = filters[(index // len(pool)) % len(filters)] if unique else "none"
+            return {"frame_url": seeded["frame_url"], "filter_name": filter_name, "photos": photos,
+                    "output": args.output_profile}
+
+        results = {}
+        scenarios = args.scenarios.split(",")
+        if "captures" in scenarios:
+            # Byte unik per request (seed setelah capture pemanasan): tanpa ini setiap upload
+            # terukur hanya hit dedupe sha256, bukan upload + penyimpanan yang sebenarnya
+            fresh = [make_capture_jpeg(len(captures) + index) for index in range(args.requests)]
+            results["captures"] = await _run_load(
+                "captures", lambda i: upload(i, fresh[i]), args.requests, args.concurrency,
+            )
+            # Level turunan capture di atas dikerjakan di background; tunggu agar tidak ikut terukur di compose
+            await _wait_for_derivatives(database)
+        if "captures_duplicate" in scenarios:
+            # Byte yang sama dengan pemanasan: mengukur jalur dedupe (hash + lookup, tanpa upload)
+            results["captures_duplicate"] = await _run_load("captures_duplicate", upload, args.requests, args.concurrency)
+        if "compose" in scenarios:
+            # Kombinasi foto/filter berbeda per request agar benar-benar dirender (bukan hit cache hasil)
+            results["compose"] = await _run_load(
+                "compose", lambda i: client.post("/api/compose", json=compose_body(i)),
+                min(args.requests, len(pool) * len(filters)), args.concurrency,
+            )
+        if "compose_repeat" in scenarios:
+            results["compose_repeat"] = await _run_load(
+                "compose_repeat", lambda i: client.post("/api/compose", json=compose_body(i, unique=False)),
+                args.requests, args.concurrency,
+            )
+
+    # Dibaca sebelum pool dimatikan: ru_maxrss milik child hasil spawn ikut mewarisi
+    # high-water mark proses induk di Linux, jadi VmHWM per worker lebih jujur
+    worker_pids = list((compose_engine._executor._processes or {}).keys()) if compose_engine._executor else []
+    results["peak_rss_mb"] = {
+        "api_process": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "largest_worker": max((_peak_rss_mb(pid) for pid in worker_pids), default=0.0),
+    }
+    await capture_derivatives.stop()
+    compose_engine.shutdown()
+    results["r2_calls"] = dict(store.calls)
+    print(f"\nPeak RSS: {results['peak_rss_mb']}  |  panggilan R2: {results['r2_calls']}")
+    return results
+
+
+def _peak_rss_mb(pid: int) -> float:
+    try:
+        with open(f"/proc/{pid}/status", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return 0.0
+
+
+def _git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+def run(args):
+    args.output_profile = json.loads(args.output_profile)
+    results = asyncio.run(_benchmark(args))
+    report = {
+        "revision": _git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "config": {key: value for key, value in vars(args).items() if key != "func"},
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Hasil disimpan ke {args.output}")
+
+
+def compare(args):
+    with open(args.base, encoding="utf-8") as f:
+        base = json.load(f)
+    with open(args.new, encoding="utf-8") as f:
+        new = json.load(f)
+    print(f"base: {base['revision']} ({base['timestamp']})  vs  new: {new['revision']} ({new['timestamp']})")
+    for scenario, new_result in new["results"].items():
+        base_result = base["results"].get(scenario)
+        if not isinstance(new_result, dict) or "p50_ms" not in new_result or not base_result:
+            continue
+        print(f"\n[{scenario}]")
+        for metric in ("p50_ms", "p95_ms", "p99_ms", "throughput_rps"):
+            old_value, new_value = base_result[metric], new_result[metric]
+            delta = (new_value - old_value) / old_value * 100 if old_value else 0.0
+            print(f"  {metric:<16}{old_value:>10}{new_value:>10}{delta:>+9.1f}%")
+        for stage in sorted(set(base_result["stages_mean_ms"]) | set(new_result["stages_mean_ms"])):
+            print(f"  stage:{stage:<10}{base_result['stages_mean_ms'].get(stage, '-'):>10}"
+                  f"{new_result['stages_mean_ms'].get(stage, '-'):>10}")
+    print(f"\npeak RSS (MB): {base['results'].get('peak_rss_mb')} -> {new['results'].get('peak_rss_mb')}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark endpoint /captures dan /compose.")
+    subparsers = parser.add_subparsers(required=True)
+
+    run_parser = subparsers.add_parser("run", help="Jalankan benchmark pada revisi saat ini")
+    run_parser.add_argument("--requests", type=int, default=24)
+    run_parser.add_argument("--concurrency", type=int, default=4)
+    run_parser.add_argument("--scenarios", default="captures,captures_duplicate,compose,compose_repeat")
+    run_parser.add_argument("--r2-latency-ms", type=float, default=40.0, help="Latensi tiruan per panggilan R2")
+    run_parser.add_argument("--r2-bandwidth-mbps", type=float, default=0.0, help="0 = tanpa batas")
+    run_parser.add_argument("--output-profile", default="{}", help="JSON OutputProfile untuk /compose")
+    run_parser.add_argument("--output", help="Simpan hasil ke file JSON")
+    run_parser.set_defaults(func=run)
+
+    compare_parser = subparsers.add_parser("compare", help="Bandingkan dua file hasil")
+    compare_parser.add_argument("base")
+    compare_parser.add_argument("new")
+    compare_parser.set_defaults(func=compare)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
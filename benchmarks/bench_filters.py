@@ -0,0 +1,65 @@
+# benchmarks/bench_filters.py
+#
+# Micro-benchmark filter: biaya per megapiksel untuk engine LUT NumPy
+# (services/filters.py) dibandingkan implementasi Pillow lama (apply_filter).
+#
+# Cara pakai (dari root repo):
+#   python -m benchmarks.bench_filters --megapixels 2 --repeat 20
+
+import argparse
+import time
+
+import numpy as np
+from PIL import Image, ImageOps
+
+from services.filters import apply_filter_array, available_filters
+
+
+def legacy_apply_filter(image: Image.Image, filter_name: str) -> Image.Image:
+    """Implementasi apply_filter lama di api/photobox.py, disimpan sebagai pembanding."""
+    if filter_name == "grayscale":
+        return ImageOps.grayscale(image).convert("RGBA")
+    if filter_name == "sepia":
+        sepia_image = image.copy().convert("L")
+        sepia_image = ImageOps.colorize(sepia_image, black="#704214", white="#E6D8B4")
+        return sepia_image.convert(image.mode)
+    return image
+
+
+def _time_per_call(func, make_input, repeat: int) -> float:
+    """Waktu terbaik dari `repeat` kali `func(input)`; pembuatan input tidak ikut diukur."""
+    func(make_input())  # pemanasan
+    best = float("inf")
+    for _ in range(repeat):
+        data = make_input()
+        start = time.perf_counter()
+        func(data)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark biaya filter per megapiksel.")
+    parser.add_argument("--megapixels", type=float, default=2.0, help="Ukuran foto uji (MP), rasio 4:3")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    width = int((args.megapixels * 1_000_000 * 4 / 3) ** 0.5)
+    height = int(width * 3 / 4)
+    megapixels = width * height / 1_000_000
+    rng = np.random.default_rng(0)
+    rgba = rng.integers(0, 256, size=(height, width, 4), dtype=np.uint8)
+    image = Image.fromarray(rgba)
+
+    print(f"Gambar uji: {width}x{height} ({megapixels:.2f} MP), terbaik dari {args.repeat} pengulangan\n")
+    print(f"{'filter':<14}{'engine':<10}{'ms/MP':>10}")
+    for name in available_filters():
+        if name in ("grayscale", "sepia"):
+            seconds = _time_per_call(lambda img: legacy_apply_filter(img, name), lambda: image, args.repeat)
+            print(f"{name:<14}{'pillow':<10}{seconds * 1000 / megapixels:>10.2f}")
+        seconds = _time_per_call(lambda arr: apply_filter_array(arr, name), rgba.copy, args.repeat)
+        print(f"{name:<14}{'numpy-lut':<10}{seconds * 1000 / megapixels:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
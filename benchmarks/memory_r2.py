@@ -0,0 +1,113 @@
+# benchmarks/memory_r2.py
+#
+# Pengganti R2 (boto3 S3 client) di memori untuk benchmark: mendukung subset
+# API yang dipakai aplikasi, dengan latensi jaringan tiruan yang bisa diatur.
+
+import hashlib
+import threading
+import time
+from datetime import datetime, timezone
+from io import BytesIO
+
+from botocore.exceptions import ClientError
+
+
+class InMemoryR2Client:
+    """Meniru boto3 S3 client untuk satu bucket; aman dipakai dari banyak thread."""
+
+    def __init__(self, latency_ms: float = 0.0, bandwidth_mbps: float = 0.0):
+        self.latency = latency_ms / 1000
+        # 0 = tanpa batas; selain itu waktu transfer ditambahkan sesuai ukuran objek
+        self.bytes_per_second = bandwidth_mbps * 1_000_000 / 8
+        self._objects: dict[str, tuple[bytes, str, str, datetime]] = {}
+        self._lock = threading.Lock()
+        self.calls: dict[str, int] = {}
+
+    def _simulate_network(self, operation: str, size: int = 0):
+        with self._lock:
+            self.calls[operation] = self.calls.get(operation, 0) + 1
+        delay = self.latency + (size / self.bytes_per_second if self.bytes_per_second else 0)
+        if delay:
+            time.sleep(delay)
+
+    @staticmethod
+    def _not_found(operation: str, code: str = "NoSuchKey"):
+        return ClientError({"Error": {"Code": code, "Message": "Not Found"}}, operation)
+
+    def put_object(self, Bucket: str, Key: str, Body, ContentType: str = "binary/octet-stream", **kwargs):
+        data = Body if isinstance(Body, (bytes, bytearray)) else Body.read()
+        self._simulate_network("PutObject", len(data))
+        etag = f'"{hashlib.md5(data).hexdigest()}"'
+        with self._lock:
+            self._objects[Key] = (bytes(data), ContentType, etag, datetime.now(timezone.utc))
+        return {"ETag": etag}
+
+    def upload_fileobj(self, Fileobj, Bucket: str, Key: str, ExtraArgs: dict | None = None, Config=None):
+        content_type = (ExtraArgs or {}).get("ContentType", "binary/octet-stream")
+        self.put_object(Bucket=Bucket, Key=Key, Body=Fileobj.read(), ContentType=content_type)
+
+    def get_object(self, Bucket: str, Key: str, **kwargs):
+        with self._lock:
+            entry = self._objects.get(Key)
+        if entry is None:
+            self._simulate_network("GetObject")
+            raise self._not_found("GetObject")
+        data, content_type, etag, last_modified = entry
+        if kwargs.get("IfNoneMatch") == etag:
+            self._simulate_network("GetObject")
+            raise ClientError({"Error": {"Code": "304", "Message": "Not Modified"}}, "GetObject")
+        self._simulate_network("GetObject", len(data))
+        return {
+            "Body": BytesIO(data), "ContentLength": len(data), "ContentType": content_type, "ETag": etag,
+            "LastModified": last_modified,
+        }
+
+    def head_object(self, Bucket: str, Key: str, **kwargs):
+        self._simulate_network("HeadObject")
+        with self._lock:
+            entry = self._objects.get(Key)
+        if entry is None:
+            raise self._not_found("HeadObject", code="404")
+        data, content_type, etag, last_modified = entry
+        return {"ContentLength": len(data), "ContentType": content_type, "ETag": etag, "LastModified": last_modified}
+
+    def delete_object(self, Bucket: str, Key: str, **kwargs):
+        self._simulate_network("DeleteObject")
+        with self._lock:
+            self._objects.pop(Key, None)
+        return {}
+
+    def delete_objects(self, Bucket: str, Delete: dict, **kwargs):
+        self._simulate_network("DeleteObjects")
+        keys = [item["Key"] for item in Delete.get("Objects", [])]
+        with self._lock:
+            for key in keys:
+                self._objects.pop(key, None)
+        return {"Deleted": [{"Key": key} for key in keys]}
+
+    def list_objects_v2(self, Bucket: str, Prefix: str = "", ContinuationToken: str | None = None,
+                        MaxKeys: int = 1000, **kwargs):
+        self._simulate_network("ListObjectsV2")
+        with self._lock:
+            items = sorted((key, entry) for key, entry in self._objects.items() if key.startswith(Prefix))
+        start = int(ContinuationToken or 0)
+        page = items[start:start + MaxKeys]
+        response = {
+            "Contents": [
+                {"Key": key, "Size": len(data), "ETag": etag, "LastModified": last_modified}
+                for key, (data, _, etag, last_modified) in page
+            ],
+            "KeyCount": len(page),
+            "IsTruncated": start + MaxKeys < len(items),
+        }
+        if response["IsTruncated"]:
+            response["NextContinuationToken"] = str(start + MaxKeys)
+        return response
+
+    def generate_presigned_url(self, ClientMethod: str, Params: dict, ExpiresIn: int = 3600, **kwargs) -> str:
+        # Tidak ada server HTTP; URL hanya penanda. Pemanggil benchmark mengisi objek dengan put_object.
+        return f"memory://{Params['Bucket']}/{Params['Key']}?method={ClientMethod}&expires={ExpiresIn}"
+
+    def total_bytes(self) -> int:
+        with self._lock:
+            return sum(len(data) for data, *_ in self._objects.values())
@@ -1,12 +1,26 @@
 # config/r2.py
 
 import os
+import asyncio
+import contextvars
+import functools
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
 import boto3
+from botocore.config import Config
 from dotenv import load_dotenv
 
+from config.settings import settings
+
 # Muat environment variables dari file .env
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # Ambil konfigurasi dari environment
 R2_ACCOUNT_ID = os.getenv("R2_ACCOUNT_ID")
 R2_ACCESS_KEY_ID = os.getenv("R2_ACCESS_KEY_ID")
@@ -14,25 +28,142 @@ R2_SECRET_ACCESS_KEY = os.getenv("R2_SECRET_ACCESS_KEY")
 R2_BUCKET_NAME = os.getenv("R2_BUCKET_NAME")
 R2_PUBLIC_URL = os.getenv("R2_PUBLIC_URL", "").rstrip('/') # Pastikan tidak ada slash di akhir
 
-# Cek apakah semua variabel ada
-if not all([R2_ACCOUNT_ID, R2_ACCESS_KEY_ID, R2_SECRET_ACCESS_KEY, R2_BUCKET_NAME, R2_PUBLIC_URL]):
-    raise ValueError("Pastikan semua variabel R2 ada di file .env")
+# Modul ini boleh di-import tanpa konfigurasi R2 (mis. STORAGE_BACKEND=local);
+# get_r2_client() mengembalikan None bila variabelnya belum lengkap
+R2_CONFIGURED = all([R2_ACCOUNT_ID, R2_ACCESS_KEY_ID, R2_SECRET_ACCESS_KEY, R2_BUCKET_NAME, R2_PUBLIC_URL])
 
 # Endpoint URL untuk R2
 R2_ENDPOINT_URL = f"https://{R2_ACCOUNT_ID}.r2.cloudflarestorage.com"
 
-# Fungsi untuk membuat dan mengembalikan client R2
+
+class R2Metrics:
+    """
+    Statistik pemanggilan R2 dari event hook botocore: jumlah, error, dan latensi per operasi,
+    serta jumlah koneksi HTTP baru vs request dari connection pool urllib3.
+    """
+
+    def __init__(self, window: int = 1000):
+        self._lock = threading.Lock()
+        self._window = window
+        self._operations: dict = {}
+        self._in_flight = 0
+        self._client = None
+
+    def attach(self, client):
+        self._client = client
+        events = client.meta.events
+        events.register("before-call.s3", self._before_call)
+        events.register("after-call.s3", self._after_call)
+        events.register("after-call-error.s3", self._after_call_error)
+
+    def _before_call(self, model, context, **kwargs):
+        context["r2_operation"] = model.name
+        context["r2_started_at"] = time.perf_counter()
+        with self._lock:
+            self._in_flight += 1
+
+    def _finish(self, context, outcome: str | None):
+        if "r2_started_at" not in context:
+            return
+        elapsed_ms = (time.perf_counter() - context.pop("r2_started_at")) * 1000
+        with self._lock:
+            self._in_flight -= 1
+            entry = self._operations.setdefault(context["r2_operation"], {
+                "count": 0, "notFound": 0, "errors": 0, "latencies": deque(maxlen=self._window),
+            })
+            entry["count"] += 1
+            if outcome:
+                entry[outcome] += 1
+            entry["latencies"].append(elapsed_ms)
+
+    def _after_call(self, context, parsed, **kwargs):
+        status = parsed.get("ResponseMetadata", {}).get("HTTPStatusCode", 200)
+        # 404 wajar untuk pengecekan keberadaan objek (head_object), jadi dihitung terpisah
+        self._finish(context, "notFound" if status == 404 else "errors" if status >= 400 else None)
+
+    def _after_call_error(self, context, **kwargs):
+        # Error jaringan/timeout (setelah semua retry botocore gagal)
+        self._finish(context, "errors")
+
+    def _pool_stats(self) -> dict:
+        # Atribut internal botocore/urllib3; bila struktur berubah, statistik koneksi dikosongkan
+        try:
+            manager = self._client._endpoint.http_session._manager
+            pools = [manager.pools[key] for key in list(manager.pools.keys())]
+            return {
+                "connectionsOpened": sum(pool.num_connections for pool in pools),
+                "requests": sum(pool.num_requests for pool in pools),
+            }
+        except Exception:
+            return {}
+
+    def stats(self) -> dict:
+        with self._lock:
+            operations = {}
+            for name, entry in self._operations.items():
+                latencies = sorted(entry["latencies"])
+                pick = lambda q: round(latencies[min(len(latencies) - 1, int(q * len(latencies)))], 1) if latencies else None
+                operations[name] = {
+                    "count": entry["count"], "notFound": entry["notFound"], "errors": entry["errors"],
+                    "p50Ms": pick(0.5), "p95Ms": pick(0.95),
+                }
+            in_flight = self._in_flight
+        return {"inFlight": in_flight, "operations": operations, **self._pool_stats()}
+
+
+r2_metrics = R2Metrics()
+
+# Thread pool khusus untuk panggilan boto3 yang blocking (terpisah dari default executor asyncio),
+# seukuran connection pool supaya tiap thread selalu mendapat koneksi tanpa menunggu
+r2_executor = ThreadPoolExecutor(max_workers=settings.R2_MAX_POOL_CONNECTIONS, thread_name_prefix="r2")
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def _create_r2_client():
+    client = boto3.client(
+        's3',
+        endpoint_url=R2_ENDPOINT_URL,
+        aws_access_key_id=R2_ACCESS_KEY_ID,
+        aws_secret_access_key=R2_SECRET_ACCESS_KEY,
+        region_name='auto', # 'auto' biasanya bekerja dengan baik untuk R2
+        config=Config(
+            max_pool_connections=settings.R2_MAX_POOL_CONNECTIONS,
+            tcp_keepalive=True,
+            connect_timeout=settings.R2_CONNECT_TIMEOUT,
+            read_timeout=settings.R2_READ_TIMEOUT,
+            retries={"max_attempts": settings.R2_MAX_ATTEMPTS, "mode": "standard"},
+        ),
+    )
+    r2_metrics.attach(client)
+    return client
+
+
+# Fungsi untuk mengembalikan client R2
 def get_r2_client():
-    """Membuat dan mengembalikan S3 client yang dikonfigurasi untuk Cloudflare R2."""
-    try:
-        s3_client = boto3.client(
-            's3',
-            endpoint_url=R2_ENDPOINT_URL,
-            aws_access_key_id=R2_ACCESS_KEY_ID,
-            aws_secret_access_key=R2_SECRET_ACCESS_KEY,
-            region_name='auto', # 'auto' biasanya bekerja dengan baik untuk R2
-        )
-        return s3_client
-    except Exception as e:
-        print(f"Gagal membuat R2 client: {e}")
-        return None
\ No newline at end of file
+    """
+    Mengembalikan S3 client untuk Cloudflare R2. Client dibuat sekali lalu dipakai bersama
+    (boto3 client aman dipakai dari banyak thread), sehingga koneksi TLS ke R2 tetap hangat.
+    """
+    global _client
+    if not R2_CONFIGURED:
+        logger.error("Pastikan semua variabel R2 ada di file .env")
+        return None
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                try:
+                    _client = _create_r2_client()
+                    logger.info(f"R2 client dibuat (pool {settings.R2_MAX_POOL_CONNECTIONS} koneksi).")
+                except Exception as e:
+                    print(f"Gagal membuat R2 client: {e}")
+                    return None
+    return _client
+
+
+async def run_r2(func, *args, **kwargs):
+    """Menjalankan panggilan R2 yang blocking di r2_executor (context ikut diwariskan seperti asyncio.to_thread)."""
+    context = contextvars.copy_context()
+    call = functools.partial(context.run, func, *args, **kwargs)
+    return await asyncio.get_running_loop().run_in_executor(r2_executor, call)
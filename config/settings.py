@@ -1,4 +1,5 @@
 import os
+import tempfile
 from dotenv import load_dotenv
 
 # Memuat variabel dari file .env
@@ -15,6 +16,15 @@ class Settings:
     # Di .env, isi dengan True untuk produksi, False untuk sandbox
     MIDTRANS_IS_PRODUCTION: bool = os.environ.get("MIDTRANS_IS_PRODUCTION", "False").lower() in ('true', '1', 't')
 
+    # --- Konfigurasi Storage ---
+    # Backend penyimpanan gambar: "r2" (default), "local" (folder LOCAL_STORAGE_ROOT yang
+    # disajikan di /uploads), atau "memory" (hanya untuk tes / load test)
+    STORAGE_BACKEND: str = os.environ.get("STORAGE_BACKEND", "r2").lower()
+    LOCAL_STORAGE_ROOT: str = os.environ.get("LOCAL_STORAGE_ROOT", "uploads")
+    # URL publik absolut folder lokal (mis. http://192.168.1.10:9121/uploads); wajib untuk STORAGE_BACKEND=local
+    # karena URL ini dikirim ke kiosk dan lewat email, jadi tidak boleh relatif
+    LOCAL_STORAGE_PUBLIC_URL: str = os.environ.get("LOCAL_STORAGE_PUBLIC_URL")
+
     # --- Konfigurasi Cloudflare R2 ---
     # (Menambahkan ini agar semua setting terpusat)
     R2_ACCOUNT_ID: str = os.environ.get("R2_ACCOUNT_ID")
@@ -22,11 +32,113 @@ class Settings:
     R2_SECRET_ACCESS_KEY: str = os.environ.get("R2_SECRET_ACCESS_KEY")
     R2_BUCKET_NAME: str = os.environ.get("R2_BUCKET_NAME")
     R2_PUBLIC_URL: str = os.environ.get("R2_PUBLIC_URL")
+    # Koneksi HTTP ke R2 yang dijaga tetap terbuka (juga ukuran thread pool untuk panggilan R2)
+    R2_MAX_POOL_CONNECTIONS: int = int(os.environ.get("R2_MAX_POOL_CONNECTIONS", "32"))
+    R2_CONNECT_TIMEOUT: float = float(os.environ.get("R2_CONNECT_TIMEOUT", "5"))
+    R2_READ_TIMEOUT: float = float(os.environ.get("R2_READ_TIMEOUT", "60"))
+    R2_MAX_ATTEMPTS: int = int(os.environ.get("R2_MAX_ATTEMPTS", "3"))
+
+    # --- Konfigurasi Compose (Process Pool) ---
+    # Jumlah worker process untuk render /compose (default: jumlah core CPU)
+    COMPOSE_POOL_SIZE: int = int(os.environ.get("COMPOSE_POOL_SIZE", os.cpu_count() or 1))
+    # Batas waktu (detik) untuk satu job render di worker process
+    COMPOSE_JOB_TIMEOUT: float = float(os.environ.get("COMPOSE_JOB_TIMEOUT", "60"))
+    # Maksimal unduhan R2 paralel untuk satu request /compose
+    COMPOSE_FETCH_CONCURRENCY: int = int(os.environ.get("COMPOSE_FETCH_CONCURRENCY", "8"))
+    # Batas memori (byte) cache frame ukuran cetak; satu frame 1200x3600 RGBA ~17 MB
+    FRAME_CACHE_MAX_BYTES: int = int(os.environ.get("FRAME_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+    # Jumlah hasil compose (digest -> URL) yang diingat in-process untuk request ulang
+    COMPOSE_RESULT_INDEX_ENTRIES: int = int(os.environ.get("COMPOSE_RESULT_INDEX_ENTRIES", "10000"))
+    # Masa berlaku (detik) entri indeks itu. Setelah lewat, keberadaan objek final/ dicek ulang ke
+    # storage (HEAD, bukan render ulang), jadi hasil yang dihapus garbage collector di proses lain
+    # atau lewat scripts/storage_gc.py paling lama sebegini dianggap masih ada. Harus jauh di
+    # bawah STORAGE_GC_FINAL_GRACE_SECONDS (bila diaktifkan).
+    COMPOSE_RESULT_INDEX_TTL_SECONDS: float = float(os.environ.get("COMPOSE_RESULT_INDEX_TTL_SECONDS", "3600"))
+
+    # Cache disk read-through untuk objek R2 yang dibaca /compose (frame & capture), divalidasi
+    # ulang dengan ETag setelah OBJECT_CACHE_REVALIDATE_SECONDS. Batas byte berlaku per proses API;
+    # 0 = nonaktif. Tidak dipakai untuk STORAGE_BACKEND=local/memory.
+    OBJECT_CACHE_DIR: str = os.environ.get("OBJECT_CACHE_DIR", os.path.join(tempfile.gettempdir(), "selasaat-object-cache"))
+    OBJECT_CACHE_MAX_BYTES: int = int(os.environ.get("OBJECT_CACHE_MAX_BYTES", str(2 * 1024 * 1024 * 1024)))
+    OBJECT_CACHE_REVALIDATE_SECONDS: float = float(os.environ.get("OBJECT_CACHE_REVALIDATE_SECONDS", "300"))
+
+    # Masa berlaku (detik) cache metadata frame/posisi/sesi; perubahan frame dari proses lain
+    # terlihat paling lambat setelah waktu ini
+    METADATA_CACHE_TTL_SECONDS: float = float(os.environ.get("METADATA_CACHE_TTL_SECONDS", "300"))
+
+    # --- Konfigurasi Antrian Compose Asinkron ---
+    # Jumlah job compose asinkron yang dikerjakan bersamaan per proses API
+    COMPOSE_QUEUE_WORKERS: int = int(os.environ.get("COMPOSE_QUEUE_WORKERS", "2"))
+    # Interval (detik) pengecekan tabel ComposeJobs bila tidak ada notifikasi job baru
+    COMPOSE_QUEUE_POLL_INTERVAL: float = float(os.environ.get("COMPOSE_QUEUE_POLL_INTERVAL", "2"))
+    # Job RUNNING lebih lama dari ini dianggap ditinggal worker yang mati dan diambil ulang
+    COMPOSE_JOB_LEASE_SECONDS: float = float(os.environ.get("COMPOSE_JOB_LEASE_SECONDS", "300"))
+    COMPOSE_JOB_MAX_ATTEMPTS: int = int(os.environ.get("COMPOSE_JOB_MAX_ATTEMPTS", "3"))
+
+    # --- Konfigurasi Upload Capture ---
+    # Batas ukuran satu file capture (byte); file lebih besar ditolak dengan 413
+    CAPTURE_MAX_UPLOAD_BYTES: int = int(os.environ.get("CAPTURE_MAX_UPLOAD_BYTES", str(40 * 1024 * 1024)))
+    # File original di atas ukuran ini diunggah ke R2 secara multipart (per potongan sebesar ini)
+    CAPTURE_MULTIPART_CHUNK_BYTES: int = int(os.environ.get("CAPTURE_MULTIPART_CHUNK_BYTES", str(8 * 1024 * 1024)))
+
+    # Masa berlaku URL presigned untuk upload capture/frame langsung ke R2 (detik)
+    PRESIGNED_UPLOAD_EXPIRES_SECONDS: int = int(os.environ.get("PRESIGNED_UPLOAD_EXPIRES_SECONDS", "900"))
+
+    # Batas ukuran satu file frame PNG (byte) untuk POST /frames, presign/finalize, dan per file di zip import;
+    # frame 1200x3600 RGBA umumnya di bawah 10 MB
+    FRAME_MAX_UPLOAD_BYTES: int = int(os.environ.get("FRAME_MAX_UPLOAD_BYTES", str(25 * 1024 * 1024)))
+
+    # --- Konfigurasi Import Frame (zip) ---
+    FRAME_IMPORT_MAX_FILES: int = int(os.environ.get("FRAME_IMPORT_MAX_FILES", "100"))
+    # Batas total ukuran PNG (setelah diekstrak) dalam satu zip import
+    FRAME_IMPORT_MAX_BYTES: int = int(os.environ.get("FRAME_IMPORT_MAX_BYTES", str(512 * 1024 * 1024)))
+    # Maksimal unggahan R2 paralel saat import
+    FRAME_IMPORT_UPLOAD_CONCURRENCY: int = int(os.environ.get("FRAME_IMPORT_UPLOAD_CONCURRENCY", "8"))
+
+    # --- Konfigurasi Pipeline Level Turunan Capture ---
+    # Level yang dibuat di background setelah original tersimpan (pisahkan dengan koma):
+    # print (slot cetak 300 DPI), normal (thumbnail seukuran posisi), preview (grid galeri), share (WebP)
+    CAPTURE_RENDITIONS: tuple = tuple(
+        name.strip() for name in os.environ.get("CAPTURE_RENDITIONS", "print,normal,preview,share").split(",") if name.strip()
+    )
+    CAPTURE_DERIVATIVE_WORKERS: int = int(os.environ.get("CAPTURE_DERIVATIVE_WORKERS", "2"))
+    CAPTURE_DERIVATIVE_POLL_INTERVAL: float = float(os.environ.get("CAPTURE_DERIVATIVE_POLL_INTERVAL", "2"))
+    CAPTURE_DERIVATIVE_LEASE_SECONDS: float = float(os.environ.get("CAPTURE_DERIVATIVE_LEASE_SECONDS", "120"))
+    CAPTURE_DERIVATIVE_MAX_ATTEMPTS: int = int(os.environ.get("CAPTURE_DERIVATIVE_MAX_ATTEMPTS", "3"))
+
+    # --- Konfigurasi Garbage Collector Storage ---
+    # Interval (detik) pembersihan objek yatim (tidak dirujuk Frame/Capture/PhotoSession/ComposeJob)
+    # di frames/, captures/ dan final/; 0 = hanya lewat scripts/storage_gc.py
+    STORAGE_GC_INTERVAL_SECONDS: float = float(os.environ.get("STORAGE_GC_INTERVAL_SECONDS", "86400"))
+    # Objek yang lebih muda dari ini tidak pernah dihapus (upload presigned yang belum di-finalize,
+    # upload yang baris DB-nya belum di-commit)
+    STORAGE_GC_GRACE_SECONDS: float = float(os.environ.get("STORAGE_GC_GRACE_SECONDS", str(7 * 24 * 3600)))
+    # Hasil compose di final/ yang sudah dikirim ke pelanggan: hasil /compose biasa tidak dicatat di DB,
+    # jadi nilai ini sekaligus masa simpan foto final & link share. 0 = final/ tidak pernah dihapus.
+    # Hanya key berbasis digest (final/<sha256>_...) yang bisa dihapus; key lama (final/<uuid>_...) selalu disimpan.
+    STORAGE_GC_FINAL_GRACE_SECONDS: float = float(os.environ.get("STORAGE_GC_FINAL_GRACE_SECONDS", "0"))
+    # Batas laju penghapusan: key per request DeleteObjects dan key per detik
+    STORAGE_GC_DELETE_BATCH: int = int(os.environ.get("STORAGE_GC_DELETE_BATCH", "500"))
+    STORAGE_GC_DELETES_PER_SECOND: float = float(os.environ.get("STORAGE_GC_DELETES_PER_SECOND", "200"))
+    # Pengaman: maksimal objek yang dihapus per putaran (sisanya menunggu putaran berikutnya)
+    STORAGE_GC_MAX_DELETES_PER_RUN: int = int(os.environ.get("STORAGE_GC_MAX_DELETES_PER_RUN", "50000"))
+    # Putaran berkala hanya melaporkan tanpa menghapus; set False untuk benar-benar menghapus
+    STORAGE_GC_DRY_RUN: bool = os.environ.get("STORAGE_GC_DRY_RUN", "True").lower() in ('true', '1', 't')
+    # Capture milik sesi tanpa hasil compose apa pun (result_image_url, Capture.composed_at, ComposeJob
+    # DONE) yang lebih tua dari ini (hari) ikut dibersihkan (baris Capture dihapus, objeknya menjadi
+    # yatim); 0 = nonaktif
+    STORAGE_GC_ABANDONED_SESSION_DAYS: float = float(os.environ.get("STORAGE_GC_ABANDONED_SESSION_DAYS", "0"))
 
     # --- Validasi ---
-    # Memeriksa apakah kunci-kunci penting sudah diatur di .env
-    if not all([MIDTRANS_SERVER_KEY, MIDTRANS_CLIENT_KEY, R2_ACCOUNT_ID, R2_ACCESS_KEY_ID, R2_SECRET_ACCESS_KEY, R2_BUCKET_NAME, R2_PUBLIC_URL]):
+    # Memeriksa apakah kunci-kunci penting sudah diatur di .env (R2 hanya wajib bila dipakai sebagai storage)
+    if not all([MIDTRANS_SERVER_KEY, MIDTRANS_CLIENT_KEY]):
         raise RuntimeError("Satu atau lebih variabel lingkungan (DATABASE_URL, Midtrans, R2) belum diatur di file .env")
+    if STORAGE_BACKEND == "r2" and not all([R2_ACCOUNT_ID, R2_ACCESS_KEY_ID, R2_SECRET_ACCESS_KEY, R2_BUCKET_NAME, R2_PUBLIC_URL]):
+        raise RuntimeError("STORAGE_BACKEND=r2 tetapi variabel R2 belum diatur di file .env")
+    if STORAGE_BACKEND == "local" and not (LOCAL_STORAGE_PUBLIC_URL or "").startswith(("http://", "https://")):
+        raise RuntimeError(
+            "STORAGE_BACKEND=local membutuhkan LOCAL_STORAGE_PUBLIC_URL berupa URL absolut (mis. http://192.168.1.10:9121/uploads)"
+        )
 
 # Instance tunggal yang akan diimpor oleh bagian lain dari aplikasi
 settings = Settings()
\ No newline at end of file
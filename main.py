@@ -11,6 +11,12 @@ from fastapi.middleware.cors import CORSMiddleware
 from api.payment import router as payment_router
 from api.voucher import router as voucher_router
 from api.photobox import photobox as photobox_router # Nama router-nya adalah 'photobox'
+from config.r2 import r2_executor
+from config.settings import settings
+from services.compose import compose_engine
+from services.derivatives import capture_derivatives
+from services.job_queue import compose_job_queue
+from services.storage_gc import storage_gc
 
 app = FastAPI(
     title="SELASAAT Project (Gabungan)",
@@ -29,10 +35,10 @@ app.add_middleware(
 # 2. Mount kedua direktori statis
 # Dari Aplikasi 1 (untuk landing page)
 app.mount("/static", StaticFiles(directory="static"), name="static")
-# Dari Aplikasi 2 (untuk gambar frame yang di-upload)
-UPLOAD_FOLDER = "uploads"
+# Dari Aplikasi 2 (untuk gambar yang di-upload; dipakai STORAGE_BACKEND=local)
+UPLOAD_FOLDER = settings.LOCAL_STORAGE_ROOT
 os.makedirs(os.path.join(UPLOAD_FOLDER, "frames"), exist_ok=True)
-app.mount(f"/{UPLOAD_FOLDER}", StaticFiles(directory=UPLOAD_FOLDER), name="uploads")
+app.mount("/uploads", StaticFiles(directory=UPLOAD_FOLDER), name="uploads")
 
 
 # 3. Sertakan kedua router
@@ -40,6 +46,23 @@ app.include_router(payment_router, prefix="/api", tags=["Payments"])
 app.include_router(photobox_router, prefix="/api", tags=["Photobox"]) # Menggunakan prefix /api yang sama
 app.include_router(voucher_router, prefix="/api", tags=["vouchers"]) 
 
+# Jalankan worker antrian compose asinkron, pipeline level turunan capture
+# (job/capture yang tertunda dilanjutkan dari DB) & garbage collector storage
+@app.on_event("startup")
+async def start_compose_job_queue():
+    await compose_job_queue.start()
+    await capture_derivatives.start()
+    await storage_gc.start()
+
+# Hentikan worker antrian, process pool compose & thread pool R2 saat server berhenti
+@app.on_event("shutdown")
+async def shutdown_compose_workers():
+    await compose_job_queue.stop()
+    await capture_derivatives.stop()
+    await storage_gc.stop()
+    compose_engine.shutdown()
+    r2_executor.shutdown(wait=False)
+
 # Endpoint dari Aplikasi 1
 @app.get("/")
 async def read_root():
@@ -0,0 +1,2 @@
+-- Level resolusi capture (original, print, normal, preview) dalam format JSON
+ALTER TABLE Captures ADD COLUMN capture_levels TEXT NULL;
@@ -0,0 +1,15 @@
+-- Antrian job compose asinkron (POST /compose?mode=async)
+CREATE TABLE ComposeJobs (
+    id VARCHAR(36) NOT NULL PRIMARY KEY,
+    status ENUM('QUEUED', 'RUNNING', 'DONE', 'FAILED') NOT NULL DEFAULT 'QUEUED',
+    request_payload TEXT NOT NULL,
+    result_image_url TEXT NULL,
+    error TEXT NULL,
+    attempts INT NOT NULL DEFAULT 0,
+    enqueued_at BIGINT NOT NULL,
+    started_at BIGINT NULL,
+    finished_at BIGINT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    INDEX idx_compose_jobs_status_enqueued (status, enqueued_at)
+);
@@ -0,0 +1,2 @@
+-- URL salinan share (OutputProfile.share_format) untuk job compose asinkron
+ALTER TABLE ComposeJobs ADD COLUMN share_image_url TEXT NULL AFTER result_image_url;
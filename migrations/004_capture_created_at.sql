@@ -0,0 +1,2 @@
+-- Waktu capture dibuat; dipakai untuk memilih foto terbaru bila satu posisi difoto ulang
+ALTER TABLE Captures ADD COLUMN created_at TIMESTAMP NULL DEFAULT CURRENT_TIMESTAMP;
@@ -0,0 +1,7 @@
+-- Status pipeline level turunan capture (print/normal/preview/share) yang dibuat di background
+ALTER TABLE Captures
+    ADD COLUMN derivative_status ENUM('PENDING', 'RUNNING', 'READY', 'FAILED') NULL,
+    ADD COLUMN derivative_attempts INT NOT NULL DEFAULT 0,
+    ADD COLUMN derivative_started_at BIGINT NULL,
+    ADD COLUMN derivative_error TEXT NULL,
+    ADD INDEX idx_captures_derivative_status (derivative_status, created_at);
@@ -0,0 +1,6 @@
+-- Varian frame seukuran kanvas cetak (lebar 1200 px) yang dipakai langsung oleh /compose.
+-- Frame lama diisi dengan: python -m scripts.backfill_frame_print_variants
+ALTER TABLE Frames
+    ADD COLUMN print_image_link TEXT NULL,
+    ADD COLUMN print_width INT NULL,
+    ADD COLUMN print_height INT NULL;
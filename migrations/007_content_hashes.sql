@@ -0,0 +1,11 @@
+-- Hash isi file untuk mendeteksi frame/capture duplikat (sha256 = persis sama, phash = mirip secara visual).
+-- Baris lama diisi dengan: python -m scripts.find_duplicates --backfill
+ALTER TABLE Frames
+    ADD COLUMN content_sha256 CHAR(64) NULL,
+    ADD COLUMN phash CHAR(16) NULL,
+    ADD INDEX idx_frames_content_sha256 (content_sha256);
+
+ALTER TABLE Captures
+    ADD COLUMN content_sha256 CHAR(64) NULL,
+    ADD COLUMN phash CHAR(16) NULL,
+    ADD INDEX idx_captures_session_sha256 (session_id, content_sha256);
@@ -0,0 +1,5 @@
+-- Waktu capture terakhir dipakai compose (/compose, job async, maupun /sessions/{id}/compose);
+-- GC storage menganggap sesi yang punya capture ter-compose bukan sesi terbengkalai.
+-- Capture lama tidak diketahui riwayatnya, jadi diisi created_at agar tidak pernah dianggap terbengkalai.
+ALTER TABLE Captures ADD COLUMN composed_at TIMESTAMP NULL;
+UPDATE Captures SET composed_at = COALESCE(created_at, CURRENT_TIMESTAMP);
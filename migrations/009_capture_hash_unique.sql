@@ -0,0 +1,17 @@
+-- Satu file yang sama hanya tersimpan sekali per posisi dalam satu sesi: upload ulang dari kiosk
+-- (termasuk yang datang bersamaan) ditolak index unik ini dan dijawab dengan Capture yang sudah ada.
+-- Duplikat lama dipertahankan barisnya, hanya content_sha256-nya yang dikosongkan (kecuali satu).
+UPDATE Captures c
+JOIN (
+    SELECT session_id, frame_position_id, content_sha256, MIN(id) AS keep_id
+    FROM Captures
+    WHERE content_sha256 IS NOT NULL
+    GROUP BY session_id, frame_position_id, content_sha256
+    HAVING COUNT(*) > 1
+) d ON c.session_id = d.session_id AND c.frame_position_id = d.frame_position_id AND c.content_sha256 = d.content_sha256
+SET c.content_sha256 = NULL
+WHERE c.id <> d.keep_id;
+
+ALTER TABLE Captures
+    DROP INDEX idx_captures_session_sha256,
+    ADD UNIQUE INDEX uq_captures_position_sha256 (session_id, frame_position_id, content_sha256);
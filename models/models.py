@@ -2,7 +2,7 @@
 
 from sqlalchemy import (
     Column, String, Enum as SAEnum, ForeignKey, DECIMAL, Text, Integer, 
-    TIMESTAMP, func, BigInteger
+    TIMESTAMP, func, BigInteger, UniqueConstraint
 )
 from sqlalchemy.orm import relationship
 from config.database import Base
@@ -27,6 +27,13 @@ class Frame(Base):
     image_link = Column(Text, nullable=False)
     width = Column(Integer, nullable=False)
     height = Column(Integer, nullable=False)
+    # Varian RGBA seukuran kanvas cetak untuk /compose (NULL = belum dibuat, compose me-resize original)
+    print_image_link = Column(Text, nullable=True)
+    print_width = Column(Integer, nullable=True)
+    print_height = Column(Integer, nullable=True)
+    # Hash isi file original: sha256 (duplikat persis) dan pHash 64-bit hex (mirip secara visual)
+    content_sha256 = Column(String(64), nullable=True)
+    phash = Column(String(16), nullable=True)
     created_at = Column(TIMESTAMP, server_default=func.now())
     updated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now())
 
@@ -121,12 +128,46 @@ class PhotoSession(Base):
 
 class Capture(Base):
     __tablename__ = "Captures"
+    # Upload ulang file yang sama ke posisi yang sama ditolak di sini (lihat upload_capture)
+    __table_args__ = (
+        UniqueConstraint('session_id', 'frame_position_id', 'content_sha256', name='uq_captures_position_sha256'),
+    )
 
     id = Column(String(36), primary_key=True)
     session_id = Column(String(36), ForeignKey("PhotoSessions.id", ondelete="CASCADE"), nullable=False)
     normal_capture_url = Column(Text, nullable=False)
     raw_capture_url = Column(Text, nullable=False)
     frame_position_id = Column(String(36), ForeignKey("FramePositions.id", ondelete="SET NULL"), nullable=True)
+    # JSON: {"print": {"key": ..., "width": ..., "height": ...}, "normal": {...}, ...}
+    capture_levels = Column(Text, nullable=True)
+    # Status pembuatan level turunan oleh services/derivatives.py (NULL = capture lama, dibuat inline)
+    derivative_status = Column(SAEnum('PENDING', 'RUNNING', 'READY', 'FAILED', name='capture_derivative_status_enum'), nullable=True)
+    derivative_attempts = Column(Integer, nullable=False, default=0, server_default='0')
+    derivative_started_at = Column(BigInteger, nullable=True)   # epoch milidetik, dipakai sebagai lease
+    derivative_error = Column(Text, nullable=True)
+    # sha256 diisi saat upload lewat API (atau oleh pipeline untuk upload presigned), pHash oleh pipeline
+    content_sha256 = Column(String(64), nullable=True)
+    phash = Column(String(16), nullable=True)
+    created_at = Column(TIMESTAMP, server_default=func.now())
+    # Terakhir dipakai compose; NULL = belum pernah (dipakai GC untuk sesi terbengkalai)
+    composed_at = Column(TIMESTAMP, nullable=True)
 
     session = relationship("PhotoSession", back_populates="captures")
-    frame_position = relationship("FramePosition", back_populates="captures")
\ No newline at end of file
+    frame_position = relationship("FramePosition", back_populates="captures")
+
+class ComposeJob(Base):
+    __tablename__ = "ComposeJobs"
+
+    id = Column(String(36), primary_key=True)
+    status = Column(SAEnum('QUEUED', 'RUNNING', 'DONE', 'FAILED', name='compose_job_status_enum'), nullable=False, server_default='QUEUED')
+    request_payload = Column(Text, nullable=False)   # ComposeRequest dalam bentuk JSON
+    result_image_url = Column(Text, nullable=True)
+    share_image_url = Column(Text, nullable=True)
+    error = Column(Text, nullable=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    # Epoch milidetik; enqueued_at menentukan urutan FIFO, started_at dipakai sebagai lease
+    enqueued_at = Column(BigInteger, nullable=False)
+    started_at = Column(BigInteger, nullable=True)
+    finished_at = Column(BigInteger, nullable=True)
+    created_at = Column(TIMESTAMP, server_default=func.now())
+    updated_at = Column(TIMESTAMP, server_default=func.now(), onupdate=func.now())
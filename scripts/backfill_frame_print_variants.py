@@ -0,0 +1,104 @@
+# scripts/backfill_frame_print_variants.py
+#
+# Membuat varian cetak (RGBA seukuran kanvas cetak) untuk frame yang diunggah
+# sebelum kolom Frames.print_image_link ada, atau yang variannya dibuat dengan
+# lebar cetak berbeda dari FINAL_WIDTH_PX saat ini. Frame tanpa varian tetap
+# bisa di-compose (original di-resize setiap kali), jadi skrip ini aman
+# dijalankan kapan saja dan boleh diulang.
+#
+# Cara pakai (dari root repo, setelah migrations/006_frame_print_variant.sql):
+#   python -m scripts.backfill_frame_print_variants --dry-run
+#   python -m scripts.backfill_frame_print_variants --limit 50
+
+import argparse
+import asyncio
+import logging
+from uuid import uuid4
+
+from sqlalchemy import or_
+from sqlalchemy.future import select
+
+from config.database import SessionLocal
+from models.models import Frame
+from services.compose import compose_engine
+from services.imaging import FINAL_WIDTH_PX, render_frame_print_variant
+from services.storage import get_storage
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+async def backfill_frame(db, store, frame: Frame) -> str:
+    """Membuat, mengunggah, dan mencatat varian cetak satu frame. Mengembalikan URL varian."""
+    contents = await store.get_bytes(store.key_from_url(frame.image_link))
+    variant = await compose_engine.run(render_frame_print_variant, contents)
+
+    old_print_url = frame.print_image_link
+    if variant is None:
+        # Original sudah berukuran cetak
+        frame.print_image_link, frame.print_width, frame.print_height = frame.image_link, frame.width, frame.height
+    else:
+        data, (width, height), content_type, extension = variant
+        print_key = f"frames/{uuid4()}_print.{extension}"
+        await store.put_bytes(print_key, data, content_type)
+        frame.print_image_link, frame.print_width, frame.print_height = store.public_url(print_key), width, height
+    await db.commit()
+
+    # Varian lama (lebar cetak berbeda) tidak dipakai lagi
+    if old_print_url and old_print_url not in (frame.image_link, frame.print_image_link):
+        old_key = store.key_from_url(old_print_url)
+        if await store.delete_many([old_key]):
+            logger.error(f"Gagal menghapus varian lama {old_key}")
+    return frame.print_image_link
+
+
+async def backfill(limit: int | None, dry_run: bool) -> dict:
+    store = get_storage()
+
+    report = {"pending": 0, "done": 0, "failed": 0}
+    async with SessionLocal() as db:
+        query = (
+            select(Frame.id, Frame.name)
+            .filter(or_(Frame.print_image_link.is_(None), Frame.print_width != FINAL_WIDTH_PX))
+            .order_by(Frame.created_at)
+        )
+        if limit:
+            query = query.limit(limit)
+        pending = (await db.execute(query)).all()
+    report["pending"] = len(pending)
+
+    for frame_id, name in pending:
+        if dry_run:
+            logger.info(f"[dry-run] Frame {frame_id} ({name}) belum punya varian cetak.")
+            continue
+        # Satu sesi per frame: kegagalan satu frame tidak mengganggu frame berikutnya
+        async with SessionLocal() as db:
+            try:
+                frame = await db.get(Frame, frame_id)
+                if frame is None:
+                    continue
+                print_url = await backfill_frame(db, store, frame)
+                report["done"] += 1
+                logger.info(f"Frame {frame_id} ({name}): {print_url}")
+            except Exception as e:
+                await db.rollback()
+                report["failed"] += 1
+                logger.error(f"Gagal membuat varian cetak frame {frame_id}: {e}")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill varian cetak untuk frame yang sudah ada.")
+    parser.add_argument("--limit", type=int, default=None, help="Maksimal frame yang diproses")
+    parser.add_argument("--dry-run", action="store_true", help="Hanya tampilkan frame yang belum punya varian")
+    args = parser.parse_args()
+    try:
+        report = asyncio.run(backfill(args.limit, args.dry_run))
+    finally:
+        compose_engine.shutdown()
+    logger.info(f"Selesai: {report}")
+
+
+# Guard wajib: worker process 'spawn' meng-import ulang modul utama
+if __name__ == "__main__":
+    main()
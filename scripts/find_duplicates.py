@@ -0,0 +1,180 @@
+# scripts/find_duplicates.py
+#
+# Mencari frame dan capture duplikat berdasarkan hash isi file:
+#   - duplikat persis: content_sha256 sama
+#   - mirip secara visual: jarak Hamming pHash <= --threshold (frame: antar semua
+#     frame; capture: hanya di dalam satu sesi dan posisi yang sama)
+# Skrip hanya melaporkan; tidak ada baris maupun objek storage yang dihapus.
+#
+# Baris yang dibuat sebelum migrations/007_content_hashes.sql belum punya hash;
+# --backfill mengunduh original-nya dari storage lalu menghitung sha256 + pHash.
+#
+# Cara pakai (dari root repo):
+#   python -m scripts.find_duplicates --backfill
+#   python -m scripts.find_duplicates --threshold 6 --json > duplicates.json
+
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+from collections import defaultdict
+
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.future import select
+
+from config.database import SessionLocal
+from models.models import Capture, Frame
+from services.compose import compose_engine
+from services.imaging import hamming_distance, image_phash
+from services.storage import get_storage
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def _original_key(store, row) -> str:
+    if isinstance(row, Capture) and row.capture_levels:
+        key = json.loads(row.capture_levels).get("original", {}).get("key")
+        if key:
+            return key
+    url = row.image_link if isinstance(row, Frame) else row.raw_capture_url
+    return store.key_from_url(url)
+
+
+async def backfill_hashes(concurrency: int) -> dict:
+    """Mengisi content_sha256/phash yang masih kosong pada Frames dan Captures."""
+    store = get_storage()
+    limiter = asyncio.Semaphore(concurrency)
+    report = {"frames": 0, "captures": 0, "duplicateCaptures": 0, "failed": 0}
+
+    async def fill(model, row_id: str, table: str):
+        async with limiter, SessionLocal() as db:
+            row = await db.get(model, row_id)
+            try:
+                contents = await store.get_bytes(_original_key(store, row))
+                content_sha256 = row.content_sha256 or hashlib.sha256(contents).hexdigest()
+                phash = await compose_engine.run(image_phash, contents)
+                row.content_sha256, row.phash = content_sha256, phash
+                try:
+                    await db.commit()
+                except IntegrityError:
+                    # Capture lain di posisi yang sama sudah tercatat dengan sha256 ini (index unik):
+                    # hanya pHash yang disimpan, duplikatnya tetap terlihat di laporan kemiripan
+                    await db.rollback()
+                    row = await db.get(model, row_id)
+                    row.phash = phash
+                    await db.commit()
+                    report["duplicateCaptures"] += 1
+                report[table] += 1
+            except Exception as e:
+                await db.rollback()
+                report["failed"] += 1
+                logger.error(f"Gagal menghitung hash {table} {row_id}: {e}")
+
+    async with SessionLocal() as db:
+        frame_ids = (await db.execute(
+            select(Frame.id).filter(or_(Frame.content_sha256.is_(None), Frame.phash.is_(None)))
+        )).scalars().all()
+        capture_ids = (await db.execute(
+            select(Capture.id).filter(or_(Capture.content_sha256.is_(None), Capture.phash.is_(None)))
+        )).scalars().all()
+    logger.info(f"Backfill hash: {len(frame_ids)} frame, {len(capture_ids)} capture.")
+    await asyncio.gather(
+        *(fill(Frame, row_id, "frames") for row_id in frame_ids),
+        *(fill(Capture, row_id, "captures") for row_id in capture_ids),
+    )
+    return report
+
+
+def _similar_groups(items: list, threshold: int) -> list:
+    """Mengelompokkan (id, phash) yang saling terhubung dengan jarak <= threshold (union-find)."""
+    parent = list(range(len(items)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i in range(len(items)):
+        for j in range(i + 1, len(items)):
+            if hamming_distance(items[i][1], items[j][1]) <= threshold:
+                parent[find(i)] = find(j)
+    groups = defaultdict(list)
+    for i, (item_id, _) in enumerate(items):
+        groups[find(i)].append(item_id)
+    return [sorted(group) for group in groups.values() if len(group) > 1]
+
+
+async def find_duplicates(threshold: int) -> dict:
+    async with SessionLocal() as db:
+        frames = (await db.execute(select(Frame.id, Frame.content_sha256, Frame.phash))).all()
+        captures = (await db.execute(
+            select(Capture.id, Capture.session_id, Capture.frame_position_id, Capture.content_sha256, Capture.phash)
+        )).all()
+
+    frames_by_sha = defaultdict(list)
+    for frame_id, content_sha256, _ in frames:
+        if content_sha256:
+            frames_by_sha[content_sha256].append(frame_id)
+    frame_hashes = [(frame_id, phash) for frame_id, _, phash in frames if phash]
+
+    captures_by_sha = defaultdict(list)
+    captures_by_slot = defaultdict(list)
+    for capture_id, session_id, position_id, content_sha256, phash in captures:
+        if content_sha256:
+            captures_by_sha[content_sha256].append(capture_id)
+        if phash:
+            captures_by_slot[(session_id, position_id)].append((capture_id, phash))
+
+    return {
+        "frames": {
+            "exact": [sorted(ids) for ids in frames_by_sha.values() if len(ids) > 1],
+            "similar": _similar_groups(frame_hashes, threshold),
+            "unhashed": sum(1 for _, content_sha256, phash in frames if not content_sha256 or not phash),
+        },
+        "captures": {
+            "exact": [sorted(ids) for ids in captures_by_sha.values() if len(ids) > 1],
+            "similar": [group for items in captures_by_slot.values() for group in _similar_groups(items, threshold)],
+            "unhashed": sum(1 for *_, content_sha256, phash in captures if not content_sha256 or not phash),
+        },
+    }
+
+
+async def run(args) -> dict:
+    if args.backfill:
+        logger.info(f"Backfill selesai: {await backfill_hashes(args.concurrency)}")
+    return await find_duplicates(args.threshold)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Laporan frame & capture duplikat berdasarkan sha256 dan pHash.")
+    parser.add_argument("--threshold", type=int, default=6, help="Jarak Hamming pHash maksimal untuk dianggap mirip")
+    parser.add_argument("--backfill", action="store_true", help="Hitung dulu hash yang masih kosong (unduh dari storage)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Unduhan paralel saat backfill")
+    parser.add_argument("--json", action="store_true", help="Cetak laporan lengkap sebagai JSON")
+    args = parser.parse_args()
+    try:
+        report = asyncio.run(run(args))
+    finally:
+        compose_engine.shutdown()
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    for kind in ("frames", "captures"):
+        section = report[kind]
+        logger.info(
+            f"{kind}: {len(section['exact'])} grup duplikat persis, {len(section['similar'])} grup mirip, "
+            f"{section['unhashed']} belum punya hash"
+        )
+        for label in ("exact", "similar"):
+            for group in section[label]:
+                logger.info(f"  [{label}] {', '.join(group)}")
+
+
+# Guard wajib: worker process 'spawn' meng-import ulang modul utama
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+# scripts/storage_gc.py
+#
+# Menjalankan satu putaran garbage collector storage (services/storage_gc.py) di
+# luar proses API: objek di frames/, captures/ dan final/ yang tidak dirujuk
+# Frames, Captures, PhotoSessions maupun ComposeJobs, dan sudah lebih tua dari
+# STORAGE_GC_GRACE_SECONDS, dihapus per batch. Hasil compose di final/ hanya ikut dibersihkan
+# bila STORAGE_GC_FINAL_GRACE_SECONDS > 0, dan key lama final/<uuid>_... tidak pernah dihapus.
+# Default-nya dry-run; tambahkan --delete untuk benar-benar menghapus.
+#
+# Cara pakai (dari root repo):
+#   python -m scripts.storage_gc
+#   python -m scripts.storage_gc --delete --max-deletes 1000
+
+import argparse
+import asyncio
+import json
+import logging
+
+from services.compose import compose_engine
+from services.storage_gc import storage_gc
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hapus objek storage yang tidak lagi dirujuk database.")
+    parser.add_argument("--delete", action="store_true", help="Benar-benar menghapus (default: hanya laporan)")
+    parser.add_argument("--max-deletes", type=int, default=None, help="Batas objek yatim per putaran")
+    parser.add_argument("--json", action="store_true", help="Cetak laporan lengkap sebagai JSON")
+    args = parser.parse_args()
+    try:
+        report = asyncio.run(storage_gc.run(dry_run=not args.delete, max_deletes=args.max_deletes))
+    finally:
+        compose_engine.shutdown()
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    for prefix, counts in report["prefixes"].items():
+        logger.info(f"{prefix}: {counts['scanned']} objek, {counts['orphans']} yatim ({counts['orphanBytes']} byte)")
+    for key in report["sampleOrphans"]:
+        logger.info(f"  {key}")
+
+
+# Guard wajib: worker process 'spawn' meng-import ulang modul utama
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,334 @@
+# services/cache.py
+
+import asyncio
+import contextlib
+import hashlib
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable
+from uuid import uuid4
+
+
+class LRUCache:
+    """
+    Cache LRU in-process yang dibatasi total ukuran (byte), bukan jumlah entri.
+    Aman dipakai dari event loop maupun thread executor.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Hashable, tuple[Any, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Hashable, value: Any, size: int):
+        with self._lock:
+            if key in self._entries:
+                self.current_bytes -= self._entries.pop(key)[1]
+            if size > self.max_bytes:
+                # Entri lebih besar dari seluruh kapasitas: tidak disimpan
+                return
+            self._entries[key] = (value, size)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+                self.evictions += 1
+
+    def invalidate(self, predicate: Callable[[Hashable], bool]) -> int:
+        """Menghapus semua entri yang key-nya memenuhi `predicate`, mengembalikan jumlahnya."""
+        with self._lock:
+            keys = [key for key in self._entries if predicate(key)]
+            for key in keys:
+                self.current_bytes -= self._entries.pop(key)[1]
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "maxBytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hitRate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+class TTLCache:
+    """
+    Cache in-process dengan masa berlaku per entri (detik) dan batas jumlah entri (LRU).
+    Dipakai untuk data kecil yang jarang berubah, seperti metadata frame dari database.
+    Aman dipakai dari event loop maupun thread executor.
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int = 10000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, tuple[Any, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] <= time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Hashable, value: Any):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (value, time.monotonic() + self.ttl_seconds)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, predicate: Callable[[Hashable], bool]) -> int:
+        """Menghapus semua entri yang key-nya memenuhi `predicate`, mengembalikan jumlahnya."""
+        with self._lock:
+            keys = [key for key in self._entries if predicate(key)]
+            for key in keys:
+                del self._entries[key]
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "maxEntries": self.max_entries,
+                "ttlSeconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hitRate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+class _DiskEntry:
+    __slots__ = ("path", "size", "etag", "validated_at", "pins")
+
+    def __init__(self, path: str, size: int, etag: str | None, validated_at: float):
+        self.path = path
+        self.size = size
+        self.etag = etag
+        self.validated_at = validated_at
+        self.pins = 0
+
+
+class DiskCache:
+    """
+    Cache file di disk dengan LRU berdasarkan total ukuran (byte), untuk salinan lokal objek
+    storage. Entri yang lebih tua dari `revalidate_seconds` divalidasi ulang dengan ETag
+    (isi hanya diunduh lagi bila berubah). Entri yang sedang dipakai (di dalam `open`) tidak
+    di-evict, jadi total ukuran bisa sesaat melebihi batas.
+    Index hanya ada di memori; tiap proses memakai subfolder `worker-<pid>` sendiri di `root`.
+    Dipakai dari event loop (bukan dari thread executor).
+    """
+
+    def __init__(self, root: str, max_bytes: int, revalidate_seconds: float):
+        self.max_bytes = max_bytes
+        self.revalidate_seconds = revalidate_seconds
+        parent = os.path.abspath(root)
+        self.root = os.path.join(parent, f"worker-{os.getpid()}")
+        self._entries: "OrderedDict[str, _DiskEntry]" = OrderedDict()
+        self._loading: dict = {}
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.refreshed = 0
+        self.evictions = 0
+        _remove_stale_worker_dirs(parent)
+        shutil.rmtree(self.root, ignore_errors=True)
+        os.makedirs(self.root)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, hashlib.sha256(key.encode()).hexdigest())
+
+    @contextlib.asynccontextmanager
+    async def open(self, key: str, fetch: Callable[[str, str | None], Awaitable[str | None]] | None):
+        """
+        Path file lokal berisi objek `key`; file dijamin ada selama blok `async with`.
+        Saat miss (atau perlu validasi ulang), `fetch(path, etag)` menulis objek ke `path` dan
+        mengembalikan ETag-nya, atau None bila ETag objek masih sama dengan `etag`.
+        Tanpa `fetch`, hanya entri yang masih segar yang dipakai; selain itu yang di-yield None.
+        """
+        entry = await self._acquire(key, fetch)
+        try:
+            yield entry.path if entry else None
+        finally:
+            if entry:
+                entry.pins -= 1
+                self._evict()
+
+    async def _acquire(self, key: str, fetch) -> _DiskEntry | None:
+        while True:
+            loading = self._loading.get(key)
+            if loading is not None:
+                # Proses lain sedang mengunduh key yang sama: tunggu lalu periksa ulang
+                await asyncio.wait([loading])
+                continue
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry.validated_at < self.revalidate_seconds:
+                entry.pins += 1
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            if fetch is None:
+                return None
+            break
+
+        self._loading[key] = asyncio.get_running_loop().create_future()
+        if entry is not None:
+            entry.pins += 1
+        try:
+            return await self._load(key, entry, fetch)
+        except BaseException:
+            if entry is not None:
+                entry.pins -= 1
+            raise
+        finally:
+            self._loading.pop(key).set_result(None)
+
+    async def _load(self, key: str, entry: _DiskEntry | None, fetch) -> _DiskEntry:
+        path = self._path(key)
+        tmp_path = f"{path}.{uuid4().hex}.tmp"
+        try:
+            etag = await fetch(tmp_path, entry.etag if entry else None)
+            if etag is None and entry is not None:
+                entry.validated_at = time.monotonic()
+                self._entries.move_to_end(key)
+                self.revalidated += 1
+                self.hits += 1
+                return entry
+            size = os.path.getsize(tmp_path)
+            # rename atomik: pembaca entri lama yang sudah membuka file tetap membaca isi lama
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        if entry is not None and self._entries.get(key) is entry:
+            self.current_bytes -= entry.size
+            self.refreshed += 1
+        else:
+            if entry is not None:
+                # Entri lama sempat di-invalidate saat diunduh ulang; pin-nya ikut entri baru
+                entry.pins -= 1
+            entry = _DiskEntry(path, 0, None, 0.0)
+            entry.pins = 1
+            self.misses += 1
+        entry.size, entry.etag, entry.validated_at = size, etag, time.monotonic()
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        self.current_bytes += size
+        self._evict()
+        return entry
+
+    def _evict(self):
+        if self.current_bytes <= self.max_bytes:
+            return
+        for key in list(self._entries):
+            if self.current_bytes <= self.max_bytes:
+                break
+            entry = self._entries[key]
+            if entry.pins:
+                continue
+            self._remove(key)
+            self.evictions += 1
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key)
+        self.current_bytes -= entry.size
+        try:
+            os.remove(entry.path)
+        except FileNotFoundError:
+            pass
+
+    def invalidate(self, keys) -> int:
+        """Membuang entri untuk `keys` (objek ditimpa/dihapus). Entri yang sedang dibaca tetap aman."""
+        removed = 0
+        for key in keys:
+            entry = self._entries.get(key)
+            if entry is None:
+                continue
+            if entry.pins:
+                # Masih dibaca: cukup tandai kedaluwarsa agar pemakaian berikutnya divalidasi ulang
+                entry.validated_at = float("-inf")
+            else:
+                self._remove(key)
+            removed += 1
+        return removed
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.current_bytes,
+            "maxBytes": self.max_bytes,
+            "pinned": sum(1 for entry in self._entries.values() if entry.pins),
+            "hits": self.hits,
+            "misses": self.misses,
+            "revalidated": self.revalidated,
+            "refreshed": self.refreshed,
+            "evictions": self.evictions,
+            "hitRate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+def _remove_stale_worker_dirs(parent: str):
+    """Menghapus subfolder cache milik proses yang sudah tidak berjalan."""
+    if not os.path.isdir(parent):
+        return
+    for name in os.listdir(parent):
+        if not name.startswith("worker-"):
+            continue
+        try:
+            pid = int(name[len("worker-"):])
+            os.kill(pid, 0)
+            continue
+        except ProcessLookupError:
+            pass
+        except (ValueError, PermissionError):
+            continue
+        shutil.rmtree(os.path.join(parent, name), ignore_errors=True)
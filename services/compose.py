@@ -0,0 +1,235 @@
+# services/compose.py
+
+import asyncio
+import hashlib
+import json
+import logging
+import multiprocessing
+from contextlib import AsyncExitStack
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Tuple
+
+from config.settings import settings
+from services.cache import LRUCache, TTLCache
+from services.timing import stage
+from services.imaging import (
+    FINAL_WIDTH_PX, Placement, assemble_composition, pick_level, prepare_frame, prepare_photo, print_size,
+    read_image_size, slot_geometry,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class ComposeTimeoutError(Exception):
+    """Job di worker process melebihi batas waktu COMPOSE_JOB_TIMEOUT."""
+
+
+class PhotoSource(NamedTuple):
+    """Satu foto untuk /compose: key asli, placement di koordinat frame, dan level resolusi yang tersedia."""
+    key: str
+    placement: Placement
+    levels: Tuple[Tuple[str, int, int], ...] = ()   # (key, width, height)
+
+
+class ComposeEngine:
+    """
+    Menjalankan pekerjaan gambar yang berat (decode, filter, resize, encode)
+    di process pool agar event loop FastAPI tetap responsif.
+    """
+
+    def __init__(self, pool_size: int, job_timeout: float):
+        self.pool_size = max(1, pool_size)
+        self.job_timeout = job_timeout
+        self._executor: ProcessPoolExecutor | None = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # 'spawn' supaya worker tidak mewarisi thread/koneksi milik proses API
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.pool_size,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            logger.info(f"Compose process pool dibuat dengan {self.pool_size} worker.")
+        return self._executor
+
+    async def run(self, func: Callable[..., Any], *args: Any, timeout: float | None = None) -> Any:
+        """Menjalankan `func(*args)` di worker process dan menunggu hasilnya."""
+        timeout = self.job_timeout if timeout is None else timeout
+        try:
+            future = self._get_executor().submit(func, *args)
+        except BrokenProcessPool:
+            # Worker mati (mis. OOM); buat ulang pool lalu coba sekali lagi
+            logger.warning("Compose process pool rusak, membuat ulang pool.")
+            self.shutdown(wait=False)
+            future = self._get_executor().submit(func, *args)
+
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout=timeout)
+        except asyncio.TimeoutError:
+            future.cancel()
+            raise ComposeTimeoutError(f"Job compose melebihi batas waktu {timeout:.0f} detik.")
+
+    def shutdown(self, wait: bool = True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+            self._executor = None
+
+
+# Instance tunggal yang dipakai oleh router
+compose_engine = ComposeEngine(
+    pool_size=settings.COMPOSE_POOL_SIZE,
+    job_timeout=settings.COMPOSE_JOB_TIMEOUT,
+)
+
+# Frame yang sudah di-decode & di-resize ke ukuran cetak.
+# Key: (frame_key, lebar_target) -> (ukuran_frame_asli, ukuran_kanvas, ImagePayload)
+frame_cache = LRUCache(max_bytes=settings.FRAME_CACHE_MAX_BYTES)
+
+
+def invalidate_frame_cache(frame_key: str) -> int:
+    """Membuang semua versi cetak dari satu frame (dipanggil saat frame dihapus)."""
+    return frame_cache.invalidate(lambda key: key[0] == frame_key)
+
+
+def compose_digest(frame_key: str, filter_name: str, photos: List[PhotoSource], output: dict) -> str:
+    """
+    Hash stabil dari semua input yang menentukan hasil render. Objek frame/capture
+    di storage memakai key unik dan tidak pernah ditimpa, jadi key cukup mewakili isinya.
+    """
+    canonical = {
+        "frame": frame_key,
+        "filter": filter_name,
+        "photos": [[photo.key, *photo.placement] for photo in photos],
+        "output": output,
+    }
+    encoded = json.dumps(canonical, sort_keys=True, separators=(",", ":")).encode()
+    return hashlib.sha256(encoded).hexdigest()
+
+
+class SingleFlight:
+    """Menggabungkan pemanggilan konkuren dengan key yang sama menjadi satu pekerjaan."""
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+    async def run(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        # shield: request yang dibatalkan (klien timeout) tidak ikut membatalkan render milik yang lain
+        return await asyncio.shield(task)
+
+    def _finish(self, key: str, task: asyncio.Task):
+        self._inflight.pop(key, None)
+        if not task.cancelled():
+            task.exception()  # tandai sudah diambil agar tidak ada warning bila semua penunggu batal
+
+
+# Indeks digest -> URL hasil yang sudah pasti ada di storage; entri kedaluwarsa agar objek yang
+# dihapus garbage collector di luar proses ini tidak terus dikembalikan
+compose_results = TTLCache(
+    ttl_seconds=settings.COMPOSE_RESULT_INDEX_TTL_SECONDS, max_entries=settings.COMPOSE_RESULT_INDEX_ENTRIES,
+)
+compose_singleflight = SingleFlight()
+
+
+async def fetch_object_source(store, key: str, limiter: asyncio.Semaphore, files: AsyncExitStack) -> bytes | str:
+    """
+    Mengambil satu objek dari storage (services.storage), dibatasi oleh `limiter`. Bila storage
+    punya salinan di disk (cache objek / backend lokal), yang dikembalikan path file-nya:
+    worker process membacanya lewat mmap, jadi byte gambar tidak perlu dikirim lewat pipe
+    process pool. File dijamin ada (tidak di-evict) sampai `files` ditutup.
+    """
+    async with limiter:
+        with stage("fetch"):
+            if store.local_files:
+                return await files.enter_async_context(store.local_file(key))
+            return await store.get_bytes(key)
+
+
+async def compose_photos(
+    store, frame_key: str, photos: List[PhotoSource], filter_name: str,
+    output: dict | None = None, frame_size: Tuple[int, int] | None = None, frame_print_key: str | None = None,
+) -> dict:
+    """
+    Pipeline /compose: frame dan semua foto diunduh paralel (fan-out dibatasi
+    COMPOSE_FETCH_CONCURRENCY) dan setiap gambar langsung di-decode di worker
+    process begitu byte-nya tiba (atau dari file cache objek di disk, lihat
+    fetch_object_source). Untuk tiap foto dipilih level resolusi
+    terkecil yang masih cukup untuk slot cetaknya; `frame_size` (dari tabel
+    Frames) membuat pilihan itu tidak perlu menunggu frame terunduh.
+    `frame_print_key` menunjuk varian frame yang sudah berukuran kanvas cetak
+    (dibuat saat frame diunggah); bila ada, frame dipakai tanpa resize.
+    Filter diterapkan sekali untuk semua foto di tahap assemble, setelah foto
+    diperkecil ke ukuran slot. Mengembalikan {"master": EncodedImage, "share": EncodedImage | None}
+    sesuai profil `output`.
+    """
+    limiter = asyncio.Semaphore(settings.COMPOSE_FETCH_CONCURRENCY)
+    # Diisi begitu ukuran frame diketahui; foto butuh ukuran ini untuk menghitung slot cetak
+    geometry: asyncio.Future = asyncio.get_running_loop().create_future()
+    if frame_size is not None:
+        geometry.set_result((frame_size, print_size(frame_size)))
+
+    async def frame_stage():
+        cache_key = (frame_key, FINAL_WIDTH_PX)
+        cached = frame_cache.get(cache_key)
+        if cached is not None:
+            if not geometry.done():
+                geometry.set_result(cached[:2])
+            return cached[2]
+
+        async with AsyncExitStack() as files:
+            try:
+                if frame_print_key and frame_size is not None:
+                    frame_source = await fetch_object_source(store, frame_print_key, limiter, files)
+                    actual_size = frame_size
+                else:
+                    frame_source = await fetch_object_source(store, frame_key, limiter, files)
+                    actual_size = read_image_size(frame_source)
+                canvas_size = print_size(actual_size)
+                if not geometry.done():
+                    geometry.set_result((actual_size, canvas_size))
+            except BaseException as e:
+                if not geometry.done():
+                    geometry.set_exception(e)
+                raise
+            with stage("decode"):
+                frame_payload = await compose_engine.run(prepare_frame, frame_source, canvas_size)
+        frame_cache.put(cache_key, (actual_size, canvas_size, frame_payload), size=len(frame_payload[2]))
+        return frame_payload
+
+    async def photo_stage(photo: PhotoSource):
+        async with AsyncExitStack() as files:
+            if photo.levels:
+                # Level hanya bisa dipilih setelah ukuran slot cetak diketahui
+                frame_size, canvas_size = await geometry
+                position, target_size = slot_geometry(frame_size, canvas_size, photo.placement)
+                photo_key = pick_level(list(photo.levels), target_size) or photo.key
+                photo_source = await fetch_object_source(store, photo_key, limiter, files)
+            else:
+                photo_source = await fetch_object_source(store, photo.key, limiter, files)
+                frame_size, canvas_size = await geometry
+                position, target_size = slot_geometry(frame_size, canvas_size, photo.placement)
+            with stage("decode"):
+                return await compose_engine.run(prepare_photo, photo_source, target_size), position
+
+    tasks = [asyncio.ensure_future(frame_stage())]
+    tasks += [asyncio.ensure_future(photo_stage(photo)) for photo in photos]
+    try:
+        frame_payload, *photo_payloads = await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        # Ambil exception geometry agar tidak muncul warning "never retrieved"
+        if geometry.done() and not geometry.cancelled():
+            geometry.exception()
+        raise
+
+    with stage("assemble"):
+        return await compose_engine.run(assemble_composition, frame_payload, photo_payloads, filter_name, output or {})
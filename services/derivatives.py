@@ -0,0 +1,137 @@
+# services/derivatives.py
+
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable
+
+from sqlalchemy import and_, or_, update
+from sqlalchemy.future import select
+
+from config.database import SessionLocal
+from config.settings import settings
+from models.models import Capture
+
+logger = logging.getLogger(__name__)
+
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+class CaptureDerivativePipeline:
+    """
+    Membuat level turunan capture (print, normal, preview, share) di background setelah
+    file original tersimpan, supaya upload capture bisa langsung selesai.
+
+    Antriannya adalah kolom `derivative_status` di tabel Captures: capture baru masuk
+    sebagai PENDING dan diambil worker dengan SELECT ... FOR UPDATE SKIP LOCKED, sama
+    seperti ComposeJobQueue. Karena statusnya di DB, capture yang belum selesai saat
+    proses restart otomatis dikerjakan lagi. Kegagalan dicoba ulang sampai
+    `max_attempts` kali sebelum ditandai FAILED.
+    """
+
+    def __init__(self, workers: int, poll_interval: float, lease_seconds: float, max_attempts: int):
+        self.workers = max(1, workers)
+        self.poll_interval = poll_interval
+        self.lease_ms = int(lease_seconds * 1000)
+        self.max_attempts = max_attempts
+        self._handler: Callable[[Capture], Awaitable[dict]] | None = None
+        self._tasks: list[asyncio.Task] = []
+        self._wakeup = asyncio.Event()
+
+    def set_handler(self, handler: Callable[[Capture], Awaitable[dict]]):
+        """`handler(capture)` membuat & mengunggah level turunan, lalu mengembalikan kolom Capture yang diperbarui."""
+        self._handler = handler
+
+    def notify(self):
+        """Dipanggil setelah capture PENDING baru di-commit agar worker tidak menunggu polling."""
+        self._wakeup.set()
+
+    async def start(self):
+        if self._tasks:
+            return
+        self._tasks = [asyncio.create_task(self._worker(index)) for index in range(self.workers)]
+        logger.info(f"Pipeline level turunan capture berjalan dengan {self.workers} worker.")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _claim_next(self) -> Capture | None:
+        """Mengambil capture PENDING tertua (atau RUNNING dengan lease kedaluwarsa) dan menandainya RUNNING."""
+        while True:
+            now = _now_ms()
+            async with SessionLocal() as db:
+                result = await db.execute(
+                    select(Capture)
+                    .where(or_(
+                        Capture.derivative_status == 'PENDING',
+                        and_(Capture.derivative_status == 'RUNNING', Capture.derivative_started_at < now - self.lease_ms),
+                    ))
+                    .order_by(Capture.created_at)
+                    .limit(1)
+                    .with_for_update(skip_locked=True)
+                )
+                capture = result.scalars().first()
+                if capture is None:
+                    await db.rollback()
+                    return None
+
+                if capture.derivative_attempts >= self.max_attempts:
+                    capture.derivative_status = 'FAILED'
+                    capture.derivative_error = capture.derivative_error or "Dihentikan setelah beberapa percobaan tanpa selesai."
+                    await db.commit()
+                    logger.warning(f"Level turunan capture {capture.id} gagal permanen.")
+                    continue
+
+                capture.derivative_status = 'RUNNING'
+                capture.derivative_started_at = now
+                capture.derivative_attempts += 1
+                await db.commit()
+                return capture
+
+    async def _run(self, capture: Capture):
+        try:
+            values = await self._handler(capture)
+            values = {**values, "derivative_status": 'READY', "derivative_error": None}
+        except Exception as e:
+            logger.error(f"Level turunan capture {capture.id} gagal: {e}", exc_info=True)
+            retry = capture.derivative_attempts < self.max_attempts
+            values = {"derivative_status": 'PENDING' if retry else 'FAILED', "derivative_error": str(e) or e.__class__.__name__}
+
+        async with SessionLocal() as db:
+            await db.execute(update(Capture).where(Capture.id == capture.id).values(**values))
+            await db.commit()
+
+    async def _worker(self, index: int):
+        while True:
+            # clear() sebelum claim: notify() yang terjadi setelahnya pasti membangunkan worker ini
+            self._wakeup.clear()
+            try:
+                capture = await self._claim_next()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Worker level turunan {index} gagal mengambil capture: {e}")
+                await asyncio.sleep(self.poll_interval)
+                continue
+
+            if capture is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run(capture)
+
+
+# Instance tunggal; handler dipasang oleh api/photobox.py
+capture_derivatives = CaptureDerivativePipeline(
+    workers=settings.CAPTURE_DERIVATIVE_WORKERS,
+    poll_interval=settings.CAPTURE_DERIVATIVE_POLL_INTERVAL,
+    lease_seconds=settings.CAPTURE_DERIVATIVE_LEASE_SECONDS,
+    max_attempts=settings.CAPTURE_DERIVATIVE_MAX_ATTEMPTS,
+)
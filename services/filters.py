@@ -0,0 +1,103 @@
+# services/filters.py
+
+# Engine filter berbasis lookup table (LUT) di atas array NumPy.
+# Setiap filter didefinisikan sebagai 3 LUT (R, G, B) berukuran 256, dan opsional
+# konversi ke luma terlebih dahulu. Filter bekerja langsung pada array RGBA
+# (H, W, 4) uint8 tanpa membuat Image perantara; alpha tidak diubah.
+# Kernel LUT dan luma memakai OpenCV (sudah jadi dependensi untuk deteksi slot)
+# karena jauh lebih cepat daripada fancy indexing NumPy pada data RGBA interleaved.
+
+from dataclasses import dataclass
+from typing import Dict, Iterable, List
+
+import cv2
+import numpy as np
+
+_RAMP = np.arange(256, dtype=np.float64)
+
+
+@dataclass(frozen=True)
+class LutFilter:
+    luts: np.ndarray            # shape (3, 256), uint8
+    grayscale: bool = False     # hitung luma dulu, lalu petakan luma -> RGB
+    identity_luts: bool = False  # LUT tidak mengubah nilai (mis. grayscale murni)
+    lut4: np.ndarray = None     # shape (1, 256, 4) untuk cv2.LUT, alpha identitas
+    packed: np.ndarray = None   # shape (256,) uint32: luma -> piksel RGBA dalam satu gather
+
+
+def _make_filter(luts: np.ndarray, grayscale: bool = False) -> LutFilter:
+    identity_lut = np.arange(256, dtype=np.uint8)
+    rgba_table = np.ascontiguousarray(np.vstack([luts, identity_lut]).T)    # (256, 4)
+    is_identity = bool((luts == identity_lut).all())
+    return LutFilter(
+        luts=luts,
+        grayscale=grayscale,
+        identity_luts=is_identity,
+        lut4=rgba_table.reshape(1, 256, 4),
+        packed=rgba_table.view(np.uint32).ravel(),
+    )
+
+
+def _clip(values: np.ndarray) -> np.ndarray:
+    return np.clip(np.rint(values), 0, 255).astype(np.uint8)
+
+
+def _gradient(black: str, white: str) -> np.ndarray:
+    """LUT luma -> RGB yang setara dengan ImageOps.colorize(black, white)."""
+    start = np.array([int(black[i:i + 2], 16) for i in (1, 3, 5)], dtype=np.float64)
+    end = np.array([int(white[i:i + 2], 16) for i in (1, 3, 5)], dtype=np.float64)
+    return _clip(start[:, None] + (end - start)[:, None] * _RAMP[None, :] / 255)
+
+
+def _curves(red: np.ndarray, green: np.ndarray, blue: np.ndarray) -> np.ndarray:
+    return np.stack([_clip(red), _clip(green), _clip(blue)])
+
+
+def _s_curve(strength: float) -> np.ndarray:
+    """Kurva kontras berbentuk S di sekitar nilai tengah."""
+    x = _RAMP / 255
+    curved = x + strength * (x - 0.5) * (1 - np.abs(2 * x - 1))
+    return curved * 255
+
+
+_IDENTITY = _curves(_RAMP, _RAMP, _RAMP)
+
+# Registry filter yang tersedia; nama dipakai langsung oleh ComposeRequest.filter_name
+FILTERS: Dict[str, LutFilter] = {
+    "none": _make_filter(_IDENTITY),
+    "grayscale": _make_filter(_IDENTITY, grayscale=True),
+    "sepia": _make_filter(_gradient("#704214", "#E6D8B4"), grayscale=True),
+    "warm": _make_filter(_curves(_RAMP * 1.08 + 6, _RAMP * 1.02 + 2, _RAMP * 0.88)),
+    "cool": _make_filter(_curves(_RAMP * 0.90, _RAMP * 1.01 + 2, _RAMP * 1.08 + 8)),
+    # Hitam sedikit terangkat (faded) dan highlight kekuningan
+    "vintage": _make_filter(_curves(_RAMP * 0.80 + 40, _RAMP * 0.76 + 32, _RAMP * 0.62 + 28)),
+    "bw_contrast": _make_filter(_curves(*[_s_curve(1.6)] * 3), grayscale=True),
+}
+
+
+def available_filters() -> List[str]:
+    return list(FILTERS)
+
+
+def apply_filter_array(rgba: np.ndarray, filter_name: str) -> np.ndarray:
+    """
+    Mengaplikasikan filter ke array RGBA kontigu. Filter warna ditulis in-place;
+    filter berbasis luma mengembalikan array baru. Nama yang tidak dikenal = tanpa filter.
+    """
+    spec = FILTERS.get(filter_name)
+    if spec is None or (spec.identity_luts and not spec.grayscale):
+        return rgba
+    if spec.grayscale:
+        # Luma ITU-R 601-2, sama seperti Image.convert('L') (selisih pembulatan maks. 1)
+        gray = cv2.cvtColor(rgba, cv2.COLOR_RGBA2GRAY)
+        if spec.identity_luts:
+            return cv2.merge([gray, gray, gray, cv2.extractChannel(rgba, 3)])
+        filtered = np.take(spec.packed, gray).view(np.uint8).reshape(rgba.shape)
+        filtered[..., 3] = rgba[..., 3]
+        return filtered
+    return cv2.LUT(rgba, spec.lut4, dst=rgba)
+
+
+def apply_filter_batch(images: Iterable[np.ndarray], filter_name: str) -> List[np.ndarray]:
+    """Mengaplikasikan satu filter ke semua foto dalam satu compose sekaligus."""
+    return [apply_filter_array(rgba, filter_name) for rgba in images]
@@ -0,0 +1,118 @@
+# services/http_cache.py
+
+# Respons katalog (GET /frames, GET /packages) yang sudah diserialisasi sekali dan
+# disajikan ulang dengan ETag, sehingga polling kiosk cukup dijawab 304 tanpa
+# menyentuh database maupun mengirim ulang body.
+
+import asyncio
+import gzip
+import hashlib
+import json
+import time
+from typing import Any, Awaitable, Callable, NamedTuple
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+
+# Body lebih kecil dari ini tidak dikompresi (overhead gzip tidak sebanding)
+GZIP_MIN_BYTES = 1024
+
+
+class _Snapshot(NamedTuple):
+    version: int
+    expires_at: float
+    etag: str
+    body: bytes
+    gzip_body: bytes | None
+
+
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Perbandingan lemah (RFC 9110): prefix W/ diabaikan
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return etag.removeprefix("W/") in candidates
+
+
+class SerializedResponseCache:
+    """
+    Menyimpan satu respons JSON yang sudah diserialisasi (plus versi gzip-nya) beserta ETag.
+
+    Snapshot dibangun ulang bila `bump()` dipanggil (data diubah oleh proses ini) atau
+    setelah `ttl_seconds` (data mungkin diubah proses API lain). ETag dihitung dari isi
+    body, sehingga semua proses API memberi ETag yang sama untuk data yang sama dan
+    kiosk yang berpindah worker tetap mendapat 304.
+    """
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self.version = 0
+        self._snapshot: _Snapshot | None = None
+        self._lock = asyncio.Lock()
+        self.builds = 0
+        self.not_modified = 0
+        self.served = 0
+
+    def bump(self):
+        """Menandai data berubah; snapshot berikutnya dibangun ulang dari database."""
+        self.version += 1
+        self._snapshot = None
+
+    async def _get_snapshot(self, build: Callable[[], Awaitable[Any]]) -> _Snapshot | None:
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.version == self.version and snapshot.expires_at > time.monotonic():
+            return snapshot
+        async with self._lock:
+            # Request lain mungkin sudah membangun snapshot selama kita menunggu lock
+            snapshot = self._snapshot
+            if snapshot is not None and snapshot.version == self.version and snapshot.expires_at > time.monotonic():
+                return snapshot
+            version = self.version
+            content = await build()
+            if content is None:
+                return None
+            body = json.dumps(jsonable_encoder(content), separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+            snapshot = _Snapshot(
+                version=version,
+                expires_at=time.monotonic() + self.ttl_seconds,
+                etag=f'W/"{hashlib.sha256(body).hexdigest()[:32]}"',
+                body=body,
+                gzip_body=gzip.compress(body, compresslevel=6, mtime=0) if len(body) >= GZIP_MIN_BYTES else None,
+            )
+            self.builds += 1
+            # bump() selama build berarti data sudah berubah lagi: jangan simpan snapshot lama
+            if version == self.version:
+                self._snapshot = snapshot
+            return snapshot
+
+    async def respond(self, request: Request, build: Callable[[], Awaitable[Any]]) -> Response | None:
+        """
+        Respons untuk `request`: 304 bila If-None-Match cocok, selain itu body (gzip bila diterima).
+        `build()` mengembalikan konten JSON, atau None bila tidak ada data (pemanggil yang menjawab).
+        """
+        snapshot = await self._get_snapshot(build)
+        if snapshot is None:
+            return None
+        headers = {"ETag": snapshot.etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+        if _etag_matches(request.headers.get("if-none-match"), snapshot.etag):
+            self.not_modified += 1
+            return Response(status_code=304, headers=headers)
+
+        self.served += 1
+        if snapshot.gzip_body is not None and "gzip" in request.headers.get("accept-encoding", "").lower():
+            return Response(snapshot.gzip_body, media_type="application/json", headers={**headers, "Content-Encoding": "gzip"})
+        return Response(snapshot.body, media_type="application/json", headers=headers)
+
+    def stats(self) -> dict:
+        snapshot = self._snapshot
+        return {
+            "version": self.version,
+            "etag": snapshot.etag if snapshot else None,
+            "bytes": len(snapshot.body) if snapshot else 0,
+            "gzipBytes": len(snapshot.gzip_body) if snapshot and snapshot.gzip_body else None,
+            "builds": self.builds,
+            "notModified": self.not_modified,
+            "served": self.served,
+        }
@@ -0,0 +1,380 @@
+# services/imaging.py
+
+# Fungsi-fungsi pengolahan gambar murni (tanpa I/O jaringan / database).
+# Modul ini sengaja hanya bergantung pada Pillow, NumPy & OpenCV agar ringan
+# di-import oleh worker process milik ComposeEngine.
+
+import mmap
+import time
+from contextlib import contextmanager
+from io import BytesIO
+from typing import Dict, List, Tuple
+import cv2
+import numpy as np
+from PIL import Image
+
+from services.filters import apply_filter_batch
+
+PRINT_DPI = 300
+FINAL_WIDTH_PX = 4 * PRINT_DPI
+
+# (x, y, width, height) dalam koordinat piksel frame asli
+Placement = Tuple[float, float, float, float]
+# (mode, (width, height), raw bytes) -- format ringkas untuk dikirim antar proses
+ImagePayload = Tuple[str, Tuple[int, int], bytes]
+# (byte hasil encode, (width, height), content type, ekstensi file)
+EncodedImage = Tuple[bytes, Tuple[int, int], str, str]
+
+# Ekstensi file untuk setiap format output compose
+OUTPUT_EXTENSIONS = {"png": "png", "jpeg": "jpg", "webp": "webp"}
+
+# Sisi terpanjang level "preview" capture (untuk galeri / layar kiosk)
+CAPTURE_PREVIEW_MAX_PX = 480
+# Sisi terpanjang level "share" capture (WebP untuk dikirim ke HP pelanggan)
+CAPTURE_SHARE_MAX_PX = 1080
+# Semua level turunan capture yang bisa dibuat oleh build_capture_derivatives
+CAPTURE_RENDITIONS = ("print", "normal", "preview", "share")
+
+
+@contextmanager
+def open_image_source(source):
+    """
+    Objek file untuk Image.open dari byte atau path file. File di-mmap (read-only) sehingga
+    decoder membaca langsung dari page cache tanpa menyalin seluruh file ke memori proses.
+    """
+    if isinstance(source, (bytes, bytearray)):
+        yield BytesIO(source)
+        return
+    with open(source, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        yield mapped
+
+
+def read_image_size(source) -> Tuple[int, int]:
+    """Membaca ukuran gambar (byte atau path file) dari header saja, tanpa decode piksel."""
+    with Image.open(BytesIO(source) if isinstance(source, (bytes, bytearray)) else source) as img:
+        return img.size
+
+
+def print_size(frame_size: Tuple[int, int], target_width: int = FINAL_WIDTH_PX) -> Tuple[int, int]:
+    """Ukuran kanvas cetak untuk frame dengan ukuran `frame_size`."""
+    frame_width, frame_height = frame_size
+    aspect_ratio = frame_width / frame_height
+    return target_width, int(target_width / aspect_ratio)
+
+
+def slot_geometry(
+    frame_size: Tuple[int, int], canvas_size: Tuple[int, int], placement: Placement
+) -> Tuple[Tuple[int, int], Tuple[int, int]]:
+    """Posisi tempel dan ukuran slot pada kanvas cetak untuk satu placement di koordinat frame."""
+    (frame_w, frame_h), (canvas_w, canvas_h) = frame_size, canvas_size
+    x, y, width, height = placement
+    scale_w, scale_h = canvas_w / frame_w, canvas_h / frame_h
+    return (int(x * scale_w), int(y * scale_h)), (int(width * scale_w), int(height * scale_h))
+
+
+def to_payload(image: Image.Image) -> ImagePayload:
+    """Mengubah gambar Pillow menjadi tuple yang murah di-pickle antar proses."""
+    return image.mode, image.size, image.tobytes()
+
+
+def from_payload(payload: ImagePayload) -> Image.Image:
+    mode, size, data = payload
+    return Image.frombytes(mode, size, data)
+
+
+def _encode(image: Image.Image, image_format: str, **options) -> EncodedImage:
+    buffer = BytesIO()
+    if image_format == "JPEG" and image.mode != "RGB":
+        image = image.convert("RGB")
+    image.save(buffer, format=image_format, **options)
+    content_type, extension = {
+        "PNG": ("image/png", "png"), "JPEG": ("image/jpeg", "jpg"), "WEBP": ("image/webp", "webp"),
+    }[image_format]
+    return buffer.getvalue(), image.size, content_type, extension
+
+
+def prepare_frame(frame_source, target_size: Tuple[int, int]) -> ImagePayload:
+    """Decode frame (byte atau path file) dan resize ke ukuran kanvas cetak (dilewati bila sudah berukuran cetak)."""
+    with open_image_source(frame_source) as source:
+        frame_image = Image.open(source).convert("RGBA")
+    if frame_image.size != tuple(target_size):
+        frame_image = frame_image.resize(target_size, Image.Resampling.LANCZOS)
+    return to_payload(frame_image)
+
+
+def render_frame_print_variant(frame_bytes: bytes) -> EncodedImage | None:
+    """
+    Varian cetak frame: RGBA seukuran kanvas cetak (lebar FINAL_WIDTH_PX), PNG dengan
+    kompresi ringan agar cepat di-decode saat compose. None bila frame asli sudah
+    berukuran cetak (original bisa dipakai langsung).
+    """
+    frame_image = Image.open(BytesIO(frame_bytes)).convert("RGBA")
+    canvas_size = print_size(frame_image.size)
+    if frame_image.size == canvas_size:
+        return None
+    return _encode(frame_image.resize(canvas_size, Image.Resampling.LANCZOS), "PNG", compress_level=1)
+
+
+def prepare_photo(photo_source, target_size: Tuple[int, int]) -> ImagePayload:
+    """Decode satu foto (byte atau path file) lalu resize ke ukuran slot cetak."""
+    with open_image_source(photo_source) as source:
+        photo_img = Image.open(source).convert("RGBA")
+    return to_payload(photo_img.resize(target_size, Image.Resampling.LANCZOS))
+
+
+def payload_to_array(payload: ImagePayload) -> np.ndarray:
+    """Array RGBA (H, W, 4) yang bisa ditulis, langsung dari byte mentah payload."""
+    _, (width, height), data = payload
+    return np.frombuffer(data, dtype=np.uint8).reshape(height, width, 4).copy()
+
+
+def encode_composition(canvas: Image.Image, output: Dict) -> Dict[str, EncodedImage | None]:
+    """
+    Meng-encode kanvas final sesuai profil output (lihat OutputProfile di api/photobox.py):
+    master kualitas cetak (PNG/JPEG dengan metadata DPI, atau WebP) dan salinan
+    share opsional yang diperkecil, keduanya dari kanvas yang sama.
+    """
+    image_format = output.get("format", "png")
+    dpi = (PRINT_DPI, PRINT_DPI)
+    if image_format == "jpeg":
+        # subsampling=0 (4:4:4) agar tepi teks/ornamen frame tetap tajam saat dicetak
+        master = _encode(canvas, "JPEG", quality=output.get("quality", 95), subsampling=0, dpi=dpi)
+    elif image_format == "webp":
+        master = _encode(canvas, "WEBP", quality=output.get("quality", 95))
+    else:
+        master = _encode(canvas, "PNG", compress_level=output.get("png_compress_level", 6), dpi=dpi)
+
+    share = None
+    share_format = output.get("share_format")
+    if share_format:
+        share_img = canvas
+        share_max_width = output.get("share_max_width")
+        if share_max_width and canvas.width > share_max_width:
+            share_height = round(canvas.height * share_max_width / canvas.width)
+            share_img = canvas.resize((share_max_width, share_height), Image.Resampling.LANCZOS)
+        share = _encode(share_img, share_format.upper(), quality=output.get("share_quality", 80))
+    return {"master": master, "share": share}
+
+
+def assemble_composition(
+    frame: ImagePayload, photos: List[Tuple[ImagePayload, Tuple[int, int]]], filter_name: str, output: Dict
+) -> Dict[str, EncodedImage | None]:
+    """
+    Memfilter semua foto sekaligus (pada ukuran slot), menempelkannya, lalu
+    frame di atasnya. Mengembalikan hasil encode_composition.
+    """
+    frame_image = from_payload(frame)
+    canvas = Image.new("RGBA", frame_image.size, (255, 255, 255, 255))
+
+    filtered = apply_filter_batch([payload_to_array(payload) for payload, _ in photos], filter_name)
+    for photo_array, (_, position) in zip(filtered, photos):
+        photo_img = Image.fromarray(photo_array)
+        canvas.paste(photo_img, position, photo_img)
+
+    canvas.paste(frame_image, (0, 0), frame_image)
+    return encode_composition(canvas.convert("RGB"), output)
+
+
+# Format capture yang diterima apa adanya: nama format -> (content type, ekstensi)
+CAPTURE_FORMATS = {
+    "jpeg": ("image/jpeg", "jpg"),
+    "png": ("image/png", "png"),
+    "webp": ("image/webp", "webp"),
+}
+
+
+def sniff_capture_format(header: bytes) -> str | None:
+    """Mengenali format capture dari magic bytes di awal file (minimal 12 byte)."""
+    if header.startswith(b"\xff\xd8\xff"):
+        return "jpeg"
+    if header.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return "webp"
+    return None
+
+
+def _fit_within(size: Tuple[int, int], max_side: int) -> Tuple[int, int]:
+    scale = min(1.0, max_side / max(size))
+    return max(1, round(size[0] * scale)), max(1, round(size[1] * scale))
+
+
+def build_capture_derivatives(
+    source,
+    position_size: Tuple[int, int],
+    print_slot_size: Tuple[int, int],
+    renditions: Tuple[str, ...] = CAPTURE_RENDITIONS,
+) -> Tuple[Tuple[int, int], Dict[str, EncodedImage]]:
+    """
+    Membangun level turunan sebuah capture dari `source` (path file atau byte), hanya yang
+    disebut di `renditions`:
+    - print: tepat seukuran slot cetak 300 DPI untuk posisi ini (JPEG q95)
+    - normal: thumbnail seukuran FramePosition (PNG, seperti sebelumnya)
+    - preview: kecil untuk grid galeri (JPEG)
+    - share: WebP untuk dikirim ke HP pelanggan
+    Level original tidak dibuat di sini; file dari kamera disimpan apa adanya.
+    Mengembalikan (ukuran gambar asli, level turunan).
+    """
+    if isinstance(source, (bytes, bytearray)):
+        source = BytesIO(source)
+    with Image.open(source) as opened:
+        original_size = opened.size
+        # JPEG bisa di-decode langsung pada skala 1/2, 1/4, 1/8; pilih skala terkecil
+        # yang masih cukup untuk level terbesar yang diminta
+        needed = [(CAPTURE_PREVIEW_MAX_PX, CAPTURE_PREVIEW_MAX_PX)]
+        if "print" in renditions:
+            needed.append(print_slot_size)
+        if "normal" in renditions:
+            needed.append(position_size)
+        if "share" in renditions:
+            needed.append(_fit_within(original_size, CAPTURE_SHARE_MAX_PX))
+        opened.draft("RGB", (max(w for w, _ in needed), max(h for _, h in needed)))
+        image = opened.convert("RGBA")
+
+    levels = {}
+    if "print" in renditions:
+        print_img = image.resize(print_slot_size, Image.Resampling.LANCZOS)
+        levels["print"] = _encode(print_img, "JPEG", quality=95, dpi=(PRINT_DPI, PRINT_DPI))
+    if "share" in renditions:
+        share_img = image.convert("RGB").resize(_fit_within(image.size, CAPTURE_SHARE_MAX_PX), Image.Resampling.LANCZOS)
+        levels["share"] = _encode(share_img, "WEBP", quality=80)
+
+    normal_img = image
+    normal_img.thumbnail(position_size, Image.Resampling.LANCZOS)
+    if "normal" in renditions:
+        levels["normal"] = _encode(normal_img, "PNG", optimize=True)
+    if "preview" in renditions:
+        preview_img = normal_img.copy()
+        preview_img.thumbnail((CAPTURE_PREVIEW_MAX_PX, CAPTURE_PREVIEW_MAX_PX), Image.Resampling.LANCZOS)
+        levels["preview"] = _encode(preview_img, "JPEG", quality=85)
+    return original_size, levels
+
+
+def pick_level(levels: List[Tuple[str, int, int]], target_size: Tuple[int, int]) -> str | None:
+    """Key level terkecil yang masih >= ukuran target, atau None jika tidak ada yang cukup."""
+    target_w, target_h = target_size
+    candidates = [(w * h, key) for key, w, h in levels if w >= target_w and h >= target_h]
+    return min(candidates)[1] if candidates else None
+
+
+# Ukuran sisi gambar abu-abu yang di-DCT untuk perceptual hash
+PHASH_SAMPLE_PX = 32
+
+
+def perceptual_hash(image: Image.Image) -> str:
+    """
+    pHash 64-bit: gambar abu-abu 32x32 -> DCT -> 8x8 frekuensi terendah, tiap bit = koefisien
+    di atas median. Area transparan diratakan ke putih dulu agar frame PNG stabil.
+    Dikembalikan sebagai 16 digit hex.
+    """
+    if image.mode in ("RGBA", "LA", "P"):
+        image = image.convert("RGBA")
+        background = Image.new("RGBA", image.size, (255, 255, 255, 255))
+        image = Image.alpha_composite(background, image)
+    gray = np.asarray(image.convert("L"), dtype=np.float32)
+    small = cv2.resize(gray, (PHASH_SAMPLE_PX, PHASH_SAMPLE_PX), interpolation=cv2.INTER_AREA)
+    low = cv2.dct(small)[:8, :8].flatten()
+    # Koefisien DC (rata-rata kecerahan) tidak ikut menentukan median
+    bits = low > np.median(low[1:])
+    return f"{int(''.join('1' if bit else '0' for bit in bits), 2):016x}"
+
+
+def image_phash(source) -> str:
+    """perceptual_hash dari byte atau path file; JPEG cukup di-decode pada skala terkecil."""
+    if isinstance(source, (bytes, bytearray)):
+        source = BytesIO(source)
+    with Image.open(source) as opened:
+        opened.draft("RGB", (PHASH_SAMPLE_PX * 4, PHASH_SAMPLE_PX * 4))
+        return perceptual_hash(opened)
+
+
+def hamming_distance(hash_a: str, hash_b: str) -> int:
+    """Jumlah bit berbeda antara dua pHash (0 = identik secara visual)."""
+    return bin(int(hash_a, 16) ^ int(hash_b, 16)).count("1")
+
+
+# Faktor pengecilan untuk pencarian kasar area transparan frame (per sisi)
+SLOT_DETECT_SCALE = 4
+
+
+def _external_boxes(mask: np.ndarray, min_area: float, offset: Tuple[int, int] = (0, 0)) -> List[Tuple[int, int, int, int]]:
+    """Bounding box kontur eksternal `mask` yang luasnya > `min_area`, digeser sebesar `offset`."""
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    boxes = []
+    for contour in contours:
+        if cv2.contourArea(contour) > min_area:
+            x, y, w, h = cv2.boundingRect(contour)
+            boxes.append((x + offset[0], y + offset[1], w, h))
+    return boxes
+
+
+def _refine_slot_boxes(mask: np.ndarray, min_area: float, scale: int) -> List[Tuple[int, int, int, int]] | None:
+    """
+    Mencari kontur di mask yang diperkecil (max-pool `scale` x `scale`, sehingga tiap area
+    transparan tetap terhubung dan tidak menyusut), lalu menjalankan findContours resolusi
+    penuh hanya di sekitar kandidat. Mengembalikan None bila ada kontur yang terpotong batas
+    ROI; pemanggil lalu memakai pencarian resolusi penuh agar hasilnya tetap identik.
+    """
+    height, width = mask.shape
+    padded = cv2.copyMakeBorder(
+        mask, 0, -height % scale, 0, -width % scale, cv2.BORDER_CONSTANT, value=0
+    )
+    # INTER_AREA dengan faktor bulat = rata-rata per blok; > 0 bila ada satu saja piksel transparan
+    coarse = cv2.resize(
+        padded, (padded.shape[1] // scale, padded.shape[0] // scale), interpolation=cv2.INTER_AREA
+    )
+
+    contours, _ = cv2.findContours(coarse, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    boxes = set()
+    for contour in contours:
+        cx, cy, cw, ch = cv2.boundingRect(contour)
+        # Luas kontur <= luas bounding box-nya, jadi kandidat sekecil ini pasti tidak lolos filter
+        if cw * ch * scale * scale <= min_area:
+            continue
+        # ROI dengan margin satu blok agar kontur di dalamnya tidak menyentuh tepi ROI
+        x0, y0 = max(0, (cx - 1) * scale), max(0, (cy - 1) * scale)
+        x1, y1 = min(width, (cx + cw + 1) * scale), min(height, (cy + ch + 1) * scale)
+        for x, y, w, h in _external_boxes(mask[y0:y1, x0:x1], min_area, offset=(x0, y0)):
+            clipped = (x == x0 and x0 > 0) or (y == y0 and y0 > 0) or (x + w == x1 and x1 < width) or (y + h == y1 and y1 < height)
+            if clipped:
+                return None
+            boxes.add((x, y, w, h))
+    return list(boxes)
+
+
+def detect_photo_slots(image_bytes: bytes, min_area_threshold: int = 1000) -> dict:
+    """
+    Mencari area transparan (slot foto) pada frame PNG. Hasilnya sama dengan findContours
+    pada alpha channel resolusi penuh, tetapi pencarian dilakukan dulu di resolusi kecil lalu
+    diperhalus hanya di sekitar kandidat. Posisi diurutkan dari atas ke bawah (lalu kiri ke kanan).
+    Mengembalikan {"width", "height", "positions", "timings"}.
+    """
+    started = time.perf_counter()
+    timings = {}
+    img = Image.open(BytesIO(image_bytes))
+    if img.format != 'PNG':
+        raise ValueError("Format gambar harus PNG untuk mendukung transparansi.")
+    frame_width, frame_height = img.size
+    alpha = img.getchannel('A') if img.mode == 'RGBA' else img.convert('RGBA').getchannel('A')
+    # Piksel dengan alpha 0 = transparan = 255 di mask
+    mask = cv2.compare(np.asarray(alpha), 0, cv2.CMP_EQ)
+    timings["decode"] = round((time.perf_counter() - started) * 1000, 1)
+
+    step = time.perf_counter()
+    boxes = _refine_slot_boxes(mask, min_area_threshold, SLOT_DETECT_SCALE)
+    timings["coarse_refine"] = round((time.perf_counter() - step) * 1000, 1)
+    if boxes is None:
+        step = time.perf_counter()
+        boxes = _external_boxes(mask, min_area_threshold)
+        timings["full_resolution"] = round((time.perf_counter() - step) * 1000, 1)
+
+    if not boxes:
+        raise ValueError("Tidak ada area foto transparan yang valid terdeteksi.")
+    boxes.sort(key=lambda box: (box[1], box[0]))
+    timings["total"] = round((time.perf_counter() - started) * 1000, 1)
+    return {
+        "width": frame_width,
+        "height": frame_height,
+        "positions": [{"x": int(x), "y": int(y), "width": int(w), "height": int(h)} for x, y, w, h in boxes],
+        "timings": timings,
+    }
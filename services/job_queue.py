@@ -0,0 +1,153 @@
+# services/job_queue.py
+
+import asyncio
+import json
+import logging
+import time
+from typing import Awaitable, Callable
+from uuid import uuid4
+
+from sqlalchemy import and_, or_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from config.database import SessionLocal
+from config.settings import settings
+from models.models import ComposeJob
+
+logger = logging.getLogger(__name__)
+
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+class ComposeJobQueue:
+    """
+    Antrian FIFO untuk compose asinkron yang disimpan di tabel ComposeJobs,
+    sehingga job yang belum selesai tetap ada setelah worker restart.
+
+    Setiap proses API menjalankan sejumlah worker coroutine yang mengambil job
+    dengan SELECT ... FOR UPDATE SKIP LOCKED, jadi beberapa proses uvicorn bisa
+    berbagi satu antrian. Job RUNNING yang lease-nya habis (proses mati di
+    tengah jalan) diambil ulang sampai `max_attempts` kali.
+    """
+
+    def __init__(self, workers: int, poll_interval: float, lease_seconds: float, max_attempts: int):
+        self.workers = max(1, workers)
+        self.poll_interval = poll_interval
+        self.lease_ms = int(lease_seconds * 1000)
+        self.max_attempts = max_attempts
+        self._handler: Callable[[dict], Awaitable[dict]] | None = None
+        self._tasks: list[asyncio.Task] = []
+        self._wakeup = asyncio.Event()
+
+    def set_handler(self, handler: Callable[[dict], Awaitable[dict]]):
+        """`handler(payload)` menjalankan compose dan mengembalikan {"final_image_url", "share_image_url"}."""
+        self._handler = handler
+
+    async def enqueue(self, db: AsyncSession, payload: dict) -> ComposeJob:
+        job = ComposeJob(
+            id=str(uuid4()),
+            status='QUEUED',
+            request_payload=json.dumps(payload),
+            attempts=0,
+            enqueued_at=_now_ms(),
+        )
+        db.add(job)
+        await db.commit()
+        self._wakeup.set()
+        return job
+
+    async def start(self):
+        if self._tasks:
+            return
+        self._tasks = [asyncio.create_task(self._worker(index)) for index in range(self.workers)]
+        logger.info(f"Compose job queue berjalan dengan {self.workers} worker.")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _claim_next(self) -> ComposeJob | None:
+        """Mengambil job tertua yang QUEUED (atau RUNNING dengan lease kedaluwarsa) dan menandainya RUNNING."""
+        while True:
+            now = _now_ms()
+            async with SessionLocal() as db:
+                result = await db.execute(
+                    select(ComposeJob)
+                    .where(or_(
+                        ComposeJob.status == 'QUEUED',
+                        and_(ComposeJob.status == 'RUNNING', ComposeJob.started_at < now - self.lease_ms),
+                    ))
+                    .order_by(ComposeJob.enqueued_at)
+                    .limit(1)
+                    .with_for_update(skip_locked=True)
+                )
+                job = result.scalars().first()
+                if job is None:
+                    await db.rollback()
+                    return None
+
+                if job.attempts >= self.max_attempts:
+                    job.status = 'FAILED'
+                    job.error = f"Job dihentikan setelah {job.attempts} percobaan tanpa selesai."
+                    job.finished_at = now
+                    await db.commit()
+                    logger.warning(f"Compose job {job.id} gagal permanen setelah {job.attempts} percobaan.")
+                    continue
+
+                job.status = 'RUNNING'
+                job.started_at = now
+                job.attempts += 1
+                await db.commit()
+                return job
+
+    async def _run(self, job: ComposeJob):
+        try:
+            result = await self._handler(json.loads(job.request_payload))
+            values = {
+                "status": 'DONE', "error": None,
+                "result_image_url": result["final_image_url"], "share_image_url": result.get("share_image_url"),
+            }
+        except Exception as e:
+            logger.error(f"Compose job {job.id} gagal: {e}", exc_info=True)
+            values = {"status": 'FAILED', "error": str(e) or e.__class__.__name__}
+
+        async with SessionLocal() as db:
+            await db.execute(
+                update(ComposeJob).where(ComposeJob.id == job.id).values(finished_at=_now_ms(), **values)
+            )
+            await db.commit()
+
+    async def _worker(self, index: int):
+        while True:
+            # clear() sebelum claim: enqueue yang terjadi setelahnya pasti membangunkan worker ini
+            self._wakeup.clear()
+            try:
+                job = await self._claim_next()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Compose worker {index} gagal mengambil job: {e}")
+                await asyncio.sleep(self.poll_interval)
+                continue
+
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run(job)
+
+
+# Instance tunggal; handler dipasang oleh api/photobox.py
+compose_job_queue = ComposeJobQueue(
+    workers=settings.COMPOSE_QUEUE_WORKERS,
+    poll_interval=settings.COMPOSE_QUEUE_POLL_INTERVAL,
+    lease_seconds=settings.COMPOSE_JOB_LEASE_SECONDS,
+    max_attempts=settings.COMPOSE_JOB_MAX_ATTEMPTS,
+)
@@ -0,0 +1,130 @@
+# services/metadata.py
+
+# Cache read-through untuk metadata yang hampir tidak pernah berubah (frame, posisi
+# foto, keberadaan sesi), supaya alur per-foto tidak perlu bolak-balik ke MySQL
+# remote. Entri kedaluwarsa setelah TTL; perubahan frame dari proses ini langsung
+# menghapus cache lewat invalidate_frames().
+
+from typing import Dict, Iterable, List, NamedTuple, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy.orm import selectinload
+
+from config.settings import settings
+from models.models import Frame, FramePosition, PhotoSession
+from services.cache import TTLCache
+
+_CATALOG_KEY = "frames"
+
+
+class PositionInfo(NamedTuple):
+    """Salinan FramePosition (plus ukuran frame-nya) yang aman dipakai lintas sesi DB."""
+    id: str
+    frame_id: str
+    x: int
+    y: int
+    width: int
+    height: int
+    frame_width: int
+    frame_height: int
+
+
+def _position_info(position: FramePosition, frame_width: int, frame_height: int) -> PositionInfo:
+    return PositionInfo(
+        position.id, position.frame_id, position.x, position.y, position.width, position.height,
+        frame_width, frame_height,
+    )
+
+
+def _frame_to_dict(frame: Frame) -> dict:
+    return {
+        "id": frame.id, "name": frame.name, "imageLink": frame.image_link, "width": frame.width, "height": frame.height,
+        "positions": [
+            {"id": pos.id, "x": pos.x, "y": pos.y, "width": pos.width, "height": pos.height}
+            for pos in (frame.positions or [])
+        ],
+        "createdAt": frame.created_at, "updatedAt": frame.updated_at,
+    }
+
+
+class MetadataCache:
+    def __init__(self, ttl_seconds: float):
+        self.positions = TTLCache(ttl_seconds)
+        self.sessions = TTLCache(ttl_seconds)
+        self.catalog = TTLCache(ttl_seconds, max_entries=1)
+
+    async def get_session_positions(
+        self, db: AsyncSession, session_id: str, position_ids: Iterable[str]
+    ) -> Tuple[bool, Dict[str, PositionInfo]]:
+        """
+        Mengembalikan (sesi ada?, {position_id: PositionInfo} untuk posisi yang ditemukan).
+        Bila ada yang belum di-cache, sesi dan semua posisi dimuat dengan satu query.
+        """
+        position_ids = set(position_ids)
+        cached = {position_id: self.positions.get(position_id) for position_id in position_ids}
+        if self.sessions.get(session_id) and all(cached.values()):
+            return True, cached
+
+        result = await db.execute(
+            select(PhotoSession.id, FramePosition, Frame.width, Frame.height)
+            .select_from(PhotoSession)
+            .outerjoin(FramePosition, FramePosition.id.in_(position_ids))
+            .outerjoin(Frame, Frame.id == FramePosition.frame_id)
+            .where(PhotoSession.id == session_id)
+        )
+        rows = result.all()
+        if not rows:
+            return False, {}
+        self.sessions.put(session_id, True)
+        found = {}
+        for _, position, frame_width, frame_height in rows:
+            if position is not None:
+                found[position.id] = _position_info(position, frame_width, frame_height)
+                self.positions.put(position.id, found[position.id])
+        return True, found
+
+    async def get_positions(self, db: AsyncSession, position_ids: Iterable[str]) -> Dict[str, PositionInfo]:
+        """{position_id: PositionInfo}; posisi yang tidak ada tidak disertakan (dan tidak di-cache)."""
+        found, missing = {}, []
+        for position_id in set(position_ids):
+            info = self.positions.get(position_id)
+            if info is None:
+                missing.append(position_id)
+            else:
+                found[position_id] = info
+        if missing:
+            result = await db.execute(
+                select(FramePosition, Frame.width, Frame.height)
+                .join(Frame, Frame.id == FramePosition.frame_id)
+                .where(FramePosition.id.in_(missing))
+            )
+            for position, frame_width, frame_height in result.all():
+                found[position.id] = _position_info(position, frame_width, frame_height)
+                self.positions.put(position.id, found[position.id])
+        return found
+
+    async def get_frame_catalog(self, db: AsyncSession) -> List[dict]:
+        """Semua frame beserta posisinya, dalam bentuk yang dikirim oleh GET /frames."""
+        catalog = self.catalog.get(_CATALOG_KEY)
+        if catalog is None:
+            result = await db.execute(select(Frame).options(selectinload(Frame.positions)).distinct())
+            catalog = [_frame_to_dict(frame) for frame in result.scalars().unique().all()]
+            self.catalog.put(_CATALOG_KEY, catalog)
+        return catalog
+
+    def invalidate_frames(self):
+        """Dipanggil setelah frame ditambah/dihapus (posisi ikut berubah bersama frame)."""
+        self.catalog.clear()
+        self.positions.clear()
+
+    def stats(self) -> dict:
+        return {
+            "positions": self.positions.stats(),
+            "sessions": self.sessions.stats(),
+            "frameCatalog": self.catalog.stats(),
+        }
+
+
+# Instance tunggal per proses API
+metadata_cache = MetadataCache(ttl_seconds=settings.METADATA_CACHE_TTL_SECONDS)
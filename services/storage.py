@@ -0,0 +1,577 @@
+# services/storage.py
+
+# Abstraksi penyimpanan objek gambar (frame, capture, hasil compose). Router hanya
+# memakai key (mis. "frames/<uuid>.png") dan URL publik; backend dipilih lewat
+# STORAGE_BACKEND:
+#   - r2: Cloudflare R2 lewat client boto3 bersama (config/r2.py)
+#   - local: folder di disk yang disajikan main.py di /uploads (booth dengan
+#     uplink lambat, atau pengembangan tanpa kredensial R2)
+#   - memory: dict in-process, untuk tes dan load test tanpa jaringan
+# Backend r2 dibungkus CachedStorage (cache disk read-through, OBJECT_CACHE_*)
+# agar frame & capture yang sering di-compose tidak diunduh berulang kali.
+# Semua method bersifat async; I/O blocking dijalankan di thread pool.
+
+import abc
+import asyncio
+import contextlib
+import hashlib
+import logging
+import mimetypes
+import os
+import shutil
+import tempfile
+import threading
+import time
+from typing import AsyncContextManager, AsyncIterator, List, NamedTuple
+from urllib.parse import urlparse
+
+from boto3.s3.transfer import TransferConfig
+from botocore.exceptions import ClientError
+
+from config import r2
+from config.settings import settings
+from services.cache import DiskCache
+
+logger = logging.getLogger(__name__)
+
+STREAM_CHUNK_BYTES = 1024 * 1024
+
+
+class ObjectInfo(NamedTuple):
+    key: str
+    size: int
+    content_type: str | None = None
+    etag: str | None = None
+    last_modified: float | None = None   # epoch detik
+
+
+class ObjectNotFoundError(Exception):
+    """Objek dengan key tersebut tidak ada di storage."""
+
+
+class StorageUnavailableError(Exception):
+    """Backend storage tidak bisa dipakai (mis. kredensial R2 belum diatur)."""
+
+
+class StorageFeatureUnavailableError(Exception):
+    """Operasi tidak didukung backend ini (mis. URL presigned pada storage lokal)."""
+
+
+class Storage(abc.ABC):
+    """
+    Antarmuka bersama semua backend; URL publik = `public_base_url` + "/" + key.
+    Backend yang belum mengimplementasikan semua method abstrak gagal saat dibuat, bukan saat dipakai.
+    """
+
+    name = "base"
+    # True bila local_file() tersedia (objek bisa dibaca langsung dari file di disk)
+    local_files = False
+
+    def __init__(self, public_base_url: str):
+        self.public_base_url = public_base_url.rstrip('/')
+        # Bagian path dari URL publik (mis. "uploads" untuk http://host/uploads) dibuang saat membaca key
+        self._url_path_prefix = urlparse(self.public_base_url).path.strip('/')
+
+    def public_url(self, key: str) -> str:
+        return f"{self.public_base_url}/{key}"
+
+    def key_from_url(self, url: str) -> str:
+        path = urlparse(url).path.lstrip('/')
+        if self._url_path_prefix and path.startswith(self._url_path_prefix + '/'):
+            return path[len(self._url_path_prefix) + 1:]
+        return path
+
+    @abc.abstractmethod
+    async def put_bytes(self, key: str, data: bytes, content_type: str) -> None:
+        """Menyimpan `data` sebagai objek `key`."""
+
+    @abc.abstractmethod
+    async def put_file(self, key: str, path: str, content_type: str) -> None:
+        """Mengunggah file dari disk secara streaming."""
+
+    @abc.abstractmethod
+    async def get_bytes(self, key: str) -> bytes:
+        """Seluruh isi objek; ObjectNotFoundError bila tidak ada."""
+
+    @abc.abstractmethod
+    async def get_range(self, key: str, start: int, end: int) -> bytes:
+        """Byte `start`..`end` (inklusif, seperti header HTTP Range)."""
+
+    @abc.abstractmethod
+    def iter_chunks(self, key: str, chunk_size: int = STREAM_CHUNK_BYTES) -> AsyncIterator[bytes]:
+        """Membaca objek per potongan tanpa memuat seluruhnya ke memori (diimplementasikan sebagai async generator)."""
+
+    @abc.abstractmethod
+    async def head(self, key: str) -> ObjectInfo | None:
+        """Metadata objek, atau None bila tidak ada."""
+
+    async def download_to(self, key: str, path: str, if_none_match: str | None = None) -> str | None:
+        """
+        Menulis objek ke file `path` dan mengembalikan ETag-nya, atau None (tanpa menulis apa pun)
+        bila ETag objek sama dengan `if_none_match`.
+        """
+        info = await self.head(key)
+        if info is None:
+            raise ObjectNotFoundError(key)
+        if if_none_match and info.etag == if_none_match:
+            return None
+        with open(path, "wb") as f:
+            async for chunk in self.iter_chunks(key):
+                await asyncio.to_thread(f.write, chunk)
+        return info.etag
+
+    def local_file(self, key: str) -> AsyncContextManager[str]:
+        """Path file di disk berisi objek `key`, valid selama blok `async with` (lihat `local_files`)."""
+        raise StorageFeatureUnavailableError(f"Storage '{self.name}' tidak menyimpan objek sebagai file lokal.")
+
+    async def exists(self, key: str) -> bool:
+        return await self.head(key) is not None
+
+    @abc.abstractmethod
+    async def delete_many(self, keys: List[str]) -> List[str]:
+        """Menghapus banyak objek sekaligus; mengembalikan key yang gagal dihapus (key yang tidak ada dianggap berhasil)."""
+
+    @abc.abstractmethod
+    def list_objects(self, prefix: str = "") -> AsyncIterator[ObjectInfo]:
+        """Semua objek berawalan `prefix` (diimplementasikan sebagai async generator)."""
+
+    async def presigned_put(self, key: str, content_type: str, expires_in: int) -> str:
+        """URL untuk PUT langsung dari klien; klien wajib mengirim Content-Type yang sama."""
+        raise StorageFeatureUnavailableError(f"Storage '{self.name}' tidak mendukung upload langsung (presigned).")
+
+    def stats(self) -> dict:
+        return {"backend": self.name}
+
+
+class R2Storage(Storage):
+    """Cloudflare R2 (atau layanan S3-compatible lain) lewat client boto3 dari `client_factory`."""
+
+    name = "r2"
+
+    def __init__(self, client_factory, bucket: str, public_base_url: str, multipart_chunk_bytes: int):
+        super().__init__(public_base_url)
+        self._client_factory = client_factory
+        self.bucket = bucket
+        self._transfer_config = TransferConfig(
+            multipart_threshold=multipart_chunk_bytes, multipart_chunksize=multipart_chunk_bytes,
+        )
+
+    def _client(self):
+        client = self._client_factory()
+        if client is None:
+            raise StorageUnavailableError("Layanan penyimpanan R2 tidak tersedia.")
+        return client
+
+    @staticmethod
+    def _is_not_found(error: ClientError) -> bool:
+        return error.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound")
+
+    async def put_bytes(self, key: str, data: bytes, content_type: str) -> None:
+        await r2.run_r2(self._client().put_object, Bucket=self.bucket, Key=key, Body=data, ContentType=content_type)
+
+    async def put_file(self, key: str, path: str, content_type: str) -> None:
+        client = self._client()
+
+        def _upload():
+            # Multipart untuk file di atas CAPTURE_MULTIPART_CHUNK_BYTES
+            with open(path, "rb") as f:
+                client.upload_fileobj(
+                    f, self.bucket, key, ExtraArgs={"ContentType": content_type}, Config=self._transfer_config
+                )
+
+        await r2.run_r2(_upload)
+
+    async def _get_object(self, key: str, **kwargs) -> dict:
+        try:
+            return await r2.run_r2(self._client().get_object, Bucket=self.bucket, Key=key, **kwargs)
+        except ClientError as e:
+            if self._is_not_found(e):
+                raise ObjectNotFoundError(key)
+            raise
+
+    async def get_bytes(self, key: str) -> bytes:
+        response = await self._get_object(key)
+        return await r2.run_r2(response["Body"].read)
+
+    async def get_range(self, key: str, start: int, end: int) -> bytes:
+        response = await self._get_object(key, Range=f"bytes={start}-{end}")
+        return (await r2.run_r2(response["Body"].read))[:end - start + 1]
+
+    async def iter_chunks(self, key: str, chunk_size: int = STREAM_CHUNK_BYTES) -> AsyncIterator[bytes]:
+        body = (await self._get_object(key))["Body"]
+        try:
+            while chunk := await r2.run_r2(body.read, chunk_size):
+                yield chunk
+        finally:
+            body.close()
+
+    async def head(self, key: str) -> ObjectInfo | None:
+        try:
+            head = await r2.run_r2(self._client().head_object, Bucket=self.bucket, Key=key)
+        except ClientError as e:
+            if self._is_not_found(e):
+                return None
+            raise
+        last_modified = head.get("LastModified")
+        return ObjectInfo(
+            key, head["ContentLength"], head.get("ContentType"), head.get("ETag"),
+            last_modified.timestamp() if last_modified else None,
+        )
+
+    async def download_to(self, key: str, path: str, if_none_match: str | None = None) -> str | None:
+        client = self._client()
+        kwargs = {"IfNoneMatch": if_none_match} if if_none_match else {}
+
+        def _download() -> str | None:
+            try:
+                response = client.get_object(Bucket=self.bucket, Key=key, **kwargs)
+            except ClientError as e:
+                # GET kondisional: 304 = isi tidak berubah sejak ETag yang dikirim
+                if e.response.get("Error", {}).get("Code") in ("304", "NotModified"):
+                    return None
+                if self._is_not_found(e):
+                    raise ObjectNotFoundError(key)
+                raise
+            with response["Body"] as body, open(path, "wb") as f:
+                shutil.copyfileobj(body, f, STREAM_CHUNK_BYTES)
+            return response.get("ETag")
+
+        return await r2.run_r2(_download)
+
+    async def delete_many(self, keys: List[str]) -> List[str]:
+        client = self._client()
+        failed = []
+        # DeleteObjects menerima maksimal 1000 key per request
+        for start in range(0, len(keys), 1000):
+            batch = keys[start:start + 1000]
+            try:
+                response = await r2.run_r2(
+                    client.delete_objects, Bucket=self.bucket,
+                    Delete={"Objects": [{"Key": key} for key in batch], "Quiet": True},
+                )
+                failed += [error["Key"] for error in response.get("Errors", [])]
+            except Exception as e:
+                logger.error(f"Gagal menghapus {len(batch)} objek R2: {e}")
+                failed += batch
+        return failed
+
+    async def list_objects(self, prefix: str = "") -> AsyncIterator[ObjectInfo]:
+        client = self._client()
+        kwargs = {"Bucket": self.bucket, "Prefix": prefix}
+        while True:
+            page = await r2.run_r2(client.list_objects_v2, **kwargs)
+            for item in page.get("Contents", []):
+                last_modified = item.get("LastModified")
+                yield ObjectInfo(
+                    item["Key"], item["Size"], None, item.get("ETag"),
+                    last_modified.timestamp() if last_modified else None,
+                )
+            if not page.get("IsTruncated"):
+                return
+            kwargs["ContinuationToken"] = page["NextContinuationToken"]
+
+    async def presigned_put(self, key: str, content_type: str, expires_in: int) -> str:
+        return self._client().generate_presigned_url(
+            "put_object",
+            Params={"Bucket": self.bucket, "Key": key, "ContentType": content_type},
+            ExpiresIn=expires_in,
+        )
+
+    def stats(self) -> dict:
+        return {"backend": self.name, **r2.r2_metrics.stats()}
+
+
+class LocalStorage(Storage):
+    """Objek disimpan sebagai file di bawah `root`; content type ditebak dari ekstensi key."""
+
+    name = "local"
+    local_files = True
+
+    def __init__(self, root: str, public_base_url: str):
+        if not urlparse(public_base_url).netloc:
+            raise ValueError(f"URL publik storage lokal harus absolut (http://host/...): {public_base_url}")
+        super().__init__(public_base_url)
+        self.root = os.path.abspath(root)
+        os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        path = os.path.abspath(os.path.join(self.root, key))
+        if not path.startswith(self.root + os.sep):
+            raise ValueError(f"Key di luar direktori storage: {key}")
+        return path
+
+    def _info(self, key: str, stat: os.stat_result) -> ObjectInfo:
+        etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+        return ObjectInfo(key, stat.st_size, mimetypes.guess_type(key)[0], etag, stat.st_mtime)
+
+    def _write_atomic(self, key: str, write):
+        # Ditulis ke file sementara lalu di-rename agar pembaca tidak pernah melihat file setengah jadi
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".upload-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                write(f)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    async def put_bytes(self, key: str, data: bytes, content_type: str) -> None:
+        await asyncio.to_thread(self._write_atomic, key, lambda f: f.write(data))
+
+    async def put_file(self, key: str, path: str, content_type: str) -> None:
+        def _copy(f):
+            with open(path, "rb") as source:
+                while chunk := source.read(STREAM_CHUNK_BYTES):
+                    f.write(chunk)
+
+        await asyncio.to_thread(self._write_atomic, key, _copy)
+
+    def _read(self, key: str, start: int = 0, length: int = -1) -> bytes:
+        try:
+            with open(self._path(key), "rb") as f:
+                f.seek(start)
+                return f.read(length)
+        except FileNotFoundError:
+            raise ObjectNotFoundError(key)
+
+    async def get_bytes(self, key: str) -> bytes:
+        return await asyncio.to_thread(self._read, key)
+
+    async def get_range(self, key: str, start: int, end: int) -> bytes:
+        return await asyncio.to_thread(self._read, key, start, end - start + 1)
+
+    async def iter_chunks(self, key: str, chunk_size: int = STREAM_CHUNK_BYTES) -> AsyncIterator[bytes]:
+        try:
+            f = await asyncio.to_thread(open, self._path(key), "rb")
+        except FileNotFoundError:
+            raise ObjectNotFoundError(key)
+        try:
+            while chunk := await asyncio.to_thread(f.read, chunk_size):
+                yield chunk
+        finally:
+            f.close()
+
+    async def head(self, key: str) -> ObjectInfo | None:
+        try:
+            return self._info(key, await asyncio.to_thread(os.stat, self._path(key)))
+        except FileNotFoundError:
+            return None
+
+    @contextlib.asynccontextmanager
+    async def local_file(self, key: str) -> AsyncIterator[str]:
+        path = self._path(key)
+        if not await asyncio.to_thread(os.path.exists, path):
+            raise ObjectNotFoundError(key)
+        yield path
+
+    async def delete_many(self, keys: List[str]) -> List[str]:
+        def _delete() -> List[str]:
+            failed = []
+            for key in keys:
+                try:
+                    os.remove(self._path(key))
+                except FileNotFoundError:
+                    pass
+                except Exception as e:
+                    logger.error(f"Gagal menghapus file {key}: {e}")
+                    failed.append(key)
+            return failed
+
+        return await asyncio.to_thread(_delete)
+
+    async def list_objects(self, prefix: str = "") -> AsyncIterator[ObjectInfo]:
+        def _scan() -> List[ObjectInfo]:
+            # Mulai dari folder terdalam yang pasti memuat prefix, lalu saring per key
+            start_dir = os.path.join(self.root, os.path.dirname(prefix))
+            found = []
+            for directory, _, files in os.walk(start_dir):
+                for filename in files:
+                    if filename.startswith(".upload-"):
+                        continue
+                    path = os.path.join(directory, filename)
+                    key = os.path.relpath(path, self.root).replace(os.sep, "/")
+                    if key.startswith(prefix):
+                        try:
+                            found.append(self._info(key, os.stat(path)))
+                        except FileNotFoundError:
+                            pass
+            return sorted(found)
+
+        for info in await asyncio.to_thread(_scan):
+            yield info
+
+
+class MemoryStorage(Storage):
+    """Objek disimpan di dict milik proses ini; hilang saat proses berhenti."""
+
+    name = "memory"
+
+    def __init__(self, public_base_url: str = "memory://storage"):
+        super().__init__(public_base_url)
+        self._objects: dict = {}
+        self._lock = threading.Lock()
+
+    async def put_bytes(self, key: str, data: bytes, content_type: str) -> None:
+        etag = f'"{hashlib.md5(data).hexdigest()}"'
+        with self._lock:
+            self._objects[key] = (bytes(data), content_type, etag, time.time())
+
+    async def put_file(self, key: str, path: str, content_type: str) -> None:
+        with open(path, "rb") as f:
+            data = await asyncio.to_thread(f.read)
+        await self.put_bytes(key, data, content_type)
+
+    def _entry(self, key: str) -> tuple:
+        with self._lock:
+            entry = self._objects.get(key)
+        if entry is None:
+            raise ObjectNotFoundError(key)
+        return entry
+
+    async def get_bytes(self, key: str) -> bytes:
+        return self._entry(key)[0]
+
+    async def get_range(self, key: str, start: int, end: int) -> bytes:
+        return self._entry(key)[0][start:end + 1]
+
+    async def iter_chunks(self, key: str, chunk_size: int = STREAM_CHUNK_BYTES) -> AsyncIterator[bytes]:
+        data = self._entry(key)[0]
+        for start in range(0, len(data), chunk_size):
+            yield data[start:start + chunk_size]
+
+    async def head(self, key: str) -> ObjectInfo | None:
+        try:
+            data, content_type, etag, modified = self._entry(key)
+        except ObjectNotFoundError:
+            return None
+        return ObjectInfo(key, len(data), content_type, etag, modified)
+
+    async def delete_many(self, keys: List[str]) -> List[str]:
+        with self._lock:
+            for key in keys:
+                self._objects.pop(key, None)
+        return []
+
+    async def list_objects(self, prefix: str = "") -> AsyncIterator[ObjectInfo]:
+        with self._lock:
+            items = sorted((key, entry) for key, entry in self._objects.items() if key.startswith(prefix))
+        for key, (data, content_type, etag, modified) in items:
+            yield ObjectInfo(key, len(data), content_type, etag, modified)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "backend": self.name, "objects": len(self._objects),
+                "bytes": sum(len(entry[0]) for entry in self._objects.values()),
+            }
+
+
+class CachedStorage(Storage):
+    """
+    Cache disk read-through di depan backend lain. local_file() (dipakai /compose) mengunduh
+    objek ke cache saat miss; get_bytes() memakai salinan di cache bila masih segar, tetapi
+    tidak mengisi cache, agar original capture yang hanya dibaca sekali oleh pipeline level
+    turunan tidak menggeser frame yang sering dipakai. Operasi lain diteruskan apa adanya;
+    put/delete membuang entri cache untuk key tersebut.
+    """
+
+    local_files = True
+
+    def __init__(self, inner: Storage, cache: DiskCache):
+        super().__init__(inner.public_base_url)
+        self.inner = inner
+        self.cache = cache
+        self.name = inner.name
+
+    async def put_bytes(self, key: str, data: bytes, content_type: str) -> None:
+        self.cache.invalidate([key])
+        await self.inner.put_bytes(key, data, content_type)
+
+    async def put_file(self, key: str, path: str, content_type: str) -> None:
+        self.cache.invalidate([key])
+        await self.inner.put_file(key, path, content_type)
+
+    async def get_bytes(self, key: str) -> bytes:
+        async with self.cache.open(key, None) as path:
+            if path is not None:
+                return await asyncio.to_thread(_read_file, path)
+        return await self.inner.get_bytes(key)
+
+    async def get_range(self, key: str, start: int, end: int) -> bytes:
+        return await self.inner.get_range(key, start, end)
+
+    async def iter_chunks(self, key: str, chunk_size: int = STREAM_CHUNK_BYTES) -> AsyncIterator[bytes]:
+        async for chunk in self.inner.iter_chunks(key, chunk_size):
+            yield chunk
+
+    async def head(self, key: str) -> ObjectInfo | None:
+        return await self.inner.head(key)
+
+    async def download_to(self, key: str, path: str, if_none_match: str | None = None) -> str | None:
+        return await self.inner.download_to(key, path, if_none_match)
+
+    @contextlib.asynccontextmanager
+    async def local_file(self, key: str) -> AsyncIterator[str]:
+        async with self.cache.open(key, lambda path, etag: self.inner.download_to(key, path, etag)) as path:
+            yield path
+
+    async def delete_many(self, keys: List[str]) -> List[str]:
+        self.cache.invalidate(keys)
+        return await self.inner.delete_many(keys)
+
+    async def list_objects(self, prefix: str = "") -> AsyncIterator[ObjectInfo]:
+        async for info in self.inner.list_objects(prefix):
+            yield info
+
+    async def presigned_put(self, key: str, content_type: str, expires_in: int) -> str:
+        return await self.inner.presigned_put(key, content_type, expires_in)
+
+    def stats(self) -> dict:
+        return {**self.inner.stats(), "objectCache": self.cache.stats()}
+
+
+def _read_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def with_object_cache(storage: Storage) -> Storage:
+    """Membungkus `storage` dengan CachedStorage sesuai OBJECT_CACHE_* (0 byte = tanpa cache)."""
+    if settings.OBJECT_CACHE_MAX_BYTES <= 0:
+        return storage
+    cache = DiskCache(settings.OBJECT_CACHE_DIR, settings.OBJECT_CACHE_MAX_BYTES, settings.OBJECT_CACHE_REVALIDATE_SECONDS)
+    return CachedStorage(storage, cache)
+
+
+def create_storage(backend: str) -> Storage:
+    """Membuat backend storage sesuai nama di STORAGE_BACKEND."""
+    if backend == "r2":
+        # get_r2_client dipanggil lewat modulnya agar bisa diganti (mis. oleh benchmark)
+        return with_object_cache(R2Storage(
+            lambda: r2.get_r2_client(), r2.R2_BUCKET_NAME, r2.R2_PUBLIC_URL, settings.CAPTURE_MULTIPART_CHUNK_BYTES
+        ))
+    if backend == "local":
+        return LocalStorage(settings.LOCAL_STORAGE_ROOT, settings.LOCAL_STORAGE_PUBLIC_URL)
+    if backend == "memory":
+        return MemoryStorage()
+    raise ValueError(f"STORAGE_BACKEND tidak dikenal: {backend}")
+
+
+_storage: Storage | None = None
+
+
+def get_storage() -> Storage:
+    """Backend storage aktif (dibuat sekali dari STORAGE_BACKEND)."""
+    global _storage
+    if _storage is None:
+        _storage = create_storage(settings.STORAGE_BACKEND)
+        logger.info(f"Storage backend: {_storage.name}")
+    return _storage
+
+
+def set_storage(storage: Storage) -> None:
+    """Mengganti backend storage aktif (untuk tes dan benchmark)."""
+    global _storage
+    _storage = storage
@@ -0,0 +1,290 @@
+# services/storage_gc.py
+
+import asyncio
+import json
+import logging
+import re
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, text
+from sqlalchemy.future import select
+
+from config.database import SessionLocal, engine
+from config.settings import settings
+from models.models import Capture, ComposeJob, Frame, PhotoSession
+from services.compose import compose_results
+from services.storage import get_storage
+
+logger = logging.getLogger(__name__)
+
+# Prefix yang dikelola aplikasi; objek di luar prefix ini tidak pernah disentuh
+GC_PREFIXES = ("frames/", "captures/", "final/")
+# Hasil compose: final/<digest>_final.<ext> dan salinan share final/<digest>_share.<ext>
+_FINAL_KEY = re.compile(r"^final/([0-9a-f]{64})_")
+# Jeda sebelum putaran berkala pertama, agar startup (dan deploy beruntun) tidak ikut terbebani
+GC_STARTUP_DELAY_SECONDS = 600
+# Nama lock MySQL (GET_LOCK) agar hanya satu proses API yang membersihkan pada satu waktu
+GC_LOCK_NAME = "selasaat.storage_gc"
+# Contoh key yatim yang disertakan di laporan
+REPORT_SAMPLE_KEYS = 50
+
+
+class StorageGCBusyError(Exception):
+    """Putaran GC lain sedang berjalan (di proses ini atau proses API lain)."""
+
+
+async def _abandoned_session_ids(db, store, days: float) -> list:
+    """
+    Sesi yang dibuat lebih dari `days` hari lalu, masih punya capture, dan tidak punya hasil compose
+    dalam bentuk apa pun: tanpa result_image_url (/sessions/{id}/compose), tanpa capture yang pernah
+    di-compose (Capture.composed_at, diisi /compose dan job async), dan tanpa ComposeJob DONE yang
+    memakai capture-nya (job yang selesai sebelum composed_at ada).
+    """
+    cutoff = datetime.now() - timedelta(days=days)
+    result = await db.execute(
+        select(PhotoSession.id)
+        .filter(PhotoSession.result_image_url.is_(None), PhotoSession.created_at < cutoff)
+        .filter(PhotoSession.id.in_(select(Capture.session_id)))
+        .filter(PhotoSession.id.not_in(select(Capture.session_id).filter(Capture.composed_at.is_not(None))))
+    )
+    candidates = set(result.scalars().all())
+    if not candidates:
+        return []
+
+    composed_keys = set()
+    jobs = await db.execute(select(ComposeJob.request_payload).filter(ComposeJob.status == 'DONE'))
+    for (payload,) in jobs.all():
+        try:
+            photos = json.loads(payload).get("photos") or []
+        except (TypeError, ValueError, AttributeError):
+            continue
+        composed_keys.update(store.key_from_url(photo["url"]) for photo in photos if photo.get("url"))
+    if composed_keys:
+        captures = await db.execute(
+            select(Capture.session_id, Capture.raw_capture_url, Capture.normal_capture_url)
+            .filter(Capture.session_id.in_(candidates))
+        )
+        for session_id, raw_url, normal_url in captures.all():
+            if store.key_from_url(raw_url) in composed_keys or store.key_from_url(normal_url) in composed_keys:
+                candidates.discard(session_id)
+    return sorted(candidates)
+
+
+async def _referenced_keys(db, store, excluded_sessions: set) -> tuple:
+    """
+    Semua key yang dirujuk DB, plus digest hasil compose yang dirujuk (salinan share tidak
+    dicatat di DB, jadi objek final/ dianggap terpakai bila digest-nya terpakai).
+    """
+    keys, final_digests = set(), set()
+
+    def add_url(url: str | None):
+        if not url:
+            return
+        key = store.key_from_url(url)
+        keys.add(key)
+        match = _FINAL_KEY.match(key)
+        if match:
+            final_digests.add(match.group(1))
+
+    for image_link, print_image_link in (await db.execute(select(Frame.image_link, Frame.print_image_link))).all():
+        add_url(image_link)
+        add_url(print_image_link)
+
+    captures = await db.execute(
+        select(Capture.session_id, Capture.raw_capture_url, Capture.normal_capture_url, Capture.capture_levels)
+    )
+    for session_id, raw_url, normal_url, capture_levels in captures.all():
+        if session_id in excluded_sessions:
+            continue
+        add_url(raw_url)
+        add_url(normal_url)
+        for level in json.loads(capture_levels or "{}").values():
+            if level.get("key"):
+                keys.add(level["key"])
+
+    for (url,) in (await db.execute(select(PhotoSession.result_image_url))).all():
+        add_url(url)
+    for result_url, share_url in (await db.execute(select(ComposeJob.result_image_url, ComposeJob.share_image_url))).all():
+        add_url(result_url)
+        add_url(share_url)
+    return keys, final_digests
+
+
+async def collect_orphans(dry_run: bool, max_deletes: int | None = None) -> dict:
+    """
+    Satu putaran GC: mencocokkan listing storage dengan rujukan di DB lalu menghapus objek
+    yatim yang sudah melewati masa tenggang, per batch (delete_many) dengan laju dibatasi
+    STORAGE_GC_DELETES_PER_SECOND. Dengan `dry_run`, hanya laporan yang dibuat.
+    """
+    started = time.perf_counter()
+    store = get_storage()
+    max_deletes = settings.STORAGE_GC_MAX_DELETES_PER_RUN if max_deletes is None else max_deletes
+    batch_size = max(1, min(settings.STORAGE_GC_DELETE_BATCH, 1000))
+    report = {
+        "dryRun": dry_run, "startedAt": int(time.time() * 1000), "scanned": 0, "referenced": 0, "young": 0,
+        "unknownAge": 0, "retained": 0, "orphans": 0, "orphanBytes": 0, "deleted": 0, "failed": 0, "truncated": False,
+        "abandonedSessions": 0, "abandonedCaptures": 0, "prefixes": {}, "sampleOrphans": [],
+    }
+
+    async with SessionLocal() as db:
+        abandoned = []
+        if settings.STORAGE_GC_ABANDONED_SESSION_DAYS > 0:
+            abandoned = await _abandoned_session_ids(db, store, settings.STORAGE_GC_ABANDONED_SESSION_DAYS)
+        if abandoned and not dry_run:
+            # Baris dihapus lebih dulu: objeknya menjadi yatim dan ikut terhapus di bawah (atau di putaran berikutnya)
+            result = await db.execute(delete(Capture).where(Capture.session_id.in_(abandoned)))
+            await db.commit()
+            report["abandonedCaptures"] = result.rowcount
+        elif abandoned:
+            report["abandonedCaptures"] = len((await db.execute(
+                select(Capture.id).filter(Capture.session_id.in_(abandoned))
+            )).all())
+        report["abandonedSessions"] = len(abandoned)
+        referenced, final_digests = await _referenced_keys(db, store, set(abandoned))
+
+    pending: list = []
+    deleted_digests: set = set()
+
+    async def flush():
+        if dry_run or not pending:
+            pending.clear()
+            return
+        batch = list(pending)
+        pending.clear()
+        failed = await store.delete_many(batch)
+        report["failed"] += len(failed)
+        report["deleted"] += len(batch) - len(failed)
+        deleted_digests.update(
+            match.group(1) for match in map(_FINAL_KEY.match, set(batch) - set(failed)) if match
+        )
+        if settings.STORAGE_GC_DELETES_PER_SECOND > 0:
+            await asyncio.sleep(len(batch) / settings.STORAGE_GC_DELETES_PER_SECOND)
+
+    now = time.time()
+    for prefix in GC_PREFIXES:
+        if prefix == "final/" and settings.STORAGE_GC_FINAL_GRACE_SECONDS <= 0:
+            # Masa simpan hasil compose belum diatur: foto final pelanggan tidak pernah dihapus
+            continue
+        grace = settings.STORAGE_GC_FINAL_GRACE_SECONDS if prefix == "final/" else settings.STORAGE_GC_GRACE_SECONDS
+        counts = report["prefixes"][prefix] = {"scanned": 0, "orphans": 0, "orphanBytes": 0}
+        async for info in store.list_objects(prefix):
+            report["scanned"] += 1
+            counts["scanned"] += 1
+            match = _FINAL_KEY.match(info.key)
+            if info.key in referenced or (match and match.group(1) in final_digests):
+                report["referenced"] += 1
+                continue
+            if prefix == "final/" and not match:
+                # Hasil compose lama (final/<uuid>_...) tidak pernah dicatat di DB: selalu disimpan
+                report["retained"] += 1
+                continue
+            if info.last_modified is None:
+                # Umur tidak diketahui: tidak pernah dihapus
+                report["unknownAge"] += 1
+                continue
+            if now - info.last_modified < grace:
+                report["young"] += 1
+                continue
+            if report["orphans"] >= max_deletes:
+                report["truncated"] = True
+                break
+            report["orphans"] += 1
+            report["orphanBytes"] += info.size
+            counts["orphans"] += 1
+            counts["orphanBytes"] += info.size
+            if len(report["sampleOrphans"]) < REPORT_SAMPLE_KEYS:
+                report["sampleOrphans"].append(info.key)
+            pending.append(info.key)
+            if len(pending) >= batch_size:
+                await flush()
+        if report["truncated"]:
+            break
+    await flush()
+
+    if deleted_digests:
+        # Index hasil compose proses ini langsung dibersihkan; di proses lain entri basi hilang
+        # sendiri setelah COMPOSE_RESULT_INDEX_TTL_SECONDS
+        compose_results.invalidate(lambda digest: digest in deleted_digests)
+    report["durationMs"] = round((time.perf_counter() - started) * 1000, 1)
+    return report
+
+
+class StorageGarbageCollector:
+    """
+    Menjalankan collect_orphans() berkala di background dan menyimpan laporan terakhir.
+    Setiap proses API menjalankan loop-nya sendiri; di MySQL, GET_LOCK memastikan hanya
+    satu proses yang benar-benar membersihkan pada satu waktu (yang lain melewati putarannya).
+    """
+
+    def __init__(self, interval_seconds: float, dry_run: bool):
+        self.interval_seconds = interval_seconds
+        self.dry_run = dry_run
+        self._task: asyncio.Task | None = None
+        self._lock = asyncio.Lock()
+        self.last_report: dict | None = None
+        self.last_error: str | None = None
+
+    async def start(self):
+        if self._task or self.interval_seconds <= 0:
+            return
+        self._task = asyncio.create_task(self._loop())
+        logger.info(f"Garbage collector storage berjalan setiap {self.interval_seconds:.0f} detik.")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def run(self, dry_run: bool, max_deletes: int | None = None) -> dict:
+        """Satu putaran GC; StorageGCBusyError bila putaran lain sedang berjalan."""
+        if self._lock.locked():
+            raise StorageGCBusyError("Garbage collector storage sedang berjalan di proses ini.")
+        async with self._lock, engine.connect() as connection:
+            use_db_lock = connection.dialect.name == "mysql"
+            if use_db_lock:
+                acquired = (await connection.execute(text("SELECT GET_LOCK(:name, 0)"), {"name": GC_LOCK_NAME})).scalar()
+                if not acquired:
+                    raise StorageGCBusyError("Garbage collector storage sedang berjalan di proses API lain.")
+            try:
+                report = await collect_orphans(dry_run, max_deletes)
+            finally:
+                if use_db_lock:
+                    await connection.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": GC_LOCK_NAME})
+        self.last_report, self.last_error = report, None
+        logger.info(
+            f"GC storage{' (dry-run)' if dry_run else ''}: {report['scanned']} objek diperiksa, "
+            f"{report['orphans']} yatim, {report['deleted']} dihapus, {report['failed']} gagal."
+        )
+        return report
+
+    async def _loop(self):
+        await asyncio.sleep(min(GC_STARTUP_DELAY_SECONDS, self.interval_seconds))
+        while True:
+            try:
+                await self.run(self.dry_run)
+            except asyncio.CancelledError:
+                raise
+            except StorageGCBusyError as e:
+                logger.info(f"Putaran GC storage dilewati: {e}")
+            except Exception as e:
+                self.last_error = str(e)
+                logger.error(f"Garbage collector storage gagal: {e}", exc_info=True)
+            await asyncio.sleep(self.interval_seconds)
+
+    def status(self) -> dict:
+        return {
+            "running": self._lock.locked(),
+            "intervalSeconds": self.interval_seconds,
+            "dryRun": self.dry_run,
+            "lastReport": self.last_report,
+            "lastError": self.last_error,
+        }
+
+
+# Instance tunggal; dijalankan dari main.py
+storage_gc = StorageGarbageCollector(
+    interval_seconds=settings.STORAGE_GC_INTERVAL_SECONDS,
+    dry_run=settings.STORAGE_GC_DRY_RUN,
+)
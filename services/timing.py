@@ -0,0 +1,62 @@
+# services/timing.py
+
+# Pencatat waktu per tahap (fetch, decode, upload, ...) untuk satu request.
+# Timer disimpan di contextvar sehingga service bisa mencatat tahap tanpa
+# parameter tambahan; task asyncio dan asyncio.to_thread mewarisi context ini.
+# Hasilnya dikirim ke klien lewat header standar `Server-Timing`.
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict
+
+
+class StageTimer:
+    """
+    Mencatat rentang waktu (wall-clock) tiap tahap dalam milidetik. Tahap yang sama
+    dijalankan berkali-kali atau paralel (mis. unduhan foto) dicatat sebagai satu
+    rentang dari awal pertama sampai akhir terakhir.
+    """
+
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self._spans: Dict[str, list] = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            span = self._spans.setdefault(name, [start, end])
+            span[0], span[1] = min(span[0], start), max(span[1], end)
+
+    def as_dict(self) -> Dict[str, float]:
+        timings = {name: round((end - start) * 1000, 1) for name, (start, end) in self._spans.items()}
+        timings["total"] = round((time.perf_counter() - self.origin) * 1000, 1)
+        return timings
+
+    def server_timing(self) -> str:
+        return ", ".join(f"{name};dur={duration}" for name, duration in self.as_dict().items())
+
+
+_current_timer: ContextVar[StageTimer | None] = ContextVar("stage_timer", default=None)
+
+
+def start_timer() -> StageTimer:
+    """Membuat timer baru untuk request yang sedang berjalan."""
+    timer = StageTimer()
+    _current_timer.set(timer)
+    return timer
+
+
+@contextmanager
+def stage(name: str):
+    """Mencatat satu tahap pada timer request saat ini (no-op jika tidak ada timer)."""
+    timer = _current_timer.get()
+    if timer is None:
+        yield
+        return
+    with timer.stage(name):
+        yield
@@ -0,0 +1,88 @@
+# tests/test_slot_detection.py
+#
+# Detektor slot coarse-to-fine (services.imaging.detect_photo_slots) harus menghasilkan
+# kotak yang sama persis dengan pencarian resolusi penuh yang lama, agar penyetelan
+# SLOT_DETECT_SCALE atau margin ROI tidak diam-diam menggeser posisi foto pada frame.
+#
+#   python -m pytest tests
+
+import random
+from io import BytesIO
+
+import cv2
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw
+
+from services import imaging
+from services.imaging import detect_photo_slots
+
+MIN_AREA = 1000
+
+
+def _legacy_slots(image_bytes: bytes) -> list:
+    """Implementasi lama predict_photo_locations: findContours pada alpha channel resolusi penuh."""
+    alpha = np.array(Image.open(BytesIO(image_bytes)).convert('RGBA'))[:, :, 3]
+    _, mask = cv2.threshold(alpha, 0, 255, cv2.THRESH_BINARY_INV)
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    return sorted(cv2.boundingRect(contour) for contour in contours if cv2.contourArea(contour) > MIN_AREA)
+
+
+def _synthetic_frame(seed: int, size: tuple = (600, 1800)) -> bytes:
+    """Frame acak: lubang persegi/elips (sebagian menyentuh tepi atau bersarang) dan titik transparan lepas."""
+    rng = random.Random(seed)
+    width, height = size
+    image = Image.new("RGBA", size, (200, 100, 50, 255))
+    draw = ImageDraw.Draw(image)
+    for _ in range(rng.randint(1, 8)):
+        x, y = rng.randint(-30, width - 10), rng.randint(-30, height - 10)
+        w, h = rng.randint(3, 300), rng.randint(3, 450)
+        shape = draw.rectangle if rng.random() < 0.5 else draw.ellipse
+        shape([x, y, x + w, y + h], fill=(0, 0, 0, 0))
+        if rng.random() < 0.3:
+            draw.rectangle([x + w // 4, y + h // 4, x + w // 2, y + h // 2], fill=(255, 255, 255, 255))
+        if rng.random() < 0.2:
+            draw.rectangle([x + w // 3, y + h // 3, x + w // 3 + 20, y + h // 3 + 20], fill=(0, 0, 0, 0))
+    for _ in range(rng.randint(0, 30)):
+        draw.point((rng.randint(0, width - 1), rng.randint(0, height - 1)), fill=(0, 0, 0, 0))
+    buffer = BytesIO()
+    image.save(buffer, format="PNG", compress_level=1)
+    return buffer.getvalue()
+
+
+def _detected(image_bytes: bytes) -> list:
+    try:
+        positions = detect_photo_slots(image_bytes, MIN_AREA)["positions"]
+    except ValueError:
+        return []
+    return [(p["x"], p["y"], p["width"], p["height"]) for p in positions]
+
+
+@pytest.mark.parametrize("seed", range(80))
+def test_detect_photo_slots_matches_full_resolution(seed):
+    data = _synthetic_frame(seed)
+    detected = _detected(data)
+    assert sorted(detected) == _legacy_slots(data)
+    # Urutan dari atas ke bawah, lalu kiri ke kanan bila y sama
+    assert detected == sorted(detected, key=lambda box: (box[1], box[0]))
+
+
+@pytest.mark.parametrize("scale", [2, 3, 8])
+def test_detect_photo_slots_matches_full_resolution_at_other_scales(monkeypatch, scale):
+    monkeypatch.setattr(imaging, "SLOT_DETECT_SCALE", scale)
+    for seed in range(20):
+        data = _synthetic_frame(1000 + seed)
+        assert sorted(_detected(data)) == _legacy_slots(data)
+
+
+def test_detect_photo_slots_typical_frame():
+    image = Image.new("RGBA", (1200, 3600), (255, 255, 255, 255))
+    draw = ImageDraw.Draw(image)
+    slots = [(80, 80 + i * 860, 1040, 760) for i in range(4)]
+    for x, y, w, h in slots:
+        draw.rectangle([x, y, x + w - 1, y + h - 1], fill=(0, 0, 0, 0))
+    buffer = BytesIO()
+    image.save(buffer, format="PNG")
+    result = detect_photo_slots(buffer.getvalue())
+    assert (result["width"], result["height"]) == (1200, 3600)
+    assert _detected(buffer.getvalue()) == slots
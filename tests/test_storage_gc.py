@@ -0,0 +1,100 @@
+# tests/test_storage_gc.py
+#
+# GC storage untuk sesi terbengkalai, dijalankan di atas harness benchmark (SQLite +
+# R2 tiruan in-memory), jadi tidak menyentuh database maupun bucket sungguhan.
+#
+#   pip install -r requirements-dev.txt
+#   python -m pytest tests
+
+import asyncio
+import json
+import os
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+# Harness benchmark memakai SQLite async; lewati bila dependensi dev belum dipasang
+pytest.importorskip("aiosqlite")
+
+from benchmarks import bench_api
+
+
+async def _scenario(tmp_path) -> dict:
+    import httpx
+    from sqlalchemy import select, update
+
+    app, store, database = bench_api._prepare_app(str(tmp_path / "gc.sqlite"), 0, 0)
+    seeded = await bench_api._seed(database, store, os.environ["R2_PUBLIC_URL"])
+
+    from config.settings import settings
+    from models.models import Capture, ComposeJob, PhotoSession
+    from services.compose import compose_engine
+    from services.storage_gc import collect_orphans
+
+    async with database.SessionLocal() as db:
+        for session_id in ("legacy-job-session", "abandoned-session"):
+            db.add(PhotoSession(id=session_id, transaction_id="bench-tx", name=session_id, frame_id="bench-frame"))
+        await db.commit()
+
+    try:
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test", timeout=300) as client:
+            async def upload(session_id: str, index: int) -> str:
+                position_id = seeded["positions"][index % len(seeded["positions"])][0]
+                response = await client.post(
+                    "/api/captures",
+                    data={"session_id": session_id, "frame_position_id": position_id},
+                    files={"file": (f"{session_id}-{index}.jpg", bench_api.make_capture_jpeg(index), "image/jpeg")},
+                )
+                assert response.status_code == 201, response.text
+                return response.json()["original"]
+
+            # Sesi kiosk biasa: di-compose lewat POST /compose, result_image_url sesi tetap NULL
+            photos = []
+            for index, (_, x, y, w, h) in enumerate(seeded["positions"]):
+                url = await upload("bench-session", index)
+                photos.append({"url": url, "x": x, "y": y, "width": w, "height": h})
+            response = await client.post(
+                "/api/compose", json={"frame_url": seeded["frame_url"], "filter_name": "none", "photos": photos},
+            )
+            assert response.status_code == 200, response.text
+
+            # Sesi yang di-compose lewat job async sebelum composed_at ada
+            legacy_url = await upload("legacy-job-session", 10)
+            abandoned_url = await upload("abandoned-session", 11)
+
+        async with database.SessionLocal() as db:
+            await db.execute(
+                update(Capture).where(Capture.session_id == "legacy-job-session").values(composed_at=None)
+            )
+            db.add(ComposeJob(
+                id="legacy-job", status="DONE", enqueued_at=int(time.time() * 1000),
+                request_payload=json.dumps({"frame_url": seeded["frame_url"], "photos": [{"url": legacy_url}]}),
+            ))
+            await db.execute(update(PhotoSession).values(created_at=datetime.now() - timedelta(days=3)))
+            await db.commit()
+
+        original_days = settings.STORAGE_GC_ABANDONED_SESSION_DAYS
+        settings.STORAGE_GC_ABANDONED_SESSION_DAYS = 1
+        try:
+            report = await collect_orphans(dry_run=False)
+        finally:
+            settings.STORAGE_GC_ABANDONED_SESSION_DAYS = original_days
+
+        async with database.SessionLocal() as db:
+            remaining = (await db.execute(select(Capture.session_id, Capture.raw_capture_url))).all()
+        return {"report": report, "remaining": remaining, "composed": photos, "abandoned_url": abandoned_url}
+    finally:
+        compose_engine.shutdown()
+
+
+def test_gc_keeps_sessions_composed_via_compose_endpoint(tmp_path, monkeypatch):
+    monkeypatch.setenv("OBJECT_CACHE_DIR", str(tmp_path / "object-cache"))
+    result = asyncio.run(_scenario(tmp_path))
+
+    sessions = {session_id for session_id, _ in result["remaining"]}
+    urls = {url for _, url in result["remaining"]}
+    assert result["report"]["abandonedSessions"] == 1
+    assert sessions == {"bench-session", "legacy-job-session"}
+    assert {photo["url"] for photo in result["composed"]} <= urls
+    assert result["abandoned_url"] not in urls